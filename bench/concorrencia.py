@@ -0,0 +1,108 @@
+"""
+Compara a vazão sob concorrência do servidor waitress (app.py) e do ASGI (asgi.py).
+
+Com os dois servidores no ar, apontados para o mesmo banco, dispara para cada nível de
+concorrência N clientes (threads com conexão keep-alive) que repetem as requisições
+durante --duracao segundos, e mostra requisições/s, latência p50/p95/p99 e erros.
+As requisições não mandam If-None-Match, então nenhuma termina em 304.
+
+Uso (em um banco de teste, só leitura):
+    python src/app.py                                          # waitress na 5080
+    cd src && uvicorn asgi:app --port 5090 --workers 1         # ASGI na 5090
+    python bench/concorrencia.py --servidor waitress=http://localhost:5080 \\
+        --servidor asgi=http://localhost:5090 --concorrencia 1,8,32,64 --duracao 10
+"""
+import argparse
+import http.client
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+CAMINHOS_PADRAO = [
+    '/orcamento/1/total',
+    '/produtos?limit=50',
+    '/estoque/movimentacoes?limit=100',
+]
+
+
+def cliente(url_base, caminhos, fim, latencias, erros, lock):
+    partes = urlsplit(url_base)
+    conexao = http.client.HTTPConnection(partes.hostname, partes.port or 80, timeout=30)
+    minhas = []
+    meus_erros = 0
+    i = 0
+    while time.perf_counter() < fim:
+        caminho = caminhos[i % len(caminhos)]
+        i += 1
+        inicio = time.perf_counter()
+        try:
+            conexao.request('GET', caminho, headers={'Accept-Encoding': 'gzip'})
+            resposta = conexao.getresponse()
+            resposta.read()
+            if resposta.status != 200:
+                meus_erros += 1
+                continue
+        except (OSError, http.client.HTTPException):
+            meus_erros += 1
+            conexao.close()
+            conexao = http.client.HTTPConnection(partes.hostname, partes.port or 80, timeout=30)
+            continue
+        minhas.append(time.perf_counter() - inicio)
+    conexao.close()
+    with lock:
+        latencias.extend(minhas)
+        erros[0] += meus_erros
+
+
+def medir(url_base, caminhos, concorrencia, duracao):
+    latencias = []
+    erros = [0]
+    lock = threading.Lock()
+    fim = time.perf_counter() + duracao
+    threads = [
+        threading.Thread(target=cliente, args=(url_base, caminhos, fim, latencias, erros, lock))
+        for _ in range(concorrencia)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if not latencias:
+        return {'rps': 0.0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'erros': erros[0]}
+    percentis = statistics.quantiles(latencias, n=100)
+    return {
+        'rps': len(latencias) / duracao,
+        'p50': percentis[49] * 1000,
+        'p95': percentis[94] * 1000,
+        'p99': percentis[98] * 1000,
+        'erros': erros[0]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--servidor', action='append', required=True, help='nome=url, ex.: asgi=http://localhost:5090')
+    parser.add_argument('--caminho', action='append', help='caminho a requisitar (repetível)')
+    parser.add_argument('--concorrencia', default='1,8,32,64')
+    parser.add_argument('--duracao', type=float, default=10)
+    parser.add_argument('--aquecimento', type=float, default=2)
+    args = parser.parse_args()
+
+    servidores = [s.split('=', 1) for s in args.servidor]
+    caminhos = args.caminho or CAMINHOS_PADRAO
+    niveis = [int(n) for n in args.concorrencia.split(',')]
+
+    print(f"Caminhos: {', '.join(caminhos)}; {args.duracao:.0f} s por medida")
+    print(f"{'servidor':<12}{'clientes':>9}{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'erros':>7}")
+    for nome, url in servidores:
+        # Aquece pools de conexões, comandos preparados e o cache de custos
+        medir(url, caminhos, max(niveis), args.aquecimento)
+        for concorrencia in niveis:
+            r = medir(url, caminhos, concorrencia, args.duracao)
+            print(f"{nome:<12}{concorrencia:>9}{r['rps']:>10.1f}{r['p50']:>9.1f}{r['p95']:>9.1f}"
+                  f"{r['p99']:>9.1f}{r['erros']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Mede a vazão da gravação de movimentações de estoque em lote.
+
+Compara N chamadas a POST /estoque/movimentacoes com uma única chamada a
+POST /estoque/movimentacoes/lote (JSON e CSV) contra um servidor em execução.
+
+Uso:
+    python bench/estoque_lote.py --url http://localhost:5080 --produtos 1,2,3 --linhas 10000
+
+As movimentações geradas são reais: rode contra um banco de teste.
+"""
+import argparse
+import csv
+import io
+import json
+import random
+import time
+import urllib.request
+
+
+def gerar_movimentacoes(produtos, linhas):
+    movimentacoes = []
+    for i in range(linhas):
+        tipo = random.choice(['ENTRADA', 'SAIDA'])
+        movimentacoes.append({
+            'produto_id': random.choice(produtos),
+            'tipo_movimentacao': tipo,
+            'quantidade': round(random.uniform(0.1, 5), 3),
+            'tipo_entrada': 'COMPRA' if tipo == 'ENTRADA' else None,
+            'observacao': f'bench {i}'
+        })
+    return movimentacoes
+
+
+def post(url, corpo, content_type):
+    req = urllib.request.Request(url, data=corpo, method='POST', headers={'Content-Type': content_type})
+    with urllib.request.urlopen(req) as resp:
+        return json.loads(resp.read())
+
+
+def medir(descricao, linhas, funcao):
+    inicio = time.perf_counter()
+    funcao()
+    duracao = time.perf_counter() - inicio
+    print(f"{descricao:<30} {linhas:>7} linhas  {duracao:8.3f}s  {linhas / duracao:10.0f} linhas/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://localhost:5080')
+    parser.add_argument('--produtos', required=True, help='ids de produtos separados por vírgula')
+    parser.add_argument('--linhas', type=int, default=10000)
+    parser.add_argument('--individuais', type=int, default=500,
+                        help='quantidade de chamadas individuais usadas na comparação')
+    args = parser.parse_args()
+
+    produtos = [int(p) for p in args.produtos.split(',')]
+    movimentacoes = gerar_movimentacoes(produtos, args.linhas)
+
+    def individual():
+        for mov in movimentacoes[:args.individuais]:
+            post(f"{args.url}/estoque/movimentacoes", json.dumps(mov).encode(), 'application/json')
+
+    def lote_json():
+        post(f"{args.url}/estoque/movimentacoes/lote", json.dumps(movimentacoes).encode(), 'application/json')
+
+    def lote_csv():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=list(movimentacoes[0]))
+        writer.writeheader()
+        writer.writerows(movimentacoes)
+        post(f"{args.url}/estoque/movimentacoes/lote", buffer.getvalue().encode(), 'text/csv')
+
+    medir('POST individual', args.individuais, individual)
+    medir('POST /lote (JSON)', args.linhas, lote_json)
+    medir('POST /lote (CSV)', args.linhas, lote_csv)
+
+
+if __name__ == '__main__':
+    main()
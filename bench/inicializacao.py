@@ -0,0 +1,66 @@
+"""
+Mede o tempo de import do app (python -X importtime) e confere um orçamento.
+
+Importa o módulo app (sem chamar create_app, então não precisa de banco) em um
+processo novo, soma o tempo cumulativo dos imports de primeiro nível, lista os
+mais caros e falha (código de saída 1) se o total passar do orçamento ou se
+alguma dependência pesada (inicializacao.MODULOS_PESADOS) for carregada.
+
+Uso (na raiz do repositório):
+    python bench/inicializacao.py --orcamento-ms 800 --top 15
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC)
+
+from routes.inicializacao import MODULOS_PESADOS
+
+
+def medir_imports():
+    """Retorna [(modulo, proprio_us, cumulativo_us, nivel)] na ordem do -X importtime."""
+    processo = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=SRC, capture_output=True, text=True
+    )
+    if processo.returncode != 0:
+        sys.exit(f"Falha ao importar app:\n{processo.stderr[-2000:]}")
+    imports = []
+    for linha in processo.stderr.splitlines():
+        if not linha.startswith('import time:') or 'self [us]' in linha:
+            continue
+        proprio, cumulativo, nome = linha[len('import time:'):].split('|')
+        nivel = (len(nome) - len(nome.lstrip()) - 1) // 2
+        imports.append((nome.strip(), int(proprio), int(cumulativo), nivel))
+    return imports
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orcamento-ms', type=float, default=float(os.getenv('IMPORT_ORCAMENTO_MS', '800')))
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    imports = medir_imports()
+    primeiro_nivel = [i for i in imports if i[3] == 0]
+    total_ms = sum(cumulativo for _, _, cumulativo, _ in primeiro_nivel) / 1000
+    carregados = {nome.split('.')[0] for nome, _, _, _ in imports}
+    pesados = [m for m in MODULOS_PESADOS if m in carregados]
+
+    print(f"{'módulo':<40}{'cumulativo (ms)':>16}")
+    for nome, _, cumulativo, _ in sorted(primeiro_nivel, key=lambda i: -i[2])[:args.top]:
+        print(f"{nome:<40}{cumulativo / 1000:>16.1f}")
+    print(f"\nTotal de imports: {total_ms:.1f} ms (orçamento {args.orcamento_ms:.0f} ms), {len(imports)} módulos")
+    print(f"Dependências pesadas carregadas: {', '.join(pesados) or 'nenhuma'}")
+
+    if pesados or total_ms > args.orcamento_ms:
+        print("FALHOU")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Mede o tempo de planejamento poupado pelos comandos preparados (pg.executar).
+
+Para a consulta de totais do orçamento (custos.SQL_TOTAIS_ORCAMENTO) compara:
+  - o "Planning Time" do EXPLAIN ANALYZE do SQL direto e do EXECUTE do comando preparado;
+  - o tempo de N execuções na mesma conexão, direto e preparado;
+  - custos.obtem_totais_orcamento com DB_PREPARAR ligado e desligado (cache de custos quente).
+
+Uso (em um banco de teste, com as variáveis DB_* configuradas):
+    python bench/preparadas.py --orcamento 1 --repeticoes 500
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from routes import pg, custos
+
+
+def tempo_planejamento(cursor, sql, params, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        cursor.execute(f'EXPLAIN (ANALYZE, FORMAT JSON) {sql}', params)
+        tempos.append(cursor.fetchone()[0][0]['Planning Time'])
+    return statistics.median(tempos)
+
+
+def cronometrar(funcao, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orcamento', type=int, required=True)
+    parser.add_argument('--repeticoes', type=int, default=500)
+    args = parser.parse_args()
+    params = (args.orcamento,)
+    sql = custos.SQL_TOTAIS_ORCAMENTO
+
+    with pg.conexao() as conn:
+        with conn.cursor() as cursor:
+            # Prepara e executa algumas vezes: a partir da 6ª execução o PostgreSQL pode
+            # passar ao plano genérico, que não é replanejado
+            for _ in range(10):
+                pg.executar(cursor, sql, params, preparar='bench_totais')
+                cursor.fetchall()
+            nome = next(n for n in conn.preparadas if n.startswith('bench_totais'))
+
+            plano_direto = tempo_planejamento(cursor, sql, params, 50)
+            plano_preparado = tempo_planejamento(cursor, f'EXECUTE {nome} (%s)', params, 50)
+
+            def direto():
+                cursor.execute(sql, params)
+                cursor.fetchall()
+
+            def preparado():
+                pg.executar(cursor, sql, params, preparar='bench_totais')
+                cursor.fetchall()
+
+            t_direto = cronometrar(direto, args.repeticoes)
+            t_preparado = cronometrar(preparado, args.repeticoes)
+        conn.rollback()
+
+    custos.obtem_totais_orcamento(args.orcamento)   # aquece o cache de custos
+    pg.PREPARAR_CONSULTAS = False
+    t_funcao_direto = cronometrar(lambda: custos.obtem_totais_orcamento(args.orcamento), args.repeticoes)
+    pg.PREPARAR_CONSULTAS = True
+    t_funcao_preparado = cronometrar(lambda: custos.obtem_totais_orcamento(args.orcamento), args.repeticoes)
+
+    print(f"Orçamento {args.orcamento}, {args.repeticoes} repetições")
+    print(f"  {'medida':<36}{'direto':>10}{'preparado':>12}")
+    print(f"  {'Planning Time (ms, mediana)':<36}{plano_direto:>10.3f}{plano_preparado:>12.3f}")
+    print(f"  {'execução na conexão (ms)':<36}{t_direto:>10.3f}{t_preparado:>12.3f}")
+    print(f"  {'obtem_totais_orcamento (ms)':<36}{t_funcao_direto:>10.3f}{t_funcao_preparado:>12.3f}")
+    print(f"  comandos preparados: {pg.estatisticas_preparadas()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Mede o custo por linha de montar e serializar as listas de produtos e movimentações.
+
+Compara a montagem manual dos dicionários (índice a índice, como o pg.py fazia) +
+json padrão com serializacao.Mapeamento + serializacao.dumps_bytes (orjson quando
+instalado). Usa linhas sintéticas com os mesmos tipos que o psycopg2 devolve, então
+não precisa de banco.
+
+Uso (na raiz do repositório):
+    python bench/serializacao.py --linhas 50000
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from routes import serializacao
+from routes.serializacao import Mapeamento, numero, texto, data_hora
+
+
+def gerar_produtos(linhas):
+    return [
+        (i, f'Produto {i}', Decimal(f'{random.uniform(0, 500):.3f}'), 'KG',
+         Decimal(f'{random.uniform(1, 90):.2f}'), random.choice([None, f'789{i:010d}']))
+        for i in range(linhas, 0, -1)
+    ]
+
+
+def gerar_movimentacoes(linhas):
+    inicio = datetime.datetime(2024, 1, 1)
+    return [
+        (i, random.randint(1, 500), f'Produto {i % 500}', random.choice(['ENTRADA', 'SAIDA']),
+         Decimal(f'{random.uniform(0.1, 5):.3f}'), random.choice([None, 'COMPRA']), f'obs {i}',
+         inicio + datetime.timedelta(minutes=i))
+        for i in range(linhas)
+    ]
+
+
+COLUNAS_PRODUTO = ['id', 'descricao', 'quantidade', 'quantificacao', 'valor_unitario', 'ean']
+COLUNAS_MOVIMENTACAO = ['id', 'produto_id', 'produto_descricao', 'tipo_movimentacao',
+                        'quantidade', 'tipo_entrada', 'observacao', 'data_movimentacao']
+
+MAPA_PRODUTO = Mapeamento(quantidade=numero, valor_unitario=numero, ean=texto)
+MAPA_MOVIMENTACAO = Mapeamento(quantidade=numero, data_movimentacao=data_hora)
+
+
+def manual_produtos(resultados):
+    produtos = []
+    for resultado in resultados:
+        produtos.append({
+            'id': resultado[0],
+            'descricao': resultado[1],
+            'quantidade': float(resultado[2]) if resultado[2] else 0,
+            'quantificacao': resultado[3],
+            'valor_unitario': float(resultado[4]) if resultado[4] else 0,
+            'ean': resultado[5] if resultado[5] else ''
+        })
+    return produtos
+
+
+def manual_movimentacoes(resultados):
+    movimentacoes = []
+    for resultado in resultados:
+        movimentacoes.append({
+            'id': resultado[0],
+            'produto_id': resultado[1],
+            'produto_descricao': resultado[2],
+            'tipo_movimentacao': resultado[3],
+            'quantidade': float(resultado[4]) if resultado[4] else 0,
+            'tipo_entrada': resultado[5],
+            'observacao': resultado[6],
+            'data_movimentacao': resultado[7].strftime('%Y-%m-%d %H:%M:%S') if resultado[7] else ''
+        })
+    return movimentacoes
+
+
+def json_padrao(objeto):
+    # Equivalente ao DefaultJSONProvider do Flask com JSON_SORT_KEYS = False
+    return json.dumps(objeto, default=str, ensure_ascii=True).encode('utf-8')
+
+
+def medir(funcao, repeticoes):
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+
+def comparar(nome, linhas, colunas, manual, mapa, repeticoes):
+    t_manual, dicts_manual = medir(lambda: manual(linhas), repeticoes)
+    t_mapa, dicts_mapa = medir(lambda: mapa.aplicar(colunas, linhas), repeticoes)
+    assert dicts_manual == dicts_mapa, 'o mapeamento deve produzir os mesmos dicionários'
+    t_json, _ = medir(lambda: json_padrao({'status': 'sucesso', nome: dicts_manual}), repeticoes)
+    t_rapido, _ = medir(lambda: serializacao.dumps_bytes({'status': 'sucesso', nome: dicts_mapa}), repeticoes)
+
+    n = len(linhas)
+    por_linha = lambda t: t / n * 1e6
+    print(f"\n{nome} ({n} linhas, melhor de {repeticoes})")
+    print(f"  {'etapa':<28}{'antes (µs/linha)':>18}{'depois (µs/linha)':>19}")
+    print(f"  {'montagem dos dicionários':<28}{por_linha(t_manual):>18.3f}{por_linha(t_mapa):>19.3f}")
+    print(f"  {'serialização JSON':<28}{por_linha(t_json):>18.3f}{por_linha(t_rapido):>19.3f}")
+    print(f"  {'total':<28}{por_linha(t_manual + t_json):>18.3f}{por_linha(t_mapa + t_rapido):>19.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--linhas', type=int, default=50000)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(42)
+    print(f"Motor JSON: {serializacao.motor_json()}")
+    comparar('produtos', gerar_produtos(args.linhas), COLUNAS_PRODUTO,
+             manual_produtos, MAPA_PRODUTO, args.repeticoes)
+    comparar('movimentacoes', gerar_movimentacoes(args.linhas), COLUNAS_MOVIMENTACAO,
+             manual_movimentacoes, MAPA_MOVIMENTACAO, args.repeticoes)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,44 @@
+from routes import inicializacao  # primeiro import: marca o início da inicialização
 from flask import Flask
 from flask_cors import CORS
-from routes.routes import setup_routes
+from routes.routes import setup_routes, ProvedorJSON
+from routes import tarefas, eventos, compressao, esquema
 import sys
+import os
 
 sys.dont_write_bytecode = True  # Desativa geração de .pyc
+inicializacao.marcar('imports')
 
-def create_app():
+def iniciar_servicos():
+    """
+    Threads de fundo do processo: snapshots de estoque, compactação das versões das
+    tabelas, escuta do NOTIFY e WebSocket.
+    """
+    tarefas.iniciar_snapshots_estoque()
+    tarefas.iniciar_compactacao_versoes()
+    tarefas.iniciar_ouvinte_alteracoes()
+    eventos.iniciar_servidor_eventos()
+    inicializacao.marcar('servicos')
+
+def create_app(servicos=True):
+    """
+    Cria o app Flask e aplica as migrações e índices do banco. Com servicos=False as threads de
+    fundo não são iniciadas (o gunicorn as inicia em cada worker, depois do fork).
+    """
     app = Flask(__name__)
     CORS(app)
     app.config['JSON_SORT_KEYS'] = False  # Para não ordenar os JSONs
+    app.json = ProvedorJSON(app)
     setup_routes(app)
+    compressao.configurar(app)
+    inicializacao.marcar('rotas')
+    try:
+        esquema.inicializar()
+    except Exception as e:
+        print(f"Erro ao aplicar as migrações e índices do banco: {e}")
+    inicializacao.marcar('banco')
+    if servicos:
+        iniciar_servicos()
     return app
 
 # Só executa se for chamado diretamente
@@ -17,4 +46,5 @@ if __name__ == '__main__':
     from waitress import serve
     app = create_app()
     print("Servidor rodando na rede local em http://0.0.0.0:5080")
-    serve(app, host='0.0.0.0', port=5080)
\ No newline at end of file
+    # O pool de conexões (DB_POOL_MAX) usa o mesmo valor como padrão
+    serve(app, host='0.0.0.0', port=5080, threads=int(os.getenv('WAITRESS_THREADS', '4')))
\ No newline at end of file
@@ -0,0 +1,319 @@
+"""
+Ponto de entrada ASGI, alternativo ao app.py (waitress).
+
+As leituras que passam quase todo o tempo esperando o banco (listagem de produtos e de
+movimentações, total do orçamento e exportação) são atendidas por handlers assíncronos
+com o pool do asyncpg (routes.pg_assincrono): uma consulta lenta não prende uma thread.
+As demais URLs seguem para o app Flask de create_app(), executado em threads pelo
+adaptador WSGI. URLs, JSON, ETag/304, compressão e CORS são os mesmos do app Flask.
+
+Executar a partir de src/:
+    uvicorn asgi:app --host 0.0.0.0 --port 5080
+"""
+from routes import inicializacao  # primeiro import: marca o início da inicialização
+from app import create_app
+from routes import pg, pg_assincrono, custos, cache, compressao, serializacao
+from routes.routes import etag_consulta, parametros_paginacao, formatador_exportacao, FORMATOS_EXPORTACAO
+from a2wsgi import WSGIMiddleware
+from functools import wraps
+from urllib.parse import parse_qsl
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_etags
+import os
+import re
+
+# Threads que executam as rotas do app Flask (as que não têm handler assíncrono)
+ASGI_THREADS_WSGI = int(os.getenv('ASGI_THREADS_WSGI', os.getenv('WAITRESS_THREADS', '4')))
+
+# region Requisição e resposta
+class Requisicao:
+    """Os dados da requisição ASGI usados pelos handlers."""
+
+    def __init__(self, scope):
+        query_string = scope['query_string'].decode('latin-1')
+        cabecalhos = {nome.decode('latin-1').lower(): valor.decode('latin-1') for nome, valor in scope['headers']}
+        self.path = scope['path']
+        self.full_path = f"{self.path}?{query_string}"   # como request.full_path do Flask
+        self.args = MultiDict(parse_qsl(query_string, keep_blank_values=True))
+        self.if_none_match = parse_etags(cabecalhos.get('if-none-match'))
+        self.codificacao = compressao.codificacao_aceita(cabecalhos.get('accept-encoding', ''))
+
+class Resposta:
+    """
+    Resposta de um handler. `corpo` são os bytes da resposta; `blocos`, se informado,
+    é um gerador assíncrono de textos enviado em streaming (sem compressão, como no Flask).
+    """
+
+    def __init__(self, corpo=b'', status=200, tipo='application/json', blocos=None, cabecalhos=None):
+        self.corpo = corpo
+        self.status = status
+        self.tipo = tipo
+        self.blocos = blocos
+        self.etag = None
+        self.cabecalhos = dict(cabecalhos or {})
+
+    async def enviar(self, send, requisicao):
+        cabecalhos = {'access-control-allow-origin': '*', **self.cabecalhos}
+        if self.status != 304:
+            cabecalhos['content-type'] = self.tipo
+        etag = self.etag
+        corpo = self.corpo
+        if self.blocos is None:
+            cabecalhos['vary'] = 'Accept-Encoding'
+            if (requisicao.codificacao and self.status not in (204, 304)
+                    and len(corpo) >= compressao.COMPRESSAO_MINIMO):
+                corpo = compressao.comprimir_bytes(corpo, requisicao.codificacao)
+                cabecalhos['content-encoding'] = requisicao.codificacao
+                if etag:
+                    etag = f'{etag}-{requisicao.codificacao}'
+            cabecalhos['content-length'] = str(len(corpo))
+        if etag:
+            cabecalhos['etag'] = f'"{etag}"'
+
+        await send({
+            'type': 'http.response.start',
+            'status': self.status,
+            'headers': [(nome.encode('latin-1'), valor.encode('latin-1')) for nome, valor in cabecalhos.items()]
+        })
+        if self.blocos is None:
+            await send({'type': 'http.response.body', 'body': corpo})
+            return
+        try:
+            async for texto in self.blocos:
+                await send({'type': 'http.response.body', 'body': texto.encode('utf-8'), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            await self.blocos.aclose()
+
+def jsonify(dados, status=200):
+    return Resposta(serializacao.dumps_bytes(dados), status)
+
+def resposta_erro(e, status=500):
+    return jsonify({
+        "status": "erro",
+        "mensagem": str(e)
+    }, status)
+#endregion
+
+# region Roteamento
+ROTAS = []   # (método, regex do caminho, conversores, handler)
+
+def rota(caminho, metodo='GET'):
+    """Registra um handler assíncrono; o caminho usa a sintaxe do Flask (<int:id>, <nome>)."""
+    partes = re.split(r'<(?:(int):)?(\w+)>', caminho)
+    padrao = re.escape(partes[0])
+    conversores = {}
+    for i in range(1, len(partes), 3):
+        conversor, nome, literal = partes[i:i + 3]
+        if conversor == 'int':
+            padrao += rf'(?P<{nome}>\d+)'
+            conversores[nome] = int
+        else:
+            padrao += rf'(?P<{nome}>[^/]+)'
+        padrao += re.escape(literal)
+
+    def decorador(handler):
+        ROTAS.append((metodo, re.compile(padrao + '$'), conversores, handler))
+        return handler
+    return decorador
+
+def encontrar_rota(metodo, caminho):
+    """Retorna (handler, argumentos) ou None se a URL fica com o app Flask."""
+    for metodo_rota, padrao, conversores, handler in ROTAS:
+        if metodo_rota != metodo:
+            continue
+        encontrado = padrao.match(caminho)
+        if encontrado:
+            argumentos = {
+                nome: conversores.get(nome, str)(valor) for nome, valor in encontrado.groupdict().items()
+            }
+            return handler, argumentos
+    return None
+
+def condicional(*tabelas):
+    """Equivalente de routes.condicional para os handlers assíncronos."""
+    def decorador(handler):
+        @wraps(handler)
+        async def wrapper(requisicao, **kwargs):
+            try:
+                versoes = await pg_assincrono.versoes_tabelas(tabelas)
+            except Exception as e:
+                print(f"ETag indisponível: {e}")
+                return await handler(requisicao, **kwargs)
+
+            etag = etag_consulta(requisicao.full_path, versoes)
+            codificacao = requisicao.codificacao
+            variantes = [etag, f'{etag}-{codificacao}'] if codificacao else [etag]
+            correspondente = next((e for e in variantes if requisicao.if_none_match.contains(e)), None)
+            if correspondente:
+                resposta = Resposta(status=304)
+                resposta.etag = correspondente
+            else:
+                with cache.versoes_lidas(tabelas, versoes):
+                    resposta = await handler(requisicao, **kwargs)
+                if resposta.status != 200:
+                    return resposta
+                resposta.etag = etag
+            # Obriga o navegador a revalidar, o que normalmente termina em 304
+            resposta.cabecalhos['cache-control'] = 'no-cache'
+            return resposta
+        return wrapper
+    return decorador
+#endregion
+
+# region Handlers assíncronos
+@rota('/produtos')
+@condicional('produtos')
+async def listar_produto(requisicao):
+    try:
+        produtos, proximo_cursor = await pg_assincrono.obtem_produtos(
+            q=requisicao.args.get('q') or None,
+            **parametros_paginacao(requisicao.args)
+        )
+
+        return jsonify({
+            "status": "sucesso",
+            "produtos": produtos,
+            "proximo_cursor": proximo_cursor
+        })
+    except Exception as e:
+        return resposta_erro(e)
+
+@rota('/produtos/<int:id>')
+@condicional('produtos')
+async def obter_produto(requisicao, id):
+    try:
+        produtos, _ = await pg_assincrono.obtem_produtos(id=id)
+        if not produtos:
+            return resposta_erro("Produto não encontrado", 404)
+
+        return jsonify({
+            "status": "sucesso",
+            "produto": produtos[0]
+        })
+    except Exception as e:
+        return resposta_erro(e)
+
+@rota('/orcamento/<int:orcamento_id>/total')
+@condicional('orcamento', 'item_orcamento', 'receita', 'item_receita', 'produtos', 'movimentacoes_estoque')
+async def obtem_totais_orcamento(requisicao, orcamento_id):
+    try:
+        totais = await custos.obtem_totais_orcamento_assincrono(orcamento_id)
+
+        return jsonify({
+            "status": "sucesso",
+            "data": totais
+        })
+    except Exception as e:
+        return resposta_erro(e)
+
+@rota('/estoque/movimentacoes')
+@condicional('movimentacoes_estoque', 'produtos')
+async def listar_movimentacoes_estoque(requisicao):
+    try:
+        args = requisicao.args
+        produto_id = args.get('produto_id', type=int)
+        tipo = args.get('tipo') or None
+        if tipo and tipo not in ['ENTRADA', 'SAIDA']:
+            raise ValueError("tipo deve ser 'ENTRADA' ou 'SAIDA'")
+
+        movimentacoes, proximo_cursor = await pg_assincrono.obtem_movimentacoes_estoque(
+            produto_id if produto_id else None,
+            tipo=tipo,
+            desde=args.get('desde') or None,
+            ate=args.get('ate') or None,
+            **parametros_paginacao(args)
+        )
+
+        return jsonify({
+            "status": "sucesso",
+            "movimentacoes": movimentacoes,
+            "proximo_cursor": proximo_cursor
+        })
+    except Exception as e:
+        return resposta_erro(e)
+
+@rota('/export/<entidade>.<formato>')
+async def exportar(requisicao, entidade, formato):
+    """Exporta movimentacoes, saldo ou produtos em CSV ou NDJSON, em streaming."""
+    try:
+        if formato not in FORMATOS_EXPORTACAO:
+            raise ValueError(f"Formato de exportação inválido: {formato}")
+        args = requisicao.args
+        blocos = pg_assincrono.exportar(
+            entidade,
+            produto_id=args.get('produto_id', type=int),
+            tipo=args.get('tipo') or None,
+            desde=args.get('desde') or None,
+            ate=args.get('ate') or None,
+            q=args.get('q') or None
+        )
+        # Lê as colunas antes de responder: erros de consulta ainda viram JSON
+        colunas = await blocos.__anext__()
+    except pg.pool.PoolError as e:
+        resposta = resposta_erro(e, 503)
+        resposta.cabecalhos['retry-after'] = '5'
+        return resposta
+    except Exception as e:
+        return resposta_erro(e)
+
+    async def gerar():
+        cabecalho, formatar = formatador_exportacao(formato, colunas)
+        try:
+            if cabecalho:
+                yield cabecalho
+            async for bloco in blocos:
+                yield formatar(bloco)
+        finally:
+            await blocos.aclose()
+
+    return Resposta(tipo=FORMATOS_EXPORTACAO[formato], blocos=gerar(), cabecalhos={
+        'content-disposition': f'attachment; filename="{entidade}.{formato}"',
+        'cache-control': 'no-store'
+    })
+
+@rota('/status/asgi')
+async def status_asgi(requisicao):
+    try:
+        return jsonify({
+            "status": "sucesso",
+            "pool": pg_assincrono.estatisticas(),
+            "rotas_assincronas": [f"{metodo} {padrao.pattern}" for metodo, padrao, _, _ in ROTAS],
+            "threads_wsgi": ASGI_THREADS_WSGI
+        })
+    except Exception as e:
+        return resposta_erro(e)
+#endregion
+
+class AplicacaoASGI:
+    """Encaminha as rotas de ROTAS para os handlers assíncronos e o resto para o app WSGI."""
+
+    def __init__(self, wsgi):
+        self.wsgi = WSGIMiddleware(wsgi, workers=ASGI_THREADS_WSGI)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._ciclo_de_vida(receive, send)
+            return
+        if scope['type'] == 'http':
+            encontrado = encontrar_rota(scope['method'], scope['path'])
+            if encontrado:
+                handler, argumentos = encontrado
+                requisicao = Requisicao(scope)
+                resposta = await handler(requisicao, **argumentos)
+                await resposta.enviar(send, requisicao)
+                return
+        await self.wsgi(scope, receive, send)
+
+    async def _ciclo_de_vida(self, receive, send):
+        while True:
+            mensagem = await receive()
+            if mensagem['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensagem['type'] == 'lifespan.shutdown':
+                await pg_assincrono.fechar_pool()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+app = AplicacaoASGI(create_app())
+inicializacao.marcar('asgi')
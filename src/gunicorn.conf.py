@@ -0,0 +1,87 @@
+"""
+Configuração do gunicorn para produção (Linux): vários processos com o app pré-carregado.
+
+Executar a partir de src/ (ou pelo ../start_server.sh):
+    gunicorn -c gunicorn.conf.py
+
+O app é carregado uma vez no processo mestre (preload_app), então as migrações rodam só
+ali e os workers herdam o código já importado. Conexões e threads não sobrevivem ao fork:
+o mestre fecha o pool antes de cada fork e cada worker inicia depois os seus serviços de
+fundo (snapshots, escuta do NOTIFY e WebSocket, com a porta compartilhada entre workers).
+
+Variáveis de ambiente (também lidas do .env):
+    GUNICORN_WORKERS       processos (padrão: número de CPUs)
+    GUNICORN_THREADS       threads por processo (padrão: WAITRESS_THREADS ou 4)
+    DB_CONEXOES_TOTAL      conexões ao PostgreSQL de todos os workers juntos (padrão 40);
+                           cada worker usa uma na escuta do NOTIFY e EXPORTAR_SIMULTANEAS
+                           nas exportações, e o resto vira DB_POOL_MAX. Se o orçamento não
+                           dá ao menos uma conexão de pool por worker, o gunicorn não sobe
+    GUNICORN_TIMEOUT       segundos sem resposta antes de reiniciar o worker (padrão 60)
+    GUNICORN_MAX_REQUESTS  requisições até reciclar o worker (padrão 2000, 0 desliga)
+    PORTA                  porta HTTP (padrão 5080)
+
+Recarga: HUP no mestre recria os workers sem derrubar a porta, mas com o app pré-carregado
+o código continua o mesmo; para publicar código novo use USR2 (sobe um mestre novo) e TERM
+no antigo - é o que o "start_server.sh recarregar" faz.
+"""
+from dotenv import load_dotenv
+import multiprocessing
+import os
+
+load_dotenv('.env')
+
+def _inteiro(nome, padrao):
+    return int(os.getenv(nome) or padrao)
+
+workers = _inteiro('GUNICORN_WORKERS', multiprocessing.cpu_count())
+worker_class = 'gthread'
+threads = _inteiro('GUNICORN_THREADS', os.getenv('WAITRESS_THREADS') or 4)
+bind = f"0.0.0.0:{_inteiro('PORTA', 5080)}"
+wsgi_app = 'app:create_app(servicos=False)'
+preload_app = True
+
+timeout = _inteiro('GUNICORN_TIMEOUT', 60)
+graceful_timeout = _inteiro('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = 5
+# O jitter evita que todos os workers reciclem ao mesmo tempo
+max_requests = _inteiro('GUNICORN_MAX_REQUESTS', 2000)
+max_requests_jitter = max_requests // 10
+
+pidfile = os.getenv('GUNICORN_PIDFILE', os.path.join(os.path.dirname(os.getcwd()), 'server.pid'))
+errorlog = '-'
+accesslog = os.getenv('GUNICORN_ACCESSLOG') or None
+
+# region Orçamento de conexões
+# Lido por routes.pg quando o app é importado (depois desta configuração)
+DB_CONEXOES_TOTAL = _inteiro('DB_CONEXOES_TOTAL', 40)
+_conexao_escuta = 0 if os.getenv('OUVIR_ALTERACOES') == 'desligado' else 1
+_conexoes_exportacao = _inteiro('EXPORTAR_SIMULTANEAS', 2)
+_pool_por_worker = DB_CONEXOES_TOTAL // workers - _conexao_escuta - _conexoes_exportacao
+if _pool_por_worker < 1:
+    raise RuntimeError(
+        f"DB_CONEXOES_TOTAL={DB_CONEXOES_TOTAL} não comporta {workers} worker(s) com "
+        f"{_conexao_escuta + _conexoes_exportacao + 1} conexão(ões) cada (escuta, exportações e pool); "
+        f"reduza GUNICORN_WORKERS ou EXPORTAR_SIMULTANEAS ou aumente DB_CONEXOES_TOTAL"
+    )
+os.environ['DB_POOL_MAX'] = str(_pool_por_worker)
+os.environ['DB_POOL_MIN'] = str(min(_inteiro('DB_POOL_MIN', 1), _pool_por_worker))
+os.environ.setdefault('WS_COMPARTILHAR_PORTA', 'ligado')
+#endregion
+
+def when_ready(server):
+    server.log.info(
+        f"{workers} worker(s) x {threads} thread(s); pool de {_pool_por_worker} conexão(ões) por worker, "
+        f"{workers * (_pool_por_worker + _conexao_escuta + _conexoes_exportacao)} no total "
+        f"(orçamento DB_CONEXOES_TOTAL={DB_CONEXOES_TOTAL})"
+    )
+    if _pool_por_worker < threads:
+        server.log.warning("DB_POOL_MAX menor que as threads por worker: requisições vão esperar por conexão")
+
+def pre_fork(server, worker):
+    # Conexões abertas pelo mestre (migrações) não podem ser herdadas pelos workers
+    from routes import pg
+    pg.fechar_pool()
+
+def post_fork(server, worker):
+    import app
+    app.iniciar_servicos()
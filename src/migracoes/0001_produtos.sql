@@ -0,0 +1,33 @@
+-- Tabela de produtos. Bancos antigos usavam nome/unidade/preco: renomeia se ainda existirem.
+CREATE TABLE IF NOT EXISTS public.produtos (
+    id SERIAL PRIMARY KEY,
+    descricao VARCHAR(255) NOT NULL,
+    quantidade DECIMAL(10,3) NOT NULL,
+    quantificacao VARCHAR(50) NOT NULL,
+    valor_unitario DECIMAL(10,2) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    deleted_at TIMESTAMP
+);
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+                WHERE table_schema = 'public' AND table_name = 'produtos' AND column_name = 'nome') THEN
+        ALTER TABLE public.produtos RENAME COLUMN nome TO descricao;
+    END IF;
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+                WHERE table_schema = 'public' AND table_name = 'produtos' AND column_name = 'unidade') THEN
+        ALTER TABLE public.produtos RENAME COLUMN unidade TO quantidade;
+    END IF;
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+                WHERE table_schema = 'public' AND table_name = 'produtos' AND column_name = 'preco') THEN
+        ALTER TABLE public.produtos RENAME COLUMN preco TO valor_unitario;
+    END IF;
+END
+$$;
+
+ALTER TABLE public.produtos ALTER COLUMN quantidade TYPE DECIMAL(10,3);
+
+-- Lida pelas listagens de produtos
+ALTER TABLE public.produtos ADD COLUMN IF NOT EXISTS ean VARCHAR(50);
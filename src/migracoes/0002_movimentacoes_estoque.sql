@@ -0,0 +1,16 @@
+-- Razão de movimentações de estoque
+CREATE TABLE IF NOT EXISTS public.movimentacoes_estoque (
+    id SERIAL PRIMARY KEY,
+    produto_id INTEGER NOT NULL REFERENCES public.produtos(id),
+    tipo_movimentacao VARCHAR(20) NOT NULL CHECK (tipo_movimentacao IN ('ENTRADA', 'SAIDA')),
+    quantidade DECIMAL(10,3) NOT NULL,
+    tipo_entrada VARCHAR(20) CHECK (tipo_entrada IN ('MANUAL', 'COMPRA')),
+    observacao TEXT,
+    data_movimentacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    deleted_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_movimentacoes_produto ON public.movimentacoes_estoque(produto_id);
+CREATE INDEX IF NOT EXISTS idx_movimentacoes_data ON public.movimentacoes_estoque(data_movimentacao);
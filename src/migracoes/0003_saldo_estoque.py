@@ -0,0 +1,21 @@
+"""Tabela resumo de saldos, preenchida a partir do razão quando é criada."""
+from routes import pg
+
+
+def aplicar(cursor):
+    cursor.execute("SELECT to_regclass('public.saldo_estoque') IS NOT NULL")
+    if cursor.fetchone()[0]:
+        return
+    cursor.execute('''
+    CREATE TABLE public.saldo_estoque (
+        produto_id INTEGER PRIMARY KEY REFERENCES public.produtos(id),
+        saldo DECIMAL(14,3) NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    cursor.execute('LOCK TABLE public.movimentacoes_estoque IN SHARE MODE')
+    cursor.execute(f'''
+    INSERT INTO public.saldo_estoque (produto_id, saldo)
+    {pg.SQL_SALDO_RAZAO}
+    ON CONFLICT (produto_id) DO NOTHING
+    ''')
@@ -0,0 +1,15 @@
+-- Snapshots periódicos de saldo (tarefas.iniciar_snapshots_estoque)
+CREATE TABLE IF NOT EXISTS public.snapshot_estoque (
+    data_referencia DATE PRIMARY KEY,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS public.snapshot_estoque_saldo (
+    data_referencia DATE NOT NULL REFERENCES public.snapshot_estoque(data_referencia) ON DELETE CASCADE,
+    produto_id INTEGER NOT NULL REFERENCES public.produtos(id),
+    saldo DECIMAL(14,3) NOT NULL,
+    PRIMARY KEY (data_referencia, produto_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_snapshot_estoque_saldo_produto
+    ON public.snapshot_estoque_saldo (produto_id, data_referencia);
@@ -0,0 +1,29 @@
+-- Índices únicos parciais usados pelos upserts de item_receita e item_orcamento.
+-- Antes de criar, marca como excluídas as duplicatas ativas, mantendo o registro mais recente.
+UPDATE public.item_receita ir
+   SET deleted_at = CURRENT_TIMESTAMP
+ WHERE ir.deleted_at IS NULL
+   AND EXISTS (SELECT 1
+                 FROM public.item_receita d
+                WHERE d.deleted_at IS NULL
+                  AND d.receita_id = ir.receita_id
+                  AND d.produto_id = ir.produto_id
+                  AND d.id > ir.id);
+
+UPDATE public.item_orcamento io
+   SET deleted_at = CURRENT_TIMESTAMP
+ WHERE io.deleted_at IS NULL
+   AND EXISTS (SELECT 1
+                 FROM public.item_orcamento d
+                WHERE d.deleted_at IS NULL
+                  AND d.orcamento_id = io.orcamento_id
+                  AND d.receita_id = io.receita_id
+                  AND d.id > io.id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_item_receita_unico
+    ON public.item_receita (receita_id, produto_id)
+ WHERE deleted_at IS NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_item_orcamento_unico
+    ON public.item_orcamento (orcamento_id, receita_id)
+ WHERE deleted_at IS NULL;
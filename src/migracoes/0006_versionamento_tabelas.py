@@ -0,0 +1,39 @@
+"""
+Tabela versao_tabela e, em cada tabela de pg.TABELAS_VERSIONADAS, um trigger por comando
+que incrementa a versão (usada nos ETags). Uma tabela nova na lista exige uma nova migração.
+"""
+from psycopg2 import sql
+from routes import pg
+
+
+def aplicar(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS public.versao_tabela (
+        tabela VARCHAR(63) PRIMARY KEY,
+        versao BIGINT NOT NULL DEFAULT 0
+    );
+
+    CREATE OR REPLACE FUNCTION public.incrementa_versao_tabela() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO public.versao_tabela (tabela, versao)
+        VALUES (TG_TABLE_NAME, 1)
+        ON CONFLICT (tabela) DO UPDATE SET versao = versao_tabela.versao + 1;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    ''')
+    for tabela in pg.TABELAS_VERSIONADAS:
+        cursor.execute('''
+        SELECT to_regclass(%s) IS NOT NULL
+           AND NOT EXISTS (SELECT 1 FROM pg_trigger
+                            WHERE tgname = %s
+                              AND tgrelid = to_regclass(%s))
+        ''', (f'public.{tabela}', f'trg_versao_{tabela}', f'public.{tabela}'))
+        if cursor.fetchone()[0]:
+            cursor.execute(sql.SQL('''
+            CREATE TRIGGER {} AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {}
+            FOR EACH STATEMENT EXECUTE PROCEDURE public.incrementa_versao_tabela()
+            ''').format(
+                sql.Identifier(f'trg_versao_{tabela}'),
+                sql.Identifier('public', tabela)
+            ))
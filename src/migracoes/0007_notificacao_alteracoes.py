@@ -0,0 +1,49 @@
+"""
+Trigger por linha, em cada tabela de pg.TABELAS_NOTIFICADAS, que publica
+{"tabela", "operacao", <chaves>} no canal pg.CANAL_ALTERACOES. Payloads iguais na mesma
+transação são agrupados pelo PostgreSQL, então um lote gera uma notificação por chave.
+"""
+from psycopg2 import sql
+from routes import pg
+
+
+def aplicar(cursor):
+    cursor.execute(f'''
+    CREATE OR REPLACE FUNCTION public.notifica_alteracao() RETURNS trigger AS $$
+    DECLARE
+        registro jsonb;
+        payload jsonb;
+        par text[];
+        i integer;
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            registro := to_jsonb(OLD);
+        ELSE
+            registro := to_jsonb(NEW);
+        END IF;
+        payload := jsonb_build_object('tabela', TG_TABLE_NAME, 'operacao', TG_OP);
+        FOR i IN 0 .. TG_NARGS - 1 LOOP
+            par := string_to_array(TG_ARGV[i], '=');
+            payload := payload || jsonb_build_object(par[2], registro -> par[1]);
+        END LOOP;
+        PERFORM pg_notify('{pg.CANAL_ALTERACOES}', payload::text);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    ''')
+    for tabela, colunas in pg.TABELAS_NOTIFICADAS.items():
+        cursor.execute('''
+        SELECT to_regclass(%s) IS NOT NULL
+           AND NOT EXISTS (SELECT 1 FROM pg_trigger
+                            WHERE tgname = %s
+                              AND tgrelid = to_regclass(%s))
+        ''', (f'public.{tabela}', f'trg_notifica_{tabela}', f'public.{tabela}'))
+        if cursor.fetchone()[0]:
+            cursor.execute(sql.SQL('''
+            CREATE TRIGGER {} AFTER INSERT OR UPDATE OR DELETE ON {}
+            FOR EACH ROW EXECUTE PROCEDURE public.notifica_alteracao({})
+            ''').format(
+                sql.Identifier(f'trg_notifica_{tabela}'),
+                sql.Identifier('public', tabela),
+                sql.SQL(', ').join(sql.Literal(c) for c in colunas)
+            ))
@@ -0,0 +1,43 @@
+"""
+Índices parciais (WHERE deleted_at IS NULL) das chaves de junção e de ordenação das
+consultas da aplicação (esquema.INDICES), criados com CREATE INDEX CONCURRENTLY, com o
+relatório de planos antes/depois.
+"""
+from routes import esquema
+
+# CREATE INDEX CONCURRENTLY não roda dentro de uma transação
+TRANSACAO = False
+
+# (tabela, comando); as tabelas que ainda não existem no banco são puladas
+INDICES = [
+    ('item_receita',
+     'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_item_receita_produto '
+     'ON public.item_receita (produto_id) WHERE deleted_at IS NULL'),
+    ('item_orcamento',
+     'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_item_orcamento_receita '
+     'ON public.item_orcamento (receita_id) WHERE deleted_at IS NULL'),
+    ('movimentacoes_estoque',
+     'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_movimentacoes_produto_data '
+     'ON public.movimentacoes_estoque (produto_id, data_movimentacao) WHERE deleted_at IS NULL'),
+    ('movimentacoes_estoque',
+     'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_movimentacoes_data_id '
+     'ON public.movimentacoes_estoque (data_movimentacao, id) WHERE deleted_at IS NULL'),
+    ('produtos',
+     'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_produtos_descricao '
+     'ON public.produtos (descricao, id) WHERE deleted_at IS NULL'),
+]
+
+
+def aplicar(cursor):
+    # Na conexão de migrar(), que tem o lock: outra conexão do pool esperaria por ele
+    antes = esquema.planos(cursor.connection)
+    tabelas = set()
+    for tabela, comando in INDICES:
+        cursor.execute('SELECT to_regclass(%s)', (f'public.{tabela}',))
+        if cursor.fetchone()[0] is None:
+            continue
+        cursor.execute(comando)
+        tabelas.add(f'public.{tabela}')
+    if tabelas:
+        cursor.execute(f"ANALYZE {', '.join(sorted(tabelas))}")
+    esquema.registrar_relatorio(list(esquema.INDICES), antes, esquema.planos(cursor.connection))
@@ -0,0 +1,19 @@
+-- A versão de cada tabela (usada nos ETags) deixa de ser um UPDATE em uma linha
+-- compartilhada, que enfileirava todas as escritas concorrentes na mesma tabela até o
+-- COMMIT. O trigger por comando passa a só inserir uma linha em versao_tabela_log, e a
+-- versão é versao_tabela.versao + a quantidade de linhas da tabela no log. Inserções não
+-- disputam lock entre si e, como são transacionais, a versão só muda quando a escrita é
+-- confirmada (um nextval mudaria antes do COMMIT e o ETag novo poderia ser servido com os
+-- dados antigos). pg.compactar_versoes_tabelas move periodicamente o log para versao_tabela.
+CREATE TABLE IF NOT EXISTS public.versao_tabela_log (
+    tabela VARCHAR(63) NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_versao_tabela_log_tabela ON public.versao_tabela_log (tabela);
+
+CREATE OR REPLACE FUNCTION public.incrementa_versao_tabela() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO public.versao_tabela_log (tabela) VALUES (TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,225 @@
+"""
+Cache em memória para as consultas de leitura do pg.py.
+
+As entradas expiram por tempo (TTL), o total é limitado (LRU) e cada entrada é
+marcada com as tabelas de que depende; uma escrita em qualquer uma delas descarta
+as entradas marcadas. Uma entrada restrita a um registro (ex.: os itens da receita 5)
+guarda também o seu escopo ({'receita_id': 5}), e uma alteração que informa outro valor
+para a mesma chave não a descarta. Os valores são compartilhados entre requisições:
+quem lê não deve alterá-los.
+
+A invalidação depende do aviso da escrita (local ou NOTIFY de outro processo), que
+chega depois do commit. Por isso as rotas com ETag (routes.condicional) informam as
+versões das tabelas que leram (versoes_lidas) e cada entrada guarda as versões da
+requisição que a calculou: uma entrada anterior às versões do ETag é calculada de novo,
+e a resposta nunca traz dados mais velhos que o ETag que a acompanha.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+import contextvars
+import inspect
+import os
+import threading
+import time
+
+CACHE_TTL = float(os.getenv('CACHE_TTL', '60'))       # segundos; 0 desliga o cache
+CACHE_MAX = int(os.getenv('CACHE_MAX', '256'))        # número máximo de entradas
+
+class CacheTTL:
+    """Cache LRU com expiração por tempo e invalidação por tabela."""
+
+    def __init__(self, ttl, tamanho_maximo):
+        self.ttl = ttl
+        self.tamanho_maximo = tamanho_maximo
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()   # chave -> (expira_em, tabelas, valor, escopo, versoes)
+        self._geracoes = {}              # tabela -> contador de invalidações
+        self._geracao_global = 0         # contador de invalidações totais
+        self._stats = {
+            'acertos': 0, 'faltas': 0, 'invalidacoes': 0, 'expiradas': 0, 'removidas_lru': 0,
+            'desatualizadas': 0
+        }
+
+    def obter(self, chave, versoes=None):
+        """
+        Retorna (True, valor) se a chave estiver no cache e válida, senão (False, None).
+        Com `versoes` ({tabela: versão}), uma entrada calculada antes delas não é válida.
+        """
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                self._stats['faltas'] += 1
+                return False, None
+            if entrada[0] < time.monotonic():
+                del self._entradas[chave]
+                self._stats['expiradas'] += 1
+                self._stats['faltas'] += 1
+                return False, None
+            if versoes and anterior_as_versoes(entrada[1], entrada[4], versoes):
+                del self._entradas[chave]
+                self._stats['desatualizadas'] += 1
+                self._stats['faltas'] += 1
+                return False, None
+            self._entradas.move_to_end(chave)
+            self._stats['acertos'] += 1
+            return True, entrada[2]
+
+    def _geracao(self, tabelas):
+        return (self._geracao_global,) + tuple(self._geracoes.get(tabela, 0) for tabela in tabelas)
+
+    def geracao(self, tabelas):
+        with self._lock:
+            return self._geracao(tabelas)
+
+    def gravar(self, chave, tabelas, valor, geracao, escopo=None, versoes=None):
+        """
+        Grava o valor, a menos que alguma das tabelas tenha sido invalidada desde `geracao`.
+        `escopo` ({chave de notificação: valor}) restringe as invalidações que o descartam;
+        `versoes` são as versões das tabelas lidas antes de calcular o valor.
+        """
+        with self._lock:
+            if self._geracao(tabelas) != geracao:
+                return
+            self._entradas[chave] = (time.monotonic() + self.ttl, tabelas, valor, escopo or {}, versoes or {})
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.tamanho_maximo:
+                self._entradas.popitem(last=False)
+                self._stats['removidas_lru'] += 1
+
+    def invalidar(self, tabela=None, chaves=None):
+        """
+        Descarta as entradas que dependem da tabela (ou todas, se tabela for None).
+        Com `chaves` (ex.: {'produto_id': 7}) mantém as entradas cujo escopo tem outro
+        valor para alguma dessas chaves.
+        """
+        chaves = {chave: str(valor) for chave, valor in (chaves or {}).items() if valor is not None}
+        with self._lock:
+            self._stats['invalidacoes'] += 1
+            if tabela is None:
+                self._geracao_global += 1
+                self._entradas.clear()
+                return
+            self._geracoes[tabela] = self._geracoes.get(tabela, 0) + 1
+            afetadas = [
+                c for c, entrada in self._entradas.items()
+                if tabela in entrada[1] and not _fora_do_escopo(entrada[3], chaves)
+            ]
+            for chave in afetadas:
+                del self._entradas[chave]
+
+    def estatisticas(self):
+        with self._lock:
+            consultas = self._stats['acertos'] + self._stats['faltas']
+            return {
+                'entradas': len(self._entradas),
+                'tamanho_maximo': self.tamanho_maximo,
+                'ttl': self.ttl,
+                'taxa_acerto': round(self._stats['acertos'] / consultas, 4) if consultas else 0.0,
+                **self._stats
+            }
+
+# region Versões lidas pela requisição
+# {tabela: versão} lidas por routes.condicional para o ETag da requisição em andamento.
+# ContextVar: vale para a thread da requisição no Flask e para a tarefa no ASGI.
+_versoes_requisicao = contextvars.ContextVar('versoes_requisicao', default=None)
+
+@contextmanager
+def versoes_lidas(tabelas, versoes):
+    """Dentro do bloco, valores em cache anteriores a essas versões das tabelas são ignorados."""
+    token = _versoes_requisicao.set(dict(zip(tabelas, versoes)))
+    try:
+        yield
+    finally:
+        _versoes_requisicao.reset(token)
+
+def versoes_requisicao():
+    """Versões lidas pela requisição em andamento ({} fora de uma rota com ETag)."""
+    return _versoes_requisicao.get() or {}
+
+def anterior_as_versoes(tabelas, calculado_em, versoes):
+    """
+    True se um valor que depende de `tabelas`, calculado com as versões `calculado_em`,
+    é mais velho que `versoes` em alguma delas (versão desconhecida conta como mais velha).
+    """
+    return any(
+        tabela in tabelas and calculado_em.get(tabela, -1) < versao
+        for tabela, versao in versoes.items()
+    )
+#endregion
+
+def _fora_do_escopo(escopo, chaves):
+    """True se a alteração (chaves) é de outro registro que não o do escopo da entrada."""
+    return any(chave in chaves and chaves[chave] != valor for chave, valor in escopo.items())
+
+cache = CacheTTL(CACHE_TTL, CACHE_MAX)
+
+def _chave(funcao, args, kwargs):
+    # O módulo entra na chave: pg.obtem_produtos e pg_assincrono.obtem_produtos são funções diferentes
+    return (funcao.__module__, funcao.__name__, args, tuple(sorted(kwargs.items())))
+
+def _escopo_da_chamada(assinatura, escopo, args, kwargs):
+    """{chave de notificação: valor} dos parâmetros ligados em `escopo`."""
+    if not escopo:
+        return None
+    argumentos = assinatura.bind(*args, **kwargs)
+    argumentos.apply_defaults()
+    valores = {chave: argumentos.arguments[parametro] for chave, parametro in escopo.items()}
+    return {chave: str(valor) for chave, valor in valores.items() if valor is not None}
+
+def memoizar(*tabelas, **escopo):
+    """
+    Decorador: guarda o resultado da função por argumentos, dependente das tabelas informadas.
+    `escopo` liga chaves das notificações a parâmetros da função, ex.:
+    @memoizar('item_receita', 'produtos', receita_id='id') - a entrada de obtem_itens_receita(5)
+    não é descartada por alterações da receita 3.
+    """
+    def decorador(funcao):
+        if CACHE_TTL <= 0:
+            return funcao
+        assinatura = inspect.signature(funcao)
+
+        @wraps(funcao)
+        def wrapper(*args, **kwargs):
+            chave = _chave(funcao, args, kwargs)
+            versoes = versoes_requisicao()
+            encontrado, valor = cache.obter(chave, versoes)
+            if encontrado:
+                return valor
+            geracao = cache.geracao(tabelas)
+            valor = funcao(*args, **kwargs)
+            cache.gravar(chave, tabelas, valor, geracao, _escopo_da_chamada(assinatura, escopo, args, kwargs), versoes)
+            return valor
+        return wrapper
+    return decorador
+
+def memoizar_assincrono(*tabelas, **escopo):
+    """
+    memoizar para funções async: guarda o resultado aguardado, não a corrotina (que só
+    pode ser aguardada uma vez).
+    """
+    def decorador(funcao):
+        if CACHE_TTL <= 0:
+            return funcao
+        assinatura = inspect.signature(funcao)
+
+        @wraps(funcao)
+        async def wrapper(*args, **kwargs):
+            chave = _chave(funcao, args, kwargs)
+            versoes = versoes_requisicao()
+            encontrado, valor = cache.obter(chave, versoes)
+            if encontrado:
+                return valor
+            geracao = cache.geracao(tabelas)
+            valor = await funcao(*args, **kwargs)
+            cache.gravar(chave, tabelas, valor, geracao, _escopo_da_chamada(assinatura, escopo, args, kwargs), versoes)
+            return valor
+        return wrapper
+    return decorador
+
+def ao_alterar(tabela, chaves):
+    """Ouvinte de pg.notificar_alteracao: descarta só as entradas que a alteração pode afetar."""
+    cache.invalidar(tabela, chaves)
+
+def estatisticas():
+    return cache.estatisticas()
@@ -0,0 +1,121 @@
+"""
+Compressão das respostas HTTP (gzip e, se o pacote brotli estiver instalado, br).
+
+A codificação é negociada pelo Accept-Encoding; só são comprimidas respostas de tipos
+textuais a partir de COMPRESSAO_MINIMO bytes. O ETag de uma resposta comprimida
+recebe o sufixo da codificação (ex.: "abc-gzip"), já que os bytes enviados mudam.
+Páginas estáticas (index.html) são renderizadas e comprimidas uma única vez.
+"""
+from flask import request, current_app, make_response
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+import gzip
+import hashlib
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSAO_ATIVA = os.getenv('COMPRESSAO', 'ligado') != 'desligado'
+COMPRESSAO_MINIMO = int(os.getenv('COMPRESSAO_MINIMO', '1024'))           # bytes
+COMPRESSAO_NIVEL_GZIP = int(os.getenv('COMPRESSAO_NIVEL_GZIP', '6'))      # 1-9
+COMPRESSAO_NIVEL_BROTLI = int(os.getenv('COMPRESSAO_NIVEL_BROTLI', '5'))  # 0-11
+
+TIPOS_COMPRIMIVEIS = {
+    'application/json', 'application/x-ndjson', 'application/javascript',
+    'text/html', 'text/css', 'text/csv', 'text/plain', 'text/javascript', 'image/svg+xml'
+}
+
+_lock = threading.Lock()
+_estaticas = {}   # nome -> {codificacao: bytes, 'etag': str}
+
+def codificacoes_disponiveis():
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+def codificacao_aceita(accept_encoding=None):
+    """
+    Melhor codificação aceita pelo cliente na requisição atual, ou None.
+    Fora de uma requisição Flask (ponto de entrada ASGI) recebe o cabeçalho Accept-Encoding.
+    """
+    if not COMPRESSAO_ATIVA:
+        return None
+    if accept_encoding is None:
+        return request.accept_encodings.best_match(codificacoes_disponiveis())
+    return parse_accept_header(accept_encoding, Accept).best_match(codificacoes_disponiveis())
+
+def comprimir_bytes(dados, codificacao):
+    if codificacao == 'br':
+        return brotli.compress(dados, quality=COMPRESSAO_NIVEL_BROTLI)
+    return gzip.compress(dados, compresslevel=COMPRESSAO_NIVEL_GZIP, mtime=0)
+
+def _comprimivel(resposta):
+    return resposta.mimetype in TIPOS_COMPRIMIVEIS or resposta.mimetype.startswith('text/')
+
+def comprimir_resposta(resposta):
+    """after_request: comprime a resposta quando o cliente aceita e ela passa do mínimo."""
+    if not _comprimivel(resposta):
+        return resposta
+    resposta.vary.add('Accept-Encoding')
+    codificacao = codificacao_aceita()
+    if (codificacao is None
+            or resposta.status_code < 200 or resposta.status_code in (204, 304)
+            or resposta.direct_passthrough or resposta.is_streamed
+            or 'Content-Encoding' in resposta.headers):
+        return resposta
+
+    dados = resposta.get_data()
+    if len(dados) < COMPRESSAO_MINIMO:
+        return resposta
+    resposta.set_data(comprimir_bytes(dados, codificacao))
+    resposta.headers['Content-Encoding'] = codificacao
+    etag, fraco = resposta.get_etag()
+    if etag:
+        resposta.set_etag(f'{etag}-{codificacao}', fraco)
+    return resposta
+
+def resposta_estatica(nome, gerar):
+    """
+    Responde uma página que não muda enquanto o processo roda (ex.: index.html).
+    `gerar()` devolve o HTML; ele é renderizado e comprimido em todas as codificações
+    só na primeira chamada (em modo debug, a cada chamada).
+    """
+    pagina = None if current_app.debug else _estaticas.get(nome)
+    if pagina is None:
+        dados = gerar().encode('utf-8')
+        pagina = {None: dados, 'etag': hashlib.sha1(dados).hexdigest()}
+        for codificacao in codificacoes_disponiveis():
+            pagina[codificacao] = comprimir_bytes(dados, codificacao)
+        with _lock:
+            _estaticas[nome] = pagina
+
+    codificacao = codificacao_aceita()
+    etag = f"{pagina['etag']}-{codificacao}" if codificacao else pagina['etag']
+    if request.if_none_match.contains(etag):
+        resposta = make_response('', 304)
+    else:
+        resposta = make_response(pagina[codificacao])
+        resposta.mimetype = 'text/html'
+        if codificacao:
+            resposta.headers['Content-Encoding'] = codificacao
+    resposta.set_etag(etag)
+    resposta.vary.add('Accept-Encoding')
+    resposta.headers['Cache-Control'] = 'no-cache'
+    return resposta
+
+def configurar(app):
+    """Liga a compressão das respostas no app Flask."""
+    if COMPRESSAO_ATIVA:
+        app.after_request(comprimir_resposta)
+
+def estatisticas():
+    return {
+        'ativa': COMPRESSAO_ATIVA,
+        'codificacoes': codificacoes_disponiveis(),
+        'minimo': COMPRESSAO_MINIMO,
+        'nivel_gzip': COMPRESSAO_NIVEL_GZIP,
+        'nivel_brotli': COMPRESSAO_NIVEL_BROTLI if brotli is not None else None,
+        'paginas_estaticas': list(_estaticas)
+    }
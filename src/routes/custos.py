@@ -0,0 +1,303 @@
+"""
+Motor de custos de orçamento.
+
+O custo unitário de cada receita (soma de quantidade_utilizada / p.quantidade * valor_unitario
+dos seus itens) é mantido em memória e invalidado quando os itens da receita ou algum dos
+seus produtos mudam. O total de um orçamento passa a ser uma soma sobre esses custos.
+Como no cache de consultas, um custo calculado antes das versões das tabelas lidas para o
+ETag da requisição (cache.versoes_requisicao) é lido de novo.
+"""
+from . import pg
+from . import cache
+from decimal import Decimal, ROUND_HALF_UP
+import threading
+
+_lock = threading.Lock()
+_custos = {}               # receita_id -> custo unitário (Decimal) ou None se a receita não tem itens válidos
+_receitas_do_produto = {}  # produto_id -> {receita_id} para invalidar pelo produto
+_versoes_custos = {}       # receita_id -> versões das tabelas lidas pela requisição que calculou o custo
+_geracao = 0               # incrementada a cada invalidação; evita gravar custos lidos antes dela
+_stats = {'acertos': 0, 'faltas': 0, 'invalidacoes': 0}
+
+# Tabelas de que o custo unitário depende
+TABELAS_CUSTOS = ('receita', 'item_receita', 'produtos', 'movimentacoes_estoque')
+
+SQL_CUSTOS_RECEITAS = '''
+SELECT ir.receita_id
+     , ir.produto_id
+     , (ir.quantidade_utilizada / p.quantidade) * p.valor_unitario AS custo
+  FROM public.item_receita ir
+ INNER JOIN public.produtos p
+    ON p.deleted_at IS NULL
+   AND p.id = ir.produto_id
+ WHERE ir.deleted_at IS NULL
+   AND ir.receita_id = ANY(%s)
+'''
+
+def _acumular(receita_ids, linhas):
+    """Soma os itens lidos por SQL_CUSTOS_RECEITAS. Retorna (custos, produto_id -> {receita_id})."""
+    custos = {receita_id: None for receita_id in receita_ids}
+    produtos = {}
+    for receita_id, produto_id, custo in linhas:
+        custos[receita_id] = (custos[receita_id] or Decimal(0)) + custo
+        produtos.setdefault(produto_id, set()).add(receita_id)
+    return custos, produtos
+
+def _carregar(receita_ids):
+    """Calcula no banco o custo unitário das receitas informadas."""
+    return _acumular(receita_ids, pg.open_query(SQL_CUSTOS_RECEITAS, (list(receita_ids),), preparar='custos_receitas'))
+
+def _faltando(receita_ids):
+    """Receitas sem custo em cache e a geração atual do cache."""
+    versoes = cache.versoes_requisicao()
+    with _lock:
+        faltando = [
+            r for r in set(receita_ids)
+            if r not in _custos or cache.anterior_as_versoes(TABELAS_CUSTOS, _versoes_custos.get(r, {}), versoes)
+        ]
+        _stats['acertos'] += len(set(receita_ids)) - len(faltando)
+        _stats['faltas'] += len(faltando)
+        return faltando, _geracao
+
+def _completar(receita_ids, geracao, carregados):
+    """Guarda os custos carregados (se nada foi invalidado desde `geracao`) e completa com o cache."""
+    custos = {}
+    if carregados:
+        novos, produtos = carregados
+        custos.update(novos)
+        with _lock:
+            # Se algo foi invalidado durante a consulta o resultado pode estar velho: usa, mas não guarda
+            if geracao == _geracao:
+                _custos.update(novos)
+                versoes = cache.versoes_requisicao()
+                _versoes_custos.update((receita_id, versoes) for receita_id in novos)
+                for produto_id, receitas in produtos.items():
+                    _receitas_do_produto.setdefault(produto_id, set()).update(receitas)
+
+    with _lock:
+        for receita_id in receita_ids:
+            if receita_id not in custos:
+                custos[receita_id] = _custos.get(receita_id)
+    return custos
+
+def custos_receitas(receita_ids):
+    """Retorna {receita_id: custo unitário} usando o cache e buscando só as receitas que faltam."""
+    faltando, geracao = _faltando(receita_ids)
+    return _completar(receita_ids, geracao, _carregar(faltando) if faltando else None)
+
+async def custos_receitas_assincrono(receita_ids):
+    """custos_receitas lendo as receitas que faltam pelo pg_assincrono (ponto de entrada ASGI)."""
+    from . import pg_assincrono
+    faltando, geracao = _faltando(receita_ids)
+    carregados = None
+    if faltando:
+        carregados = _acumular(faltando, await pg_assincrono.open_query(SQL_CUSTOS_RECEITAS, (faltando,)))
+    return _completar(receita_ids, geracao, carregados)
+
+def invalidar_receita(receita_id=None):
+    """Descarta o custo da receita (ou de todas, se receita_id for None)."""
+    global _geracao
+    with _lock:
+        _geracao += 1
+        _stats['invalidacoes'] += 1
+        if receita_id is None:
+            _custos.clear()
+            _receitas_do_produto.clear()
+            _versoes_custos.clear()
+        else:
+            _custos.pop(receita_id, None)
+            _versoes_custos.pop(receita_id, None)
+
+def invalidar_produto(produto_id=None):
+    """Descarta o custo de todas as receitas que usam o produto (ou de todas, se produto_id for None)."""
+    global _geracao
+    if produto_id is None:
+        invalidar_receita(None)
+        return
+    with _lock:
+        _geracao += 1
+        _stats['invalidacoes'] += 1
+        for receita_id in _receitas_do_produto.pop(produto_id, ()):
+            _custos.pop(receita_id, None)
+            _versoes_custos.pop(receita_id, None)
+
+def _ao_alterar(tabela, chaves):
+    if tabela in ('produtos', 'movimentacoes_estoque'):
+        # Movimentações alteram produtos.quantidade, que entra no custo
+        invalidar_produto(chaves.get('produto_id'))
+    elif tabela in ('receita', 'item_receita'):
+        invalidar_receita(chaves.get('receita_id'))
+
+pg.registrar_ouvinte(_ao_alterar)
+
+def estatisticas():
+    with _lock:
+        return {
+            'receitas_em_cache': len(_custos),
+            **_stats
+        }
+
+SQL_TOTAIS_ORCAMENTO = '''
+SELECT r.id
+     , r.nome
+     , io.quantidade
+     , o.percentual
+  FROM public.orcamento o
+ INNER JOIN public.item_orcamento io
+    ON io.deleted_at IS NULL
+   AND io.orcamento_id = o.id
+ INNER JOIN public.receita r
+    ON r.deleted_at IS NULL
+   AND r.id = io.receita_id
+ WHERE o.deleted_at IS NULL
+   AND o.id = %s
+ ORDER BY r.id
+'''
+
+CENTAVO = Decimal('0.01')
+
+def _totais(resultados, custos):
+    """Monta os itens e totais do orçamento a partir das linhas de SQL_TOTAIS_ORCAMENTO."""
+    orcamentos = []
+    total_custo = Decimal(0)
+    total_valor_acrescimo = Decimal(0)
+
+    for receita_id, nome, quantidade, percentual in resultados:
+        custo_unitario = custos.get(receita_id)
+        if custo_unitario is None:
+            # Receita sem itens válidos não entra no total
+            continue
+        quantidade = quantidade or Decimal(0)
+        fator = 1 + (percentual or Decimal(0)) / Decimal(100)
+        # Arredonda como o ROUND do PostgreSQL (metade para longe do zero)
+        custo = (custo_unitario * quantidade).quantize(CENTAVO, ROUND_HALF_UP)
+        valor_acrescimo = (custo_unitario * fator * quantidade).quantize(CENTAVO, ROUND_HALF_UP)
+
+        orcamentos.append({
+            'tipo': nome,
+            'custo': float(custo),
+            'adicional': float(valor_acrescimo),
+            'quantidade': float(quantidade)
+        })
+        total_custo += custo
+        total_valor_acrescimo += valor_acrescimo
+
+    # Retorna um dicionário com os itens e os totais separadamente
+    return {
+        'itens': orcamentos,
+        'totais': {
+            'total_custo': float(total_custo),
+            'total_valor_final': float(total_valor_acrescimo),
+            'diferenca_acrescimo': float(total_valor_acrescimo - total_custo)
+        }
+    }
+
+def obtem_totais_orcamento(id):
+    """Totais do orçamento por receita (custo e valor com acréscimo) a partir dos custos em cache"""
+    resultados = pg.open_query(SQL_TOTAIS_ORCAMENTO, (id,), preparar='totais_orcamento')
+    return _totais(resultados, custos_receitas([resultado[0] for resultado in resultados]))
+
+async def obtem_totais_orcamento_assincrono(id):
+    """obtem_totais_orcamento pelo pg_assincrono."""
+    from . import pg_assincrono
+    resultados = await pg_assincrono.open_query(SQL_TOTAIS_ORCAMENTO, (id,))
+    return _totais(resultados, await custos_receitas_assincrono([resultado[0] for resultado in resultados]))
+
+
+# Limite de células (cenários x percentuais) por simulação
+MAX_CELULAS_SIMULACAO = 200000
+
+def custos_unitarios_orcamento(id):
+    """
+    Receitas do orçamento com o custo unitário de cada uma (custos_receitas, em cache).
+
+    :return: (receitas, custos, percentual) - receitas é uma lista de (receita_id, nome,
+             quantidade atual) e custos[i] o custo de uma unidade da receita i (0.0 se a
+             receita não tem itens válidos).
+    """
+    resultados = pg.open_query(SQL_TOTAIS_ORCAMENTO, (id,), preparar='totais_orcamento')
+    if not resultados:
+        raise Exception(f"Orçamento {id} não encontrado ou sem receitas")
+    custos = custos_receitas([resultado[0] for resultado in resultados])
+    receitas = [(receita_id, nome, float(quantidade or 0)) for receita_id, nome, quantidade, _ in resultados]
+    unitarios = [float(custos.get(receita_id) or 0) for receita_id, _, _ in receitas]
+    return receitas, unitarios, float(resultados[0][3] or 0)
+
+def _numero(valor):
+    return isinstance(valor, (int, float)) and not isinstance(valor, bool)
+
+def validar_simulacao(percentuais, quantidades, multiplicadores):
+    """Confere os parâmetros de simular_orcamento, levantando ValueError com o primeiro problema."""
+    for nome, lista in (('percentuais', percentuais), ('multiplicadores', multiplicadores)):
+        if lista is None:
+            continue
+        if not isinstance(lista, list) or not all(_numero(valor) for valor in lista):
+            raise ValueError(f"{nome} deve ser uma lista de números")
+    if quantidades is None:
+        return
+    if not isinstance(quantidades, list):
+        raise ValueError("quantidades deve ser uma lista de cenários {receita_id: quantidade}")
+    for cenario in quantidades:
+        if not isinstance(cenario, dict) or not all(_numero(valor) for valor in cenario.values()):
+            raise ValueError("quantidades deve ser uma lista de cenários {receita_id: quantidade}")
+        for receita_id in cenario:
+            if not str(receita_id).isdigit():
+                raise ValueError(f"receita_id inválido em quantidades: {receita_id}")
+
+def simular_orcamento(id, percentuais=None, quantidades=None, multiplicadores=None):
+    """
+    Avalia uma grade de cenários (quantidades por receita) x percentuais de acréscimo.
+
+    :param percentuais: lista de percentuais; padrão é o percentual do orçamento.
+    :param quantidades: lista de cenários {receita_id: quantidade}; receitas omitidas
+                        mantêm a quantidade atual.
+    :param multiplicadores: alternativa a quantidades - cada valor gera um cenário com
+                            as quantidades atuais multiplicadas por ele.
+    """
+    # Confere os parâmetros e o tamanho antes de buscar ou montar qualquer coisa
+    validar_simulacao(percentuais, quantidades, multiplicadores)
+    cenarios = len(quantidades or multiplicadores or [1])
+    if cenarios * len(percentuais or [1]) > MAX_CELULAS_SIMULACAO:
+        raise ValueError(f"Simulação muito grande: máximo de {MAX_CELULAS_SIMULACAO} combinações")
+
+    import numpy as np
+    receitas, unitarios, percentual_atual = custos_unitarios_orcamento(id)
+    ids = [receita_id for receita_id, _, _ in receitas]
+    atuais = np.array([quantidade for _, _, quantidade in receitas])
+
+    p = np.asarray(percentuais if percentuais else [percentual_atual], dtype=float)
+
+    if quantidades:
+        q = np.tile(atuais, (len(quantidades), 1))
+        posicao = {receita_id: i for i, receita_id in enumerate(ids)}
+        for linha, cenario in enumerate(quantidades):
+            for receita_id, quantidade in cenario.items():
+                if int(receita_id) not in posicao:
+                    raise ValueError(f"Receita {receita_id} não pertence ao orçamento {id}")
+                q[linha, posicao[int(receita_id)]] = float(quantidade)
+    else:
+        m = np.asarray(multiplicadores if multiplicadores else [1.0], dtype=float)
+        q = np.outer(m, atuais)
+
+    custo_unitario = np.asarray(unitarios)                   # (receitas,)
+    custo = q @ custo_unitario                               # (cenarios,)
+    valor = np.round(np.outer(custo, 1 + p / 100.0), 2)      # (cenarios, percentuais)
+    custo = np.round(custo, 2)
+    lucro = np.round(valor - custo[:, None], 2)
+
+    return {
+        'receitas': [
+            {'id': receita_id, 'nome': nome, 'quantidade_atual': quantidade, 'custo_unitario': round(float(c), 4)}
+            for (receita_id, nome, quantidade), c in zip(receitas, custo_unitario)
+        ],
+        'percentuais': p.tolist(),
+        'cenarios': [
+            {
+                'quantidades': dict(zip(ids, q[i].tolist())),
+                'custo': float(custo[i]),
+                'valores': valor[i].tolist(),
+                'lucros': lucro[i].tolist()
+            }
+            for i in range(q.shape[0])
+        ]
+    }
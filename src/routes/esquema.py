@@ -0,0 +1,416 @@
+"""
+Migrações do esquema do banco e índices das consultas da aplicação.
+
+As migrações ficam em src/migracoes como NNNN_descricao.sql ou NNNN_descricao.py (com
+uma função aplicar(cursor)) e são aplicadas em ordem, cada uma em sua transação, na
+inicialização. A tabela schema_version guarda as versões aplicadas e o checksum de cada
+arquivo. Se o banco já está em dia basta uma consulta; senão o processo pega um advisory
+lock, para que vários workers subindo juntos não apliquem a mesma migração em paralelo.
+Quem espera o lock tenta de novo a cada INTERVALO_LOCK_MIGRACOES em vez de ficar parado
+em pg_advisory_lock: uma espera bloqueada mantém um snapshot aberto, e o CREATE INDEX
+CONCURRENTLY da migração em andamento esperaria por ela sem que o PostgreSQL detectasse
+o deadlock. Migrações .py recebem o cursor da conexão que tem o lock e devem usá-la.
+Uma migração que não pode rodar em transação declara TRANSACAO = False (.py) ou começa
+com a linha "-- sem-transacao" (.sql). Migração aplicada não deve ser editada: mudanças
+vão em um arquivo novo (o checksum divergente é avisado no log).
+
+Quase todas as consultas filtram `deleted_at IS NULL`, então os índices das chaves de
+junção e de ordenação são parciais com essa condição: ficam menores e são os únicos que
+o planejador precisa. Eles são criados com CREATE INDEX CONCURRENTLY (sem bloquear
+escritas) pela migração 0008_indices_parciais, que tem o DDL de cada um; como qualquer
+mudança de esquema, índice novo ou alterado vai em uma migração nova. A inicialização
+(inicializar()) só confere, com uma consulta ao catálogo, os índices de INDICES: um índice
+inválido, deixado por uma criação interrompida, é refeito com REINDEX CONCURRENTLY (pela
+definição guardada no próprio banco) sob o lock das migrações; um ausente só é avisado
+no log. INDICES_NA_INICIALIZACAO=desligado pula essa conferência.
+
+As chaves receita_id de item_receita e orcamento_id de item_orcamento já são o prefixo
+dos índices únicos parciais da migração 0005_indices_itens, por isso não se repetem aqui.
+
+Execução manual (a partir de src/):
+    python -m routes.esquema            -> aplica as migrações pendentes
+    python -m routes.esquema status     -> lista as migrações e o que já foi aplicado
+    python -m routes.esquema indices    -> refaz os índices inválidos, mostrando os planos antes/depois
+    python -m routes.esquema explain    -> só mostra os planos das consultas principais
+"""
+from . import pg
+from collections import namedtuple
+from contextlib import contextmanager
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import re
+import sys
+import time
+
+# region Migrações
+if getattr(sys, 'frozen', False):
+    PASTA_MIGRACOES = pg.resource_path('migracoes')
+else:
+    PASTA_MIGRACOES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migracoes')
+
+# Chave do pg_advisory_lock que serializa as migrações entre processos
+CHAVE_LOCK_MIGRACOES = 720415001
+INTERVALO_LOCK_MIGRACOES = float(os.getenv('MIGRACOES_INTERVALO_LOCK', '0.5'))
+MARCADOR_SEM_TRANSACAO = '-- sem-transacao'
+
+Migracao = namedtuple('Migracao', 'versao nome caminho checksum')
+
+_ARQUIVO_MIGRACAO = re.compile(r'^(\d+)_(\w+)\.(sql|py)$')
+
+SQL_SCHEMA_VERSION = '''
+CREATE TABLE IF NOT EXISTS public.schema_version (
+    versao INTEGER PRIMARY KEY,
+    nome VARCHAR(255) NOT NULL,
+    checksum VARCHAR(40) NOT NULL,
+    aplicada_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    duracao_ms INTEGER
+)
+'''
+
+def listar_migracoes():
+    """Migrações de PASTA_MIGRACOES em ordem de versão."""
+    migracoes = {}
+    for arquivo in sorted(os.listdir(PASTA_MIGRACOES)):
+        encontrado = _ARQUIVO_MIGRACAO.match(arquivo)
+        if not encontrado:
+            continue
+        versao = int(encontrado.group(1))
+        if versao in migracoes:
+            raise Exception(f"Versão de migração repetida: {arquivo} e {migracoes[versao].nome}")
+        caminho = os.path.join(PASTA_MIGRACOES, arquivo)
+        with open(caminho, 'rb') as f:
+            checksum = hashlib.sha1(f.read()).hexdigest()
+        migracoes[versao] = Migracao(versao, arquivo, caminho, checksum)
+    return [migracoes[versao] for versao in sorted(migracoes)]
+
+def situacao_banco():
+    """(quantidade, maior versão) aplicadas, em uma consulta; (0, 0) se schema_version não existe."""
+    with pg.conexao() as conn:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT count(*), COALESCE(max(versao), 0) FROM public.schema_version')
+                return cursor.fetchone()
+        except pg.psycopg2.errors.UndefinedTable:
+            return 0, 0
+        finally:
+            conn.rollback()
+
+def _carregar_modulo(migracao):
+    spec = importlib.util.spec_from_file_location(f'migracao_{migracao.versao:04d}', migracao.caminho)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+def _aplicar(conn, migracao):
+    """Aplica uma migração e a registra em schema_version (na mesma transação, se houver)."""
+    inicio = time.monotonic()
+    if migracao.nome.endswith('.py'):
+        modulo = _carregar_modulo(migracao)
+        em_transacao = getattr(modulo, 'TRANSACAO', True)
+        executar = modulo.aplicar
+    else:
+        with open(migracao.caminho, encoding='utf-8') as f:
+            conteudo = f.read()
+        em_transacao = not conteudo.lstrip().startswith(MARCADOR_SEM_TRANSACAO)
+        executar = lambda cursor: cursor.execute(conteudo)
+
+    conn.autocommit = not em_transacao
+    try:
+        with conn.cursor() as cursor:
+            executar(cursor)
+            cursor.execute(
+                'INSERT INTO public.schema_version (versao, nome, checksum, duracao_ms) VALUES (%s, %s, %s, %s)',
+                (migracao.versao, migracao.nome, migracao.checksum, int((time.monotonic() - inicio) * 1000))
+            )
+        if em_transacao:
+            conn.commit()
+    except Exception:
+        if em_transacao:
+            conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
+    logging.info(f'Migração {migracao.nome} aplicada')
+
+def _travar_migracoes(cursor):
+    """Pega o advisory lock das migrações, tentando de novo até o outro processo liberar."""
+    avisado = False
+    while True:
+        cursor.execute('SELECT pg_try_advisory_lock(%s)', (CHAVE_LOCK_MIGRACOES,))
+        if cursor.fetchone()[0]:
+            return
+        if not avisado:
+            logging.info('Outro processo está migrando o banco; aguardando')
+            avisado = True
+        time.sleep(INTERVALO_LOCK_MIGRACOES)
+
+@contextmanager
+def _lock_migracoes(conn):
+    """Segura o lock das migrações na conexão (em autocommit) durante o bloco."""
+    with conn.cursor() as cursor:
+        _travar_migracoes(cursor)
+    try:
+        yield
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s)', (CHAVE_LOCK_MIGRACOES,))
+
+def migrar():
+    """
+    Aplica as migrações pendentes. Retorna as versões aplicadas por este processo.
+    Caminho rápido: se schema_version já tem todas as versões, é só uma consulta.
+    """
+    migracoes = listar_migracoes()
+    quantidade, maior = situacao_banco()
+    if migracoes and quantidade >= len(migracoes) and maior >= migracoes[-1].versao:
+        logging.info(f'Esquema em dia (versão {maior})')
+        return []
+
+    aplicadas_agora = []
+    with pg.conexao() as conn:
+        conn.rollback()
+        conn.autocommit = True
+        try:
+            # Espera outro processo que esteja migrando terminar
+            with _lock_migracoes(conn):
+                with conn.cursor() as cursor:
+                    cursor.execute(SQL_SCHEMA_VERSION)
+                    cursor.execute('SELECT versao, checksum FROM public.schema_version')
+                    aplicadas = dict(cursor.fetchall())
+                for migracao in migracoes:
+                    if migracao.versao in aplicadas:
+                        if aplicadas[migracao.versao] != migracao.checksum:
+                            logging.warning(f'Migração {migracao.nome} foi alterada depois de aplicada (checksum diferente)')
+                        continue
+                    _aplicar(conn, migracao)
+                    aplicadas_agora.append(migracao.versao)
+        finally:
+            conn.autocommit = False
+    return aplicadas_agora
+
+def estado_migracoes():
+    """Migrações conhecidas com a data de aplicação e se o arquivo mudou desde então."""
+    aplicadas = {}
+    with pg.conexao() as conn:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT versao, checksum, aplicada_em, duracao_ms FROM public.schema_version')
+                aplicadas = {linha[0]: linha[1:] for linha in cursor.fetchall()}
+        except pg.psycopg2.errors.UndefinedTable:
+            pass
+        finally:
+            conn.rollback()
+    estado = []
+    for migracao in listar_migracoes():
+        checksum, aplicada_em, duracao_ms = aplicadas.get(migracao.versao, (None, None, None))
+        estado.append({
+            'versao': migracao.versao,
+            'nome': migracao.nome,
+            'aplicada_em': aplicada_em.isoformat(' ', 'seconds') if aplicada_em else None,
+            'duracao_ms': duracao_ms,
+            'alterada': checksum is not None and checksum != migracao.checksum
+        })
+    return estado
+#endregion
+
+# region Índices
+
+# Índices parciais criados pela migração 0008_indices_parciais (a definição fica só nela)
+INDICES = (
+    'idx_item_receita_produto',
+    'idx_item_orcamento_receita',
+    'idx_movimentacoes_produto_data',
+    'idx_movimentacoes_data_id',
+    'idx_produtos_descricao',
+)
+
+INDICES_NA_INICIALIZACAO = os.getenv('INDICES_NA_INICIALIZACAO', 'ligado') != 'desligado'
+
+# Consultas principais (mesmos filtros/ordenações das rotas) usadas no relatório de planos
+_PRODUTO = '(SELECT min(id) FROM public.produtos WHERE deleted_at IS NULL)'
+_RECEITA = '(SELECT min(id) FROM public.receita WHERE deleted_at IS NULL)'
+_ORCAMENTO = '(SELECT min(id) FROM public.orcamento WHERE deleted_at IS NULL)'
+CONSULTAS_EXPLAIN = {
+    'movimentacoes_pagina': '''
+        SELECT me.id FROM public.movimentacoes_estoque me
+         WHERE me.deleted_at IS NULL
+         ORDER BY me.data_movimentacao DESC, me.id DESC LIMIT 101''',
+    'movimentacoes_produto': f'''
+        SELECT me.id FROM public.movimentacoes_estoque me
+         WHERE me.deleted_at IS NULL AND me.produto_id = {_PRODUTO}
+         ORDER BY me.data_movimentacao DESC, me.id DESC LIMIT 101''',
+    'saldo_pagina': '''
+        SELECT p.id FROM public.produtos p
+          LEFT JOIN public.saldo_estoque se ON se.produto_id = p.id
+         WHERE p.deleted_at IS NULL
+         ORDER BY p.descricao, p.id LIMIT 101''',
+    'receitas_do_produto': f'''
+        SELECT ir.receita_id FROM public.item_receita ir
+         WHERE ir.deleted_at IS NULL AND ir.produto_id = {_PRODUTO}''',
+    'itens_receita': f'''
+        SELECT ir.id FROM public.item_receita ir
+         INNER JOIN public.produtos p ON p.id = ir.produto_id AND p.deleted_at IS NULL
+         WHERE ir.deleted_at IS NULL AND ir.receita_id = {_RECEITA}''',
+    'orcamentos_da_receita': f'''
+        SELECT io.orcamento_id FROM public.item_orcamento io
+         WHERE io.deleted_at IS NULL AND io.receita_id = {_RECEITA}''',
+    'necessidades_orcamento': f'''
+        SELECT ir.produto_id, SUM(io.quantidade * ir.quantidade_utilizada)
+          FROM public.item_orcamento io
+         INNER JOIN public.item_receita ir ON ir.deleted_at IS NULL AND ir.receita_id = io.receita_id
+         WHERE io.deleted_at IS NULL AND io.orcamento_id = {_ORCAMENTO}
+         GROUP BY ir.produto_id''',
+}
+
+_ultimo_relatorio = {}
+
+def _resumir_plano(plano):
+    """Custo total e lista de nós (com o índice usado) de um plano EXPLAIN em JSON."""
+    nos = []
+    def percorrer(no):
+        descricao = no['Node Type']
+        if 'Index Name' in no:
+            descricao += f" ({no['Index Name']})"
+        elif 'Relation Name' in no:
+            descricao += f" ({no['Relation Name']})"
+        nos.append(descricao)
+        for filho in no.get('Plans', []):
+            percorrer(filho)
+    percorrer(plano['Plan'])
+    return {'custo': plano['Plan']['Total Cost'], 'nos': nos}
+
+def planos(conn=None):
+    """
+    EXPLAIN (sem executar) das consultas principais: {consulta: {custo, nos}}.
+    Usa a conexão informada ou uma do pool.
+    """
+    if conn is None:
+        with pg.conexao() as conn:
+            return planos(conn)
+    resultado = {}
+    with conn.cursor() as cursor:
+        for nome, sql in CONSULTAS_EXPLAIN.items():
+            try:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+                plano = cursor.fetchone()[0]
+                if isinstance(plano, str):
+                    plano = json.loads(plano)
+                resultado[nome] = _resumir_plano(plano[0])
+            except Exception as e:
+                conn.rollback()
+                resultado[nome] = {'erro': str(e).strip()}
+    conn.rollback()
+    return resultado
+
+def situacao_indices(cursor):
+    """Retorna (inválidos, ausentes): os nomes dos índices de INDICES em cada situação."""
+    cursor.execute('''
+    SELECT t.nome, i.indisvalid
+      FROM unnest(%s::text[]) AS t(nome)
+      LEFT JOIN pg_class c ON c.relname = t.nome AND c.relnamespace = 'public'::regnamespace
+      LEFT JOIN pg_index i ON i.indexrelid = c.oid
+    ''', (list(INDICES),))
+    situacao = dict(cursor.fetchall())
+    return (
+        [nome for nome in INDICES if situacao.get(nome) is False],
+        [nome for nome in INDICES if situacao.get(nome) is None]
+    )
+
+def registrar_relatorio(indices, antes, depois):
+    """Guarda e registra no log os planos antes/depois de criar ou refazer `indices`."""
+    global _ultimo_relatorio
+    _ultimo_relatorio = {'indices_criados': indices, 'antes': antes, 'depois': depois}
+    for consulta in CONSULTAS_EXPLAIN:
+        logging.info(f"Plano {consulta}: antes {antes.get(consulta)} / depois {depois.get(consulta)}")
+
+def reparar_indices(conn=None, relatorio=True):
+    """
+    Refaz com REINDEX INDEX CONCURRENTLY os índices de INDICES que estão inválidos. Com
+    `relatorio`, guarda e registra no log os planos antes e depois. Usa só a conexão
+    informada (a que tem o lock das migrações) ou uma do pool.
+    :return: lista dos índices refeitos.
+    """
+    if conn is None:
+        with pg.conexao() as conn:
+            return reparar_indices(conn, relatorio)
+
+    autocommit = conn.autocommit
+    if not autocommit:
+        conn.rollback()
+    # REINDEX CONCURRENTLY não pode rodar dentro de uma transação
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            invalidos, _ = situacao_indices(cursor)
+        if not invalidos:
+            logging.info('Índices verificados: nenhum inválido')
+            return []
+
+        antes = planos(conn) if relatorio else None
+        with conn.cursor() as cursor:
+            for nome in invalidos:
+                cursor.execute(f'REINDEX INDEX CONCURRENTLY public.{nome}')
+                logging.info(f'Índice {nome} refeito')
+        depois = planos(conn) if relatorio else None
+    finally:
+        conn.autocommit = autocommit
+
+    if relatorio:
+        registrar_relatorio(invalidos, antes, depois)
+    return invalidos
+
+def inicializar():
+    """
+    Chamado na inicialização do app: aplica as migrações e confere os índices de INDICES.
+    Com tudo em dia, a conferência é só uma leitura do catálogo; o lock das migrações só
+    é pedido quando há índice inválido.
+    """
+    migrar()
+    if not INDICES_NA_INICIALIZACAO:
+        return []
+    with pg.conexao() as conn:
+        conn.rollback()
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                invalidos, ausentes = situacao_indices(cursor)
+            if ausentes:
+                logging.warning(
+                    f"Índices ausentes: {', '.join(ausentes)}. Foram removidos depois da migração "
+                    f"0008_indices_parciais; recrie-os em uma migração nova"
+                )
+            if not invalidos:
+                return []
+            logging.warning(f"Índices inválidos: {', '.join(invalidos)}")
+            # Outro worker pode estar refazendo os mesmos índices: reparar_indices confere de novo
+            with _lock_migracoes(conn):
+                return reparar_indices(conn)
+        finally:
+            conn.autocommit = False
+
+def relatorio():
+    """Último relatório de planos antes/depois (vazio se nenhum índice foi criado ou refeito neste processo)."""
+    return _ultimo_relatorio
+
+#endregion
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    comando = sys.argv[1] if len(sys.argv) > 1 else 'migrar'
+    if comando == 'explain':
+        print(json.dumps(planos(), indent=2, ensure_ascii=False))
+    elif comando == 'indices':
+        refeitos = reparar_indices()
+        print(f"{len(refeitos)} índice(s) refeito(s): {', '.join(refeitos) or '-'}")
+        if refeitos:
+            print(json.dumps(relatorio(), indent=2, ensure_ascii=False))
+    elif comando == 'status':
+        for m in estado_migracoes():
+            situacao = f"aplicada em {m['aplicada_em']}" if m['aplicada_em'] else 'pendente'
+            print(f"{m['versao']:04d} {m['nome']:<40} {situacao}{' (ALTERADA)' if m['alterada'] else ''}")
+    else:
+        aplicadas = migrar()
+        print(f"{len(aplicadas)} migração(ões) aplicada(s)")
@@ -0,0 +1,111 @@
+"""
+Canal de eventos em tempo real (WebSocket) para a interface.
+
+Repassa aos navegadores conectados as alterações recebidas do banco pelo ouvinte de
+NOTIFY (tarefas.iniciar_ouvinte_alteracoes), para que a tela atualize só as linhas
+afetadas. Os eventos são agrupados por EVENTOS_INTERVALO e enviados como
+{"eventos": [{"tabela", "operacao", <chaves>}, ...]}; um evento sem "operacao" (ou
+sem chaves) significa "recarregue a tabela inteira".
+
+Com vários processos (gunicorn) cada worker abre o servidor na mesma porta com
+SO_REUSEPORT (WS_COMPARTILHAR_PORTA=ligado): cada um recebe os NOTIFY e atende os
+navegadores que o sistema operacional distribuiu para ele.
+"""
+from . import pg
+from websockets.asyncio.server import serve, broadcast
+import asyncio
+import json
+import logging
+import os
+import threading
+
+EVENTOS_PORTA = int(os.getenv('WS_PORT', '5081'))                    # 0 desliga o canal
+EVENTOS_INTERVALO = float(os.getenv('WS_INTERVALO', '0.2'))          # segundos agrupando eventos
+EVENTOS_MAX_POR_TABELA = int(os.getenv('WS_MAX_POR_TABELA', '50'))   # acima disso vira recarga
+EVENTOS_COMPARTILHAR_PORTA = os.getenv('WS_COMPARTILHAR_PORTA', 'desligado') == 'ligado'
+
+_loop = None
+_clientes = set()
+_lock = threading.Lock()
+_pendentes = {}   # json do evento -> evento, na ordem de chegada
+
+def _ao_alterar(tabela, chaves):
+    """Ouvinte de pg.notificar_alteracao: só as alterações vindas do banco viram eventos."""
+    if _loop is None or chaves.get('origem') != 'banco':
+        return
+    evento = {'tabela': tabela, **{k: v for k, v in chaves.items() if k != 'origem'}}
+    with _lock:
+        agendar = not _pendentes
+        _pendentes[json.dumps(evento, sort_keys=True)] = evento
+    if agendar:
+        _loop.call_soon_threadsafe(_loop.call_later, EVENTOS_INTERVALO, _enviar)
+
+pg.registrar_ouvinte(_ao_alterar)
+
+def _agrupar(eventos):
+    """Troca os eventos de uma tabela por uma recarga quando passam de EVENTOS_MAX_POR_TABELA."""
+    por_tabela = {}
+    for evento in eventos:
+        por_tabela.setdefault(evento['tabela'], []).append(evento)
+    agrupados = []
+    for tabela, lista in por_tabela.items():
+        if len(lista) > EVENTOS_MAX_POR_TABELA:
+            agrupados.append({'tabela': tabela})
+        else:
+            agrupados.extend(lista)
+    return agrupados
+
+def _enviar():
+    global _pendentes
+    with _lock:
+        eventos, _pendentes = list(_pendentes.values()), {}
+    if eventos and _clientes:
+        broadcast(_clientes, json.dumps({'eventos': _agrupar(eventos)}))
+
+async def _atender(conexao):
+    _clientes.add(conexao)
+    try:
+        await conexao.wait_closed()
+    finally:
+        _clientes.discard(conexao)
+
+def _executar(pronto):
+    global _loop
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    async def principal():
+        global _loop
+        async with serve(_atender, '0.0.0.0', EVENTOS_PORTA, reuse_port=EVENTOS_COMPARTILHAR_PORTA):
+            _loop = loop
+            pronto.set()
+            await asyncio.Future()
+
+    try:
+        loop.run_until_complete(principal())
+    except Exception as e:
+        print(f"Erro no servidor de eventos: {e}")
+    finally:
+        _loop = None
+        pronto.set()
+
+def iniciar_servidor_eventos():
+    """Inicia o servidor WebSocket em uma thread com seu próprio loop asyncio."""
+    if EVENTOS_PORTA <= 0:
+        return None
+    pronto = threading.Event()
+    thread = threading.Thread(target=_executar, args=(pronto,), name='servidor-eventos', daemon=True)
+    thread.start()
+    pronto.wait(5)
+    logging.info(f'Eventos em tempo real na porta {EVENTOS_PORTA}')
+    return thread
+
+def estatisticas():
+    with _lock:
+        pendentes = len(_pendentes)
+    return {
+        'ativo': _loop is not None,
+        'porta': EVENTOS_PORTA,
+        'clientes': len(_clientes),
+        'pendentes': pendentes
+    }
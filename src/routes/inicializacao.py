@@ -0,0 +1,29 @@
+"""
+Registro da inicialização do processo, exposto em /status/inicializacao.
+
+app.py importa este módulo antes de qualquer outro e marca as etapas de
+create_app(); o relatório mostra o tempo de cada etapa e quais dependências
+pesadas já foram carregadas (elas devem ser importadas só no primeiro uso).
+"""
+import sys
+import time
+
+INICIO = time.perf_counter()
+
+# Dependências que não devem ser carregadas na inicialização
+MODULOS_PESADOS = ('pandas', 'numpy', 'sqlalchemy', 'matplotlib', 'cv2', 'pytesseract', 'PIL', 'PySide6')
+
+_etapas = {}   # etapa -> ms desde INICIO
+
+def marcar(etapa):
+    """Registra que `etapa` terminou agora."""
+    _etapas[etapa] = round((time.perf_counter() - INICIO) * 1000, 1)
+
+def relatorio():
+    return {
+        'etapas_ms': dict(_etapas),
+        'em_execucao_s': round(time.perf_counter() - INICIO, 1),
+        'modulos_carregados': len(sys.modules),
+        'pesados_carregados': [m for m in MODULOS_PESADOS if m in sys.modules],
+        'python': sys.version.split()[0]
+    }
@@ -1,14 +1,25 @@
 import psycopg2
+from .cache import memoizar
+from . import cache
+from .serializacao import Mapeamento, numero, inteiro, texto, data_hora
 from psycopg2 import sql, pool
+from psycopg2.extras import execute_values
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
 from datetime import date
 import logging
 import os
 import datetime
 import time
-import pandas as pd
 from urllib.parse import quote
+from contextlib import contextmanager
+from decimal import Decimal
+import base64
+import csv
+import hashlib
+import re
+import io
+import json
+import threading
 import sys
 
 logar_query = False
@@ -35,9 +46,342 @@ def get_connection():
     except Exception as e:
         print(f"Erro ao obter conexão: {e}")
         return None
+
+# region Pool de conexões
+# O tamanho padrão acompanha o número de threads do waitress (WAITRESS_THREADS),
+# já que cada thread atende uma requisição por vez.
+POOL_CONFIG = {
+    'minconn':      int(os.getenv('DB_POOL_MIN', '1')),
+    'maxconn':      int(os.getenv('DB_POOL_MAX', os.getenv('WAITRESS_THREADS', '4'))),
+    'tempo_vida':   float(os.getenv('DB_POOL_TEMPO_VIDA', '1800')),   # segundos
+    'timeout':      float(os.getenv('DB_POOL_TIMEOUT', '10')),        # segundos
+    'verificar_apos': float(os.getenv('DB_POOL_VERIFICAR_APOS', '30')) # segundos ociosa
+}
+
+class PoolConexoes:
+    """
+    Pool de conexões thread-safe com limite mínimo/máximo.
+
+    - Conexões ociosas há mais de `verificar_apos` segundos são testadas com
+      SELECT 1 antes de serem entregues (fora do lock: uma conexão lenta ou morta
+      não trava as threads que estão retirando ou devolvendo outras).
+    - Conexões com mais de `tempo_vida` segundos são descartadas na devolução.
+    - Se não houver conexão livre, espera até `timeout` segundos e então
+      levanta pool.PoolError.
+    """
+
+    def __init__(self, minconn, maxconn, tempo_vida, timeout, verificar_apos, **kwargs):
+        self.minconn = max(0, minconn)
+        self.maxconn = max(1, maxconn, self.minconn)
+        self.tempo_vida = tempo_vida
+        self.timeout = timeout
+        self.verificar_apos = verificar_apos
+        self._kwargs = kwargs
+        self._cond = threading.Condition()
+        self._ociosas = []      # [(conn, devolvida_em)]
+        self._criadas_em = {}   # id(conn) -> timestamp de criação
+        self._em_uso = 0
+        self._abrindo = 0
+        self._fechado = False
+        self._stats = {
+            'checkouts': 0,
+            'esperas': 0,
+            'timeouts': 0,
+            'criadas': 0,
+            'descartadas': 0,
+            'falhas_verificacao': 0,
+            'latencia_total': 0.0,
+            'latencia_max': 0.0,
+        }
+        for _ in range(self.minconn):
+            try:
+                conn = self._abrir()
+            except Exception as e:
+                print(f"Erro ao pré-abrir conexão do pool: {e}")
+                break
+            self._ociosas.append((conn, time.monotonic()))
+
+    def _abrir(self):
+        conn = psycopg2.connect(**self._kwargs)
+        with self._cond:
+            self._criadas_em[id(conn)] = time.monotonic()
+            self._stats['criadas'] += 1
+        return conn
+
+    def _descartar(self, conn):
+        self._criadas_em.pop(id(conn), None)
+        self._stats['descartadas'] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _expirada(self, conn):
+        criada = self._criadas_em.get(id(conn), 0)
+        return self.tempo_vida > 0 and time.monotonic() - criada > self.tempo_vida
+
+    def _saudavel(self, conn, devolvida_em):
+        if conn.closed or self._expirada(conn):
+            return False
+        if time.monotonic() - devolvida_em < self.verificar_apos:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except Exception:
+            with self._cond:
+                self._stats['falhas_verificacao'] += 1
+            return False
+
+    def getconn(self):
+        """Retira uma conexão do pool, abrindo uma nova se houver vaga."""
+        inicio = time.monotonic()
+        limite = inicio + self.timeout
+        esperou = False
+        while True:
+            conn = None
+            with self._cond:
+                while True:
+                    if self._fechado:
+                        raise pool.PoolError("Pool de conexões fechado")
+                    if self._ociosas:
+                        # Reservada (conta como em uso) enquanto é verificada fora do lock
+                        conn, devolvida_em = self._ociosas.pop()
+                        self._em_uso += 1
+                        break
+                    if self._em_uso + self._abrindo < self.maxconn:
+                        self._abrindo += 1
+                        break
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self._stats['timeouts'] += 1
+                        raise pool.PoolError(
+                            f"Tempo esgotado aguardando conexão livre ({self.timeout}s, máximo {self.maxconn})"
+                        )
+                    if not esperou:
+                        esperou = True
+                        self._stats['esperas'] += 1
+                    self._cond.wait(restante)
+
+            if conn is None:
+                break
+            if self._saudavel(conn, devolvida_em):
+                with self._cond:
+                    self._registrar_checkout(inicio)
+                return conn
+            with self._cond:
+                self._em_uso -= 1
+                self._descartar(conn)
+                self._cond.notify()
+
+        # A conexão nova é aberta fora do lock para não bloquear as demais threads
+        try:
+            conn = self._abrir()
+        except Exception:
+            with self._cond:
+                self._abrindo -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._abrindo -= 1
+            self._em_uso += 1
+            self._registrar_checkout(inicio)
+        return conn
+
+    def _registrar_checkout(self, inicio):
+        latencia = time.monotonic() - inicio
+        self._stats['checkouts'] += 1
+        self._stats['latencia_total'] += latencia
+        self._stats['latencia_max'] = max(self._stats['latencia_max'], latencia)
+
+    def putconn(self, conn, descartar=False):
+        """Devolve a conexão ao pool, desfazendo transações pendentes."""
+        if not descartar and not conn.closed:
+            try:
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                descartar = True
+        with self._cond:
+            self._em_uso -= 1
+            if descartar or conn.closed or self._fechado or self._expirada(conn):
+                self._descartar(conn)
+            else:
+                self._ociosas.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        """Fecha todas as conexões ociosas e impede novas retiradas."""
+        with self._cond:
+            self._fechado = True
+            while self._ociosas:
+                conn, _ = self._ociosas.pop()
+                self._descartar(conn)
+            self._cond.notify_all()
+
+    def estatisticas(self):
+        with self._cond:
+            checkouts = self._stats['checkouts']
+            return {
+                'minimo': self.minconn,
+                'maximo': self.maxconn,
+                'em_uso': self._em_uso,
+                'ociosas': len(self._ociosas),
+                'abrindo': self._abrindo,
+                'checkouts': checkouts,
+                'esperas': self._stats['esperas'],
+                'timeouts': self._stats['timeouts'],
+                'criadas': self._stats['criadas'],
+                'descartadas': self._stats['descartadas'],
+                'falhas_verificacao': self._stats['falhas_verificacao'],
+                'latencia_media_ms': round(self._stats['latencia_total'] / checkouts * 1000, 3) if checkouts else 0.0,
+                'latencia_max_ms': round(self._stats['latencia_max'] * 1000, 3),
+            }
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def obter_pool():
+    """Retorna o pool de conexões do processo, criando-o no primeiro uso."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PoolConexoes(**POOL_CONFIG, connection_factory=ConexaoPreparada, **DB_CONFIG)
+    return _pool
+
+def fechar_pool():
+    """Fecha o pool atual; o próximo uso cria um novo."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+def estatisticas_pool():
+    """Estatísticas do pool para dimensionamento (em uso, ociosas, esperas, latência)."""
+    return obter_pool().estatisticas()
+
+@contextmanager
+def conexao():
+    """Empresta uma conexão do pool e a devolve ao final do bloco."""
+    pool_atual = obter_pool()
+    try:
+        conn = pool_atual.getconn()
+    except pool.PoolError:
+        raise
+    except Exception as e:
+        print(f"Erro ao obter conexão: {e}")
+        raise Exception("Não foi possível conectar ao banco de dados")
+    descartar = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        descartar = True
+        raise
+    finally:
+        pool_atual.putconn(conn, descartar=descartar)
+#endregion
+
+# region Comandos preparados
+# Consultas frequentes são preparadas (PREPARE) uma vez em cada conexão do pool e depois
+# executadas pelo nome, poupando o parse/planejamento a cada requisição. O nome vem do
+# prefixo informado + hash do SQL, então cada variação de filtros vira um comando próprio.
+# SQL que não pode ser preparado (ex.: tipo de parâmetro indeterminado) cai no modo ad-hoc.
+PREPARAR_CONSULTAS = os.getenv('DB_PREPARAR', 'ligado') != 'desligado'
+
+_preparadas = {}   # nome -> (sql com $n, quantidade de parâmetros) ou None se não preparável
+_preparadas_lock = threading.Lock()
+_stats_preparadas = {'preparacoes': 0, 'execucoes': 0, 'adhoc': 0, 'falhas': 0}
+
+class ConexaoPreparada(psycopg2.extensions.connection):
+    """Conexão que guarda os nomes dos comandos já preparados nela (PREPARE vale por sessão)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.preparadas = set()
+
+def converter_parametros(query):
+    """Troca os %s do psycopg2 por $1, $2...; retorna (sql, n) ou None se houver outro formato."""
+    contador = 0
+    def trocar(m):
+        nonlocal contador
+        if m.group(1) == '%':
+            return '%'
+        contador += 1
+        return f'${contador}'
+    if re.search(r'%\(', query):
+        return None
+    return re.sub(r'%([s%])', trocar, query), contador
+
+def _registrar_preparada(prefixo, query):
+    nome = f"{prefixo}_{hashlib.sha1(query.encode('utf-8')).hexdigest()[:12]}"
+    if nome not in _preparadas:
+        with _preparadas_lock:
+            _preparadas.setdefault(nome, converter_parametros(query))
+    return nome
+
+def _contar(evento):
+    # Chamado por várias threads ao mesmo tempo: += em dicionário não é atômico
+    with _preparadas_lock:
+        _stats_preparadas[evento] += 1
+
+def executar(cursor, query, params=None, preparar=None):
+    """
+    Executa `query` no cursor. Com `preparar` (prefixo do nome) usa PREPARE/EXECUTE na
+    conexão do cursor; sem ele, ou se o comando não puder ser preparado, executa direto.
+    """
+    conn = cursor.connection
+    if not preparar or not PREPARAR_CONSULTAS or not isinstance(conn, ConexaoPreparada):
+        cursor.execute(query, params)
+        return
+    nome = _registrar_preparada(preparar, query)
+    preparada = _preparadas[nome]
+    if preparada is None:
+        _contar('adhoc')
+        cursor.execute(query, params)
+        return
+
+    sql_preparado, quantidade = preparada
+    if nome not in conn.preparadas:
+        # SAVEPOINT: uma falha no PREPARE não pode abortar a transação de quem chamou
+        cursor.execute('SAVEPOINT preparar')
+        try:
+            cursor.execute(f'PREPARE {nome} AS {sql_preparado}')
+            cursor.execute('RELEASE SAVEPOINT preparar')
+        except psycopg2.Error as e:
+            cursor.execute('ROLLBACK TO SAVEPOINT preparar')
+            logging.warning(f'Consulta {nome} não pôde ser preparada, usando SQL direto: {e}')
+            with _preparadas_lock:
+                _preparadas[nome] = None
+                _stats_preparadas['falhas'] += 1
+            cursor.execute(query, params)
+            return
+        conn.preparadas.add(nome)
+        _contar('preparacoes')
+
+    _contar('execucoes')
+    if quantidade:
+        cursor.execute(f"EXECUTE {nome} ({', '.join(['%s'] * quantidade)})", params)
+    else:
+        cursor.execute(f'EXECUTE {nome}')
+
+def estatisticas_preparadas():
+    with _preparadas_lock:
+        return {
+            'ativo': PREPARAR_CONSULTAS,
+            'registradas': len(_preparadas),
+            'nao_preparaveis': sum(1 for p in _preparadas.values() if p is None),
+            **_stats_preparadas
+        }
+#endregion
     
 def get_connection_alchemy():
     """Retorna uma engine SQLAlchemy para conexão com o banco."""
+    # Importado aqui: o SQLAlchemy é pesado e nenhuma rota o usa
+    from sqlalchemy import create_engine
     try:
         password_encoded = quote(DB_CONFIG['password'])  # Evita erro com caracteres especiais
         url = f"postgresql://{DB_CONFIG['user']}:{password_encoded}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['dbname']}"
@@ -74,50 +418,168 @@ def execute_query(query, params=None):
     if logar_query:
         print(f"Executando query: {query}")
         print(f"Parâmetros: {params}")
-    conn = get_connection()
-    if not conn:
-        raise Exception("Não foi possível conectar ao banco de dados")
     
-    try:
-        with conn:
-            with conn.cursor() as cursor:
-                cursor.execute(query, params)
-                
-                # Se for uma query com RETURNING, retorna os resultados
-                if cursor.description and 'RETURNING' in query.upper():
-                    result = cursor.fetchall()
-                    print(f"Resultado da query: {result}")
-                    return {
-                        'data': result,
-                        'rowcount': cursor.rowcount
-                    }
-                # Para outras queries, retorna o número de linhas afetadas
-                else:
-                    conn.commit()
-                    return cursor
-    except Exception as e:
-        print(f"Erro ao executar query: {e}")
-        raise e
-    finally:
-        conn.close()
+    with conexao() as conn:
+        try:
+            with conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(query, params)
+                    
+                    # Se for uma query com RETURNING, retorna os resultados
+                    if cursor.description and 'RETURNING' in str(query).upper():
+                        result = cursor.fetchall()
+                        print(f"Resultado da query: {result}")
+                        return {
+                            'data': result,
+                            'rowcount': cursor.rowcount
+                        }
+                    # Para outras queries, retorna o número de linhas afetadas
+                    else:
+                        conn.commit()
+                        return cursor
+        except Exception as e:
+            print(f"Erro ao executar query: {e}")
+            raise e
 
-def open_query(query, params=None):
+def open_query(query, params=None, preparar=None):
     if logar_query:
         print(f"Executando query: {query}")
         print(f"Parâmetros: {params}")
-    conn = get_connection()
-    if not conn:
-        return None
     try:
-        with conn.cursor() as cursor:
-            cursor.execute(query, params)
-            results = cursor.fetchall()
-            return results
+        with conexao() as conn:
+            with conn.cursor() as cursor:
+                executar(cursor, query, params, preparar)
+                results = cursor.fetchall()
+                return results
     except Exception as e:
         print(f"Erro ao buscar dados: {e}")
         return None
-    finally:
-        conn.close()
+
+def consultar(query, params=None, mapeamento=None, limit=None, chave=None, preparar=None):
+    """
+    Executa um SELECT e devolve (registros, proximo_cursor), com as linhas convertidas em
+    dicionários pelo `mapeamento` (colunas pelo nome do SELECT). Com `limit`, a consulta deve
+    trazer uma linha extra (clausula_limit) e `chave` lista as colunas do cursor da próxima página.
+    `preparar` é o prefixo do comando preparado (ver executar).
+    """
+    if logar_query:
+        print(f"Executando query: {query}")
+        print(f"Parâmetros: {params}")
+    with conexao() as conn:
+        with conn.cursor() as cursor:
+            executar(cursor, query, params, preparar)
+            linhas = cursor.fetchall()
+            colunas = [coluna.name for coluna in cursor.description]
+    proximo = None
+    if limit and len(linhas) > limit:
+        linhas = linhas[:limit]
+        ultima = dict(zip(colunas, linhas[-1]))
+        proximo = codificar_cursor([ultima[coluna] for coluna in chave])
+    return (mapeamento or Mapeamento()).aplicar(colunas, linhas), proximo
+
+@contextmanager
+def transacao():
+    """
+    Executa vários comandos na mesma conexão com um único COMMIT.
+
+    Uso:
+        with transacao() as cursor:
+            cursor.execute(...)
+            cursor.execute(...)
+
+    Qualquer exceção dentro do bloco desfaz todos os comandos.
+    """
+    with conexao() as conn:
+        try:
+            with conn.cursor() as cursor:
+                yield cursor
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"Erro na transação: {e}")
+            raise
+
+# region Notificação de alterações
+# Módulos que guardam estado derivado do banco (ex.: custos de receitas) registram
+# um ouvinte aqui e são avisados depois que cada escrita é confirmada.
+# Chaves usadas: produto_id, receita_id, orcamento_id e origem - 'local' para escritas
+# deste processo ou 'banco' para as recebidas via NOTIFY (que incluem também 'operacao').
+_ouvintes_alteracao = [cache.ao_alterar]
+
+# Canal do NOTIFY disparado pelos triggers de TABELAS_NOTIFICADAS
+CANAL_ALTERACOES = 'alteracoes'
+
+# Tabela -> colunas enviadas no NOTIFY, no formato 'coluna=chave'
+TABELAS_NOTIFICADAS = {
+    'produtos': ['id=produto_id'],
+    'receita': ['id=receita_id'],
+    'item_receita': ['receita_id=receita_id', 'produto_id=produto_id'],
+    'orcamento': ['id=orcamento_id'],
+    'item_orcamento': ['orcamento_id=orcamento_id'],
+    'movimentacoes_estoque': ['produto_id=produto_id'],
+    'saldo_estoque': ['produto_id=produto_id'],
+}
+
+def registrar_ouvinte(funcao):
+    """Registra funcao(tabela, chaves) para ser chamada após cada alteração confirmada."""
+    if funcao not in _ouvintes_alteracao:
+        _ouvintes_alteracao.append(funcao)
+
+def notificar_alteracao(tabela, origem='local', **chaves):
+    """Avisa os ouvintes de que `tabela` mudou. Chaves ausentes significam 'qualquer registro'."""
+    chaves['origem'] = origem
+    for funcao in list(_ouvintes_alteracao):
+        try:
+            funcao(tabela, chaves)
+        except Exception as e:
+            print(f"Erro ao notificar alteração em {tabela}: {e}")
+#endregion
+
+# region Versão das tabelas
+# Tabelas com contador de alterações mantido por trigger (usado nos ETags das rotas).
+# Cada comando de escrita insere uma linha em versao_tabela_log; a versão é a base em
+# versao_tabela mais as linhas da tabela no log (migração 0009_versao_tabela_sem_bloqueio).
+TABELAS_VERSIONADAS = [
+    'produtos', 'receita', 'item_receita', 'orcamento', 'item_orcamento',
+    'movimentacoes_estoque', 'saldo_estoque'
+]
+
+SQL_VERSOES_TABELAS = '''
+SELECT t.tabela
+     , COALESCE(v.versao, 0)
+       + (SELECT count(*) FROM public.versao_tabela_log l WHERE l.tabela = t.tabela)
+  FROM unnest(%s::text[]) AS t(tabela)
+  LEFT JOIN public.versao_tabela v ON v.tabela = t.tabela
+'''
+
+def versoes_tabelas(tabelas):
+    """Retorna a versão atual de cada tabela (0 se nunca alterada), na ordem informada."""
+    resultados = open_query(SQL_VERSOES_TABELAS, (list(tabelas),), preparar='versoes_tabelas')
+    if resultados is None:
+        raise Exception("Não foi possível obter a versão das tabelas")
+    versoes = dict(resultados)
+    return tuple(versoes.get(tabela, 0) for tabela in tabelas)
+
+def compactar_versoes_tabelas():
+    """
+    Soma as linhas de versao_tabela_log na base de versao_tabela e as apaga, na mesma
+    transação (a versão vista pelos leitores não muda). Retorna as linhas compactadas.
+    """
+    with transacao() as cursor:
+        cursor.execute('''
+        WITH apagadas AS (
+            DELETE FROM public.versao_tabela_log RETURNING tabela
+        ), contagem AS (
+            SELECT tabela, count(*) AS linhas FROM apagadas GROUP BY tabela
+        ), somadas AS (
+            INSERT INTO public.versao_tabela (tabela, versao)
+            SELECT tabela, linhas FROM contagem
+            ON CONFLICT (tabela) DO UPDATE SET versao = versao_tabela.versao + EXCLUDED.versao
+        )
+        SELECT COALESCE(sum(linhas), 0) FROM contagem
+        ''')
+        return cursor.fetchone()[0]
+#endregion
 
 def select(tabela, filtros=None):
     """
@@ -128,32 +590,30 @@ def select(tabela, filtros=None):
     :return: Lista de registros que correspondem aos filtros.
     """
     try:
-        conn = get_connection()
-        with conn.cursor() as cursor:
-            # Construção da cláusula WHERE dinâmica
-            where_clause = sql.SQL('')
-            valores = []
-            if filtros:
-                conditions = []
-                for coluna, valor in filtros.items():
-                    conditions.append(sql.SQL("{} = {}").format(sql.Identifier(coluna), sql.Placeholder()))
-                    valores.append(valor)
-                where_clause = sql.SQL(' WHERE ').join(conditions)
-
-            # Montagem da query
-            query = sql.SQL("SELECT * FROM {}{}").format(
-                sql.Identifier(tabela),
-                where_clause
-            )
-            cursor.execute(query, valores)
-            resultados = cursor.fetchall()
-            return resultados
+        with conexao() as conn:
+            with conn.cursor() as cursor:
+                # Construção da cláusula WHERE dinâmica
+                where_clause = sql.SQL('')
+                valores = []
+                if filtros:
+                    conditions = []
+                    for coluna, valor in filtros.items():
+                        conditions.append(sql.SQL("{} = {}").format(sql.Identifier(coluna), sql.Placeholder()))
+                        valores.append(valor)
+                    where_clause = sql.SQL(' WHERE ').join(conditions)
+
+                # Montagem da query
+                query = sql.SQL("SELECT * FROM {}{}").format(
+                    sql.Identifier(tabela),
+                    where_clause
+                )
+                cursor.execute(query, valores)
+                resultados = cursor.fetchall()
+                return resultados
 
     except Exception as e:
         print(f"Erro ao executar a consulta: {e}")
         return []
-    finally:
-        conn.close()
 
 def update(tabela, valores_atualizar, filtros=None):
     """
@@ -164,42 +624,39 @@ def update(tabela, valores_atualizar, filtros=None):
     :param filtros: Dicionário contendo os filtros para a cláusula WHERE.
     """
     try:
-        conn = psycopg2.connect(dbname="seubanco", user="seuusuario", password="suasenha", host="localhost")
-        with conn.cursor() as cursor:
+        with conexao() as conn:
+            with conn.cursor() as cursor:
 
-            # Construção da cláusula SET dinâmica
-            set_clause = []
-            valores = []
-            for coluna, valor in valores_atualizar.items():
-                set_clause.append(sql.SQL("{} = {}").format(sql.Identifier(coluna), sql.Placeholder()))
-                valores.append(valor)
-            set_clause = sql.SQL(', ').join(set_clause)
-
-            # Construção da cláusula WHERE dinâmica
-            where_clause = sql.SQL('')
-            if filtros:
-                conditions = []
-                for coluna, valor in filtros.items():
-                    conditions.append(sql.SQL("{} = {}").format(sql.Identifier(coluna), sql.Placeholder()))
+                # Construção da cláusula SET dinâmica
+                set_clause = []
+                valores = []
+                for coluna, valor in valores_atualizar.items():
+                    set_clause.append(sql.SQL("{} = {}").format(sql.Identifier(coluna), sql.Placeholder()))
                     valores.append(valor)
-                where_clause = sql.SQL(' WHERE ').join(conditions)
-
-            # Montagem da query
-            query = sql.SQL("UPDATE {} SET {}{}").format(
-                sql.Identifier(tabela),
-                set_clause,
-                where_clause
-            )
-
-            cursor.execute(query, valores)
+                set_clause = sql.SQL(', ').join(set_clause)
+
+                # Construção da cláusula WHERE dinâmica
+                where_clause = sql.SQL('')
+                if filtros:
+                    conditions = []
+                    for coluna, valor in filtros.items():
+                        conditions.append(sql.SQL("{} = {}").format(sql.Identifier(coluna), sql.Placeholder()))
+                        valores.append(valor)
+                    where_clause = sql.SQL(' WHERE ').join(conditions)
+
+                # Montagem da query
+                query = sql.SQL("UPDATE {} SET {}{}").format(
+                    sql.Identifier(tabela),
+                    set_clause,
+                    where_clause
+                )
+
+                cursor.execute(query, valores)
             conn.commit()
+        notificar_alteracao(tabela)
 
     except Exception as e:
         print(f"Erro ao executar a atualização: {e}")
-        conn.rollback()
-    finally:
-        cursor.close()
-        conn.close()
 
 def insert(objeto, tabela):
     """
@@ -221,25 +678,51 @@ def insert(objeto, tabela):
 
     # Executa a query
     execute_query(query, valores)
+    notificar_alteracao(tabela)
+#endregion
+
+# region Paginação
+def codificar_cursor(valores):
+    """Codifica os valores da chave da última linha em um cursor opaco para a próxima página."""
+    texto = json.dumps(valores, default=str)
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii')
+
+def decodificar_cursor(cursor):
+    """Decodifica um cursor gerado por codificar_cursor."""
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+def clausula_limit(limit, params):
+    """Retorna o LIMIT (com uma linha extra para saber se há próxima página)."""
+    if not limit:
+        return ''
+    params.append(limit + 1)
+    return 'LIMIT %s'
 #endregion
 
 # region Funções de Receita
-def obtem_receitas():
-    sql = f'SELECT id, nome, tempo_preparo, modo_preparo, rendimento FROM public.receita where deleted_at is null;'
+@memoizar('receita')
+def obtem_receitas(q=None, limit=None, cursor=None):
+    """Lista as receitas ordenadas por id. Retorna (receitas, proximo_cursor)."""
+    filtros = ['deleted_at is null']
+    params = []
+    if q:
+        filtros.append('nome ILIKE %s')
+        params.append(f'%{q}%')
+    if cursor:
+        filtros.append('id > %s')
+        params.append(decodificar_cursor(cursor)[0])
+    sql = f'''
+    SELECT id, nome, tempo_preparo, modo_preparo, rendimento
+      FROM public.receita
+     where {' and '.join(filtros)}
+     order by id
+     {clausula_limit(limit, params)};
+    '''
 
-    resultados = open_query(sql)
-    produtos = []
-    
-    for resultado in resultados:
-        produtos.append({
-            'id': resultado[0],
-            'nome': resultado[1],
-            'tempo_preparo': resultado[2],
-            'modo_preparo': resultado[3],
-            'rendimento': resultado[4]
-        })
-    
-    return produtos
+    return consultar(sql, params, limit=limit, chave=['id'])
 
 
 
@@ -258,6 +741,7 @@ def inserir_receita(dados):
     )
     retorno = execute_query(sql, params)
     id = retorno['data'][0][0]
+    notificar_alteracao('receita', receita_id=id)
     return id
 
 def atualizar_receita(dados):
@@ -279,6 +763,7 @@ def atualizar_receita(dados):
         dados.get('id',0)
     )
     execute_query(sql, params)
+    notificar_alteracao('receita', receita_id=dados.get('id', 0))
 
 def excluir_receita(id):
     sql = '''
@@ -288,6 +773,7 @@ def excluir_receita(id):
     '''
     params = (id,)
     execute_query(sql, params)
+    notificar_alteracao('receita', receita_id=id)
 
 #endregion
 
@@ -301,6 +787,9 @@ def listar_receita(dados):
     params = (dados.id)
     return open_query(sql, params=params)
 
+MAPA_ITEM_RECEITA = Mapeamento(quantidade_utilizada=numero)
+
+@memoizar('item_receita', 'produtos', receita_id='id')
 def obtem_itens_receita(id):
     sql = '''
     select ir.id
@@ -318,67 +807,113 @@ def obtem_itens_receita(id):
     '''    
     param = (id,)
 
-    dados = open_query(sql, param)
-
-    produtos = []
-    
-    for resultado in dados:
-        produtos.append({
-            'id': resultado[0],
-            'descricao': resultado[1],
-            'quantidade_utilizada':  float(resultado[2]) if resultado[2] else 0,
-            'quantificacao': resultado[3],
-            'observacao':resultado[4], 
-        })
-    
-    return produtos
+    return consultar(sql, param, MAPA_ITEM_RECEITA)[0]
 
 def inserir_item_receita(dados):
-    # Primeiro tenta o update
-    sql_update = '''
-    UPDATE public.item_receita
-    SET quantidade_utilizada = %s,
-        observacao = %s
-    WHERE receita_id = %s AND produto_id = %s;
+    """Insere o item ou atualiza a quantidade se o produto já estiver na receita (idx_item_receita_unico)"""
+    sql = '''
+    INSERT INTO public.item_receita
+        (receita_id, produto_id, quantidade_utilizada, observacao)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (receita_id, produto_id) WHERE deleted_at IS NULL
+    DO UPDATE SET quantidade_utilizada = EXCLUDED.quantidade_utilizada,
+                  observacao = EXCLUDED.observacao
+    RETURNING id;
     '''
-    params_update = (
-        dados.get('quantidade_utilizada'),
-        dados.get('observacao'),
+    params = (
         dados.get('receita_id'),
-        dados.get('produto_id')
+        dados.get('produto_id'),
+        dados.get('quantidade_utilizada'),
+        dados.get('observacao')
     )
-    rows_affected = execute_query(sql_update, params_update).rowcount
-
-    # Se não atualizou nada, insere
-    if rows_affected == 0:
-        sql_insert = '''
-        INSERT INTO public.item_receita
-            (receita_id, produto_id, quantidade_utilizada, observacao)
-        VALUES (%s, %s, %s, %s);
-        '''
-        params_insert = (
-            dados.get('receita_id'),
-            dados.get('produto_id'),
-            dados.get('quantidade_utilizada'),
-            dados.get('observacao')
-        )
-        execute_query(sql_insert, params_insert)
+    id = execute_query(sql, params)['data'][0][0]
+    notificar_alteracao('item_receita', receita_id=dados.get('receita_id'), produto_id=dados.get('produto_id'))
+    return id
     
+def inserir_itens_receita_lote(receita_id, itens):
+    """
+    Insere/atualiza vários itens da receita em uma única transação.
+
+    :param itens: lista de (indice, dados) já validados pela rota.
+    :return: (ids, erros) - dicionários indexados pelo índice da linha no lote.
+    """
+    sql = '''
+    INSERT INTO public.item_receita
+        (receita_id, produto_id, quantidade_utilizada, observacao)
+    VALUES %s
+    ON CONFLICT (receita_id, produto_id) WHERE deleted_at IS NULL
+    DO UPDATE SET quantidade_utilizada = EXCLUDED.quantidade_utilizada,
+                  observacao = EXCLUDED.observacao
+    RETURNING id, produto_id;
+    '''
+    ids = {}
+    erros = {}
+    with transacao() as cursor:
+        cursor.execute('SELECT 1 FROM public.receita WHERE id = %s AND deleted_at IS NULL', (receita_id,))
+        if not cursor.fetchone():
+            raise Exception(f"Receita {receita_id} não encontrada")
+
+        cursor.execute(
+            'SELECT id FROM public.produtos WHERE deleted_at IS NULL AND id = ANY(%s)',
+            ([dados['produto_id'] for _, dados in itens],)
+        )
+        existentes = {linha[0] for linha in cursor.fetchall()}
+
+        validos = []
+        for indice, dados in itens:
+            if dados['produto_id'] in existentes:
+                validos.append((indice, dados))
+            else:
+                erros[indice] = f"Produto {dados['produto_id']} não encontrado"
+
+        if validos:
+            valores = [
+                (receita_id, dados['produto_id'], dados['quantidade_utilizada'], dados.get('observacao'))
+                for _, dados in validos
+            ]
+            linhas = execute_values(cursor, sql, valores, page_size=len(valores), fetch=True)
+            por_produto = {produto_id: id for id, produto_id in linhas}
+            for indice, dados in validos:
+                ids[indice] = por_produto[dados['produto_id']]
+    if ids:
+        notificar_alteracao('item_receita', receita_id=receita_id)
+    return ids, erros
+
 def excluir_item_receita(id):
     sql = '''
     update public.item_receita 
     set deleted_at = CURRENT_TIMESTAMP
     where id = %s
+    RETURNING receita_id, produto_id
     '''
     params = (id,)
-    execute_query(sql, params)
+    for receita_id, produto_id in execute_query(sql, params)['data']:
+        notificar_alteracao('item_receita', receita_id=receita_id, produto_id=produto_id)
 
 #endregion
 
 # region Funções Podutos
 
-def obtem_produtos():
-    sql = '''
+MAPA_PRODUTO = Mapeamento(quantidade=numero, valor_unitario=numero, ean=texto)
+MAPA_PRODUTO_SELECAO = Mapeamento(
+    extras={'selecionado': '', 'quantidade_utilizada': 0.0},
+    quantidade=numero, valor_unitario=numero
+)
+
+def sql_produtos(q=None, limit=None, cursor=None, id=None):
+    """(sql, params) da listagem de produtos, do mais novo para o mais antigo."""
+    filtros = ['deleted_at is null']
+    params = []
+    if id is not None:
+        filtros.append('id = %s')
+        params.append(id)
+    if q:
+        filtros.append('descricao ILIKE %s')
+        params.append(f'%{q}%')
+    if cursor:
+        filtros.append('id < %s')
+        params.append(decodificar_cursor(cursor)[0])
+    sql = f'''
     SELECT id
          , descricao
          , quantidade
@@ -386,48 +921,31 @@ def obtem_produtos():
          , valor_unitario
          , ean
       FROM public.produtos
-     where deleted_at is null 
-     order by id desc;
+     where {' and '.join(filtros)}
+     order by id desc
+     {clausula_limit(limit, params)};
     '''
-    
-    resultados = open_query(sql)
-    produtos = []
-    
-    for resultado in resultados:
-        produtos.append({
-            'id': resultado[0],
-            'descricao': resultado[1],
-            'quantidade': float(resultado[2]) if resultado[2] else 0,
-            'quantificacao': resultado[3],
-            'valor_unitario': float(resultado[4]) if resultado[4] else 0,
-            'ean': resultado[5] if resultado[5] else ''
-        })
-    
-    return produtos
+    return sql, params
 
+@memoizar('produtos', produto_id='id')
+def obtem_produtos(q=None, limit=None, cursor=None, id=None):
+    """
+    Lista os produtos do mais novo para o mais antigo. Retorna (produtos, proximo_cursor).
+    O equivalente assíncrono é pg_assincrono.obtem_produtos.
+    """
+    sql, params = sql_produtos(q, limit, cursor, id)
+    return consultar(sql, params, MAPA_PRODUTO, limit, chave=['id'], preparar='obtem_produtos')
+
+@memoizar('produtos')
 def obtem_produtos_selecao():
     sql = '''
-    SELECT id, descricao, quantidade, quantificacao, valor_unitario, deleted_at
+    SELECT id, descricao, quantidade, quantificacao, valor_unitario
       FROM public.produtos
      where deleted_at is null 
      order by id desc;
     '''
     
-    resultados = open_query(sql)
-    produtos = []
-    
-    for resultado in resultados:
-        produtos.append({
-            'id': resultado[0],
-            'descricao': resultado[1],
-            'quantidade': float(resultado[2]) if resultado[2] else 0,
-            'quantificacao': resultado[3],
-            'valor_unitario': float(resultado[4]) if resultado[4] else 0,
-            'selecionado': '',
-            'quantidade_utilizada': 0.0
-        })
-    
-    return produtos
+    return consultar(sql, mapeamento=MAPA_PRODUTO_SELECAO)[0]
 
 def inserir_produto(dados):
     sql = '''
@@ -446,6 +964,7 @@ def inserir_produto(dados):
     result = execute_query(sql, params)['data']
     if not result:
         raise Exception("Erro ao inserir produto")
+    notificar_alteracao('produtos', produto_id=result[0][0])
     return result[0][0]
 
 def atualizar_produto(id, dados):
@@ -471,6 +990,7 @@ def atualizar_produto(id, dados):
     print(f"Resultado da query: {result}")
     if not result or not result[0]:
         raise Exception(f"Produto {id} não encontrado ou já foi excluído")
+    notificar_alteracao('produtos', produto_id=id)
     return result[0][0]
 
 def excluir_produto(id):
@@ -481,69 +1001,31 @@ def excluir_produto(id):
     '''
     params = (id,)
     execute_query(sql, params=params)
-
-def criar_tabela_produtos():
-    # Primeiro, verifica se a tabela existe
-    check_sql = '''
-    SELECT EXISTS (
-        SELECT FROM information_schema.tables 
-        WHERE table_schema = 'public' 
-        AND table_name = 'produtos'
-    );
-    '''
-    result = open_query(check_sql)
-    tabela_existe = result[0][0]
-
-    if not tabela_existe:
-        # Se a tabela não existe, cria com a nova estrutura
-        sql = '''
-        CREATE TABLE public.produtos (
-            id SERIAL PRIMARY KEY,
-            descricao VARCHAR(255) NOT NULL,
-            quantidade DECIMAL(10,3) NOT NULL,
-            quantificacao VARCHAR(50) NOT NULL,
-            valor_unitario DECIMAL(10,2) NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            deleted_at TIMESTAMP
-        );
-        '''
-        execute_query(sql)
-    else:
-        # Se a tabela existe, renomeia as colunas
-        try:
-            sql_updates = [
-                'ALTER TABLE public.produtos RENAME COLUMN nome TO descricao;',
-                'ALTER TABLE public.produtos RENAME COLUMN unidade TO quantidade;',
-                'ALTER TABLE public.produtos RENAME COLUMN preco TO valor_unitario;',
-                'ALTER TABLE public.produtos ALTER COLUMN quantidade TYPE DECIMAL(10,3);'
-            ]
-            for sql in sql_updates:
-                try:
-                    execute_query(sql)
-                except Exception as e:
-                    # Ignora erros de coluna não existente ou já renomeada
-                    if 'does not exist' not in str(e):
-                        raise e
-        except Exception as e:
-            logging.error(f'Erro ao atualizar estrutura da tabela: {e}')
-    logging.info('Tabela de produtos verificada/criada com sucesso')
+    notificar_alteracao('produtos', produto_id=id)
 
 # region Funções Orçamento
 
-def obtem_orcamento():
-    sql = f'SELECT id, nome, percentual FROM public.orcamento where deleted_at is null ;'
-    resultados = open_query(sql)
-    orcamentos = []
-    
-    for resultado in resultados:
-        orcamentos.append({
-            'id': resultado[0],
-            'nome': resultado[1],
-            'percentual': float(resultado[2]) if resultado[2] else 0.0,
-        })
-    
-    return orcamentos
+MAPA_ORCAMENTO = Mapeamento(percentual=numero)
+
+@memoizar('orcamento')
+def obtem_orcamento(q=None, limit=None, cursor=None):
+    """Lista os orçamentos ordenados por id. Retorna (orcamentos, proximo_cursor)."""
+    filtros = ['deleted_at is null']
+    params = []
+    if q:
+        filtros.append('nome ILIKE %s')
+        params.append(f'%{q}%')
+    if cursor:
+        filtros.append('id > %s')
+        params.append(decodificar_cursor(cursor)[0])
+    sql = f'''
+    SELECT id, nome, percentual
+      FROM public.orcamento
+     where {' and '.join(filtros)}
+     order by id
+     {clausula_limit(limit, params)};
+    '''
+    return consultar(sql, params, MAPA_ORCAMENTO, limit, chave=['id'])
 
 def inserir_orcamento(dados):
     sql = '''
@@ -556,6 +1038,7 @@ def inserir_orcamento(dados):
     '''
     params = (dados.get('nome'), dados.get('percentual',0))
     orcamento = execute_query(sql, params)['data']
+    notificar_alteracao('orcamento', orcamento_id=orcamento[0][0])
     return orcamento[0][0]
 
 def update_orcamento(dados):
@@ -569,6 +1052,7 @@ def update_orcamento(dados):
     '''
     params = (dados.get('nome'), dados.get('percentual',0) , dados.get('id'))
     orcamento = execute_query(sql, params)
+    notificar_alteracao('orcamento', orcamento_id=dados.get('id'))
     return orcamento['data'][0][0]
 
 def excluir_orcamento(id):
@@ -579,9 +1063,14 @@ def excluir_orcamento(id):
     '''
     params = (id,)
     execute_query(sql, params)
+    notificar_alteracao('orcamento', orcamento_id=id)
 
 #endregion
 
+MAPA_ITEM_ORCAMENTO = Mapeamento(quantidade=numero)
+MAPA_ORCAMENTO_RECEITA = Mapeamento(extras={'selecionado': ''}, quantidade=numero, orcamento_id=inteiro)
+
+@memoizar('item_orcamento', 'orcamento', 'receita', orcamento_id='orcamento_id')
 def obtem_itens_orcamento(orcamento_id):
     sql = '''
     select io.id
@@ -600,143 +1089,85 @@ def obtem_itens_orcamento(orcamento_id):
        and o.id = %s -- param
     '''
     param = (orcamento_id,)
-    resultados = open_query(sql, param)
-    itens = []
-
-    for resultado in resultados:
-            itens.append({
-                'id': resultado[0],
-                'nome': resultado[1],
-                'quantidade': float(resultado[2]) if resultado[2] else 0.0,
-            })
-        
-    return itens
+    return consultar(sql, param, MAPA_ITEM_ORCAMENTO)[0]
 
 def inserir_item_orcamento(dados):
-    # Primeiro tentamos atualizar se existir o par (receita_id, produto_id)
-    sql_update = '''
-    UPDATE public.item_orcamento
-       SET orcamento_id = %s,
-           quantidade = %s
-     WHERE deleted_at is null 
-       and receita_id = %s
-       AND orcamento_id = %s
-    RETURNING id;
-    '''
-    
-    params_update = (
-        dados.get('orcamento_id'),
-        dados.get('quantidade'),
-        dados.get('receita_id'),
-        dados.get('orcamento_id')
-    )
-    
-    # Executa o UPDATE e verifica se alguma linha foi afetada
-    result = execute_query(sql_update, params_update)
-    
-    # Se o UPDATE afetou alguma linha (rowcount > 0), retorna o ID
-    if result['rowcount'] > 0:
-        return result['data'][0][0]  # Retorna o ID do registro atualizado
-    
-    # Se não houve UPDATE, faz o INSERT
-    sql_insert = '''
+    """Insere a receita no orçamento ou atualiza a quantidade se já existir (idx_item_orcamento_unico)"""
+    sql = '''
     INSERT INTO public.item_orcamento
         (orcamento_id, receita_id, quantidade)
     VALUES
         (%s, %s, %s)
+    ON CONFLICT (orcamento_id, receita_id) WHERE deleted_at IS NULL
+    DO UPDATE SET quantidade = EXCLUDED.quantidade
     RETURNING id;
     '''
-    
-    params_insert = (
+    params = (
         dados.get('orcamento_id'),
         dados.get('receita_id'),
         dados.get('quantidade')
     )
-    
-    result_insert = execute_query(sql_insert, params_insert)
-    return result_insert['data'][0][0]  # Retorna o ID do novo registro
+    id = execute_query(sql, params)['data'][0][0]
+    notificar_alteracao('item_orcamento', orcamento_id=dados.get('orcamento_id'))
+    return id
+
+def inserir_itens_orcamento_lote(orcamento_id, itens):
+    """
+    Insere/atualiza várias receitas do orçamento em uma única transação.
+
+    :param itens: lista de (indice, dados) já validados pela rota.
+    :return: (ids, erros) - dicionários indexados pelo índice da linha no lote.
+    """
+    sql = '''
+    INSERT INTO public.item_orcamento
+        (orcamento_id, receita_id, quantidade)
+    VALUES %s
+    ON CONFLICT (orcamento_id, receita_id) WHERE deleted_at IS NULL
+    DO UPDATE SET quantidade = EXCLUDED.quantidade
+    RETURNING id, receita_id;
+    '''
+    ids = {}
+    erros = {}
+    with transacao() as cursor:
+        cursor.execute('SELECT 1 FROM public.orcamento WHERE id = %s AND deleted_at IS NULL', (orcamento_id,))
+        if not cursor.fetchone():
+            raise Exception(f"Orçamento {orcamento_id} não encontrado")
+
+        cursor.execute(
+            'SELECT id FROM public.receita WHERE deleted_at IS NULL AND id = ANY(%s)',
+            ([dados['receita_id'] for _, dados in itens],)
+        )
+        existentes = {linha[0] for linha in cursor.fetchall()}
+
+        validos = []
+        for indice, dados in itens:
+            if dados['receita_id'] in existentes:
+                validos.append((indice, dados))
+            else:
+                erros[indice] = f"Receita {dados['receita_id']} não encontrada"
+
+        if validos:
+            valores = [(orcamento_id, dados['receita_id'], dados['quantidade']) for _, dados in validos]
+            linhas = execute_values(cursor, sql, valores, page_size=len(valores), fetch=True)
+            por_receita = {receita_id: id for id, receita_id in linhas}
+            for indice, dados in validos:
+                ids[indice] = por_receita[dados['receita_id']]
+    if ids:
+        notificar_alteracao('item_orcamento', orcamento_id=orcamento_id)
+    return ids, erros
 
 def excluir_item_orcamento(id):
     sql = '''
     update public.item_orcamento 
     set deleted_at = CURRENT_TIMESTAMP
     where id = %s
+    RETURNING orcamento_id
     '''
     params = (id,)
-    execute_query(sql, params)
-
-def obtem_totais_orcamento(id):
-    sql = '''
-        WITH ingredientes_bolo AS (
-             SELECT ir.receita_id
-                  , ir.produto_id
-                  , ir.quantidade_utilizada
-                  , p.descricao, p.quantidade AS quantidade_produto
-                  , p.quantificacao, p.valor_unitario
-                  , io.quantidade
-                  , ((ir.quantidade_utilizada / p.quantidade) * p.valor_unitario) * io.quantidade AS custo_ingrediente
-                  , (((ir.quantidade_utilizada / p.quantidade) * p.valor_unitario) * (1 + (o.percentual / 100.0))) * io.quantidade AS valor_com_acrescimo
-              FROM orcamento o 
-             INNER JOIN item_orcamento io 
-                ON io.deleted_at IS NULL
-               AND io.orcamento_id = o.id 
-             INNER JOIN receita r
-                ON r.deleted_at IS NULL
-               AND r.id = io.receita_id
-             INNER JOIN item_receita ir 
-                ON ir.deleted_at IS NULL 
-               AND ir.receita_id = r.id
-             INNER JOIN produtos p 
-                ON p.deleted_at IS NULL
-               AND p.id = ir.produto_id
-              WHERE o.deleted_at IS NULL 
-               AND o.id = %s
-        )
-
-        SELECT 
-            r.nome AS tipo,
-            ROUND(SUM(ib.custo_ingrediente), 2) AS valor,
-            ROUND(SUM(ib.valor_com_acrescimo), 2) AS valor_acrescimo,
-            quantidade 
-        FROM ingredientes_bolo ib
-        INNER JOIN receita r ON ib.receita_id = r.id
-        GROUP BY r.nome, receita_id, quantidade
-    '''
-
-    params = (id,)
-    resultados = open_query(sql, params)
-    orcamentos = []
-    total_custo = 0.0
-    total_valor_acrescimo = 0.0
-    
-    for resultado in resultados:
-        custo = float(resultado[1]) if resultado[1] else 0.0
-        valor_acrescimo = float(resultado[2]) if resultado[2] else 0.0
-        
-        item = {
-            'tipo': resultado[0],
-            'custo': custo,
-            'adicional': valor_acrescimo,
-            'quantidade': float(resultado[3]) if resultado[3] else 0.0
-        }
-        
-        # Acumula totais apenas para itens que não sejam o total geral
-        if resultado[0] != 'TOTAL DO ORCAMENTO':
-            total_custo += custo
-            total_valor_acrescimo += valor_acrescimo
-            
-        orcamentos.append(item)
-    
-    # Retorna um dicionário com os itens e os totais separadamente
-    return {
-        'itens': orcamentos,
-        'totais': {
-            'total_custo': round(total_custo, 2),
-            'total_valor_final': round(total_valor_acrescimo, 2),
-            'diferenca_acrescimo': round(total_valor_acrescimo - total_custo, 2)
-        }
-    }
+    for orcamento_id, in execute_query(sql, params)['data']:
+        notificar_alteracao('item_orcamento', orcamento_id=orcamento_id)
 
+@memoizar('item_orcamento', 'orcamento', 'receita', orcamento_id='orcamento_id')
 def obtem_itens_orcamentos_receita(orcamento_id):
     if not orcamento_id:
         orcamento_id = 'o.id'
@@ -764,110 +1195,216 @@ def obtem_itens_orcamentos_receita(orcamento_id):
      order by r.id asc 
     '''
     param = (orcamento_id,)
-    resultados = open_query(sql, param)
-    itens = []
-
-    for resultado in resultados:
-            itens.append({
-                'id': resultado[0],
-                'nome': resultado[1],
-                'rendimento': resultado[2],
-                'quantidade': float(resultado[3]) if resultado[3] else 0.0,
-                'orcamento_id':int(resultado[4]) if resultado[4] else 0, 
-                'selecionado': '',
-            })
-    return itens
+    return consultar(sql, param, MAPA_ORCAMENTO_RECEITA)[0]
+
+MAPA_NECESSIDADE = Mapeamento(necessario=numero, saldo_total=numero, falta=numero)
+
+def obtem_necessidades_orcamento(orcamento_id):
+    """
+    Explode o orçamento em produtos (quantidade da receita x quantidade utilizada de cada item),
+    soma por produto e compara com o saldo atual, tudo em uma consulta.
+    """
+    sql = '''
+    WITH necessidades AS (
+        SELECT ir.produto_id
+             , SUM(io.quantidade * ir.quantidade_utilizada) AS necessario
+          FROM public.orcamento o
+         INNER JOIN public.item_orcamento io
+            ON io.deleted_at IS NULL
+           AND io.orcamento_id = o.id
+         INNER JOIN public.receita r
+            ON r.deleted_at IS NULL
+           AND r.id = io.receita_id
+         INNER JOIN public.item_receita ir
+            ON ir.deleted_at IS NULL
+           AND ir.receita_id = r.id
+         WHERE o.deleted_at IS NULL
+           AND o.id = %s
+         GROUP BY ir.produto_id
+    )
+    SELECT p.id AS produto_id
+         , p.descricao
+         , p.quantificacao
+         , n.necessario
+         , p.quantidade + COALESCE(se.saldo, 0) AS saldo_total
+         , GREATEST(n.necessario - (p.quantidade + COALESCE(se.saldo, 0)), 0) AS falta
+      FROM necessidades n
+     INNER JOIN public.produtos p
+        ON p.deleted_at IS NULL
+       AND p.id = n.produto_id
+      LEFT JOIN public.saldo_estoque se
+        ON se.produto_id = p.id
+     ORDER BY falta DESC, p.descricao
+    '''
+    itens = consultar(sql, (orcamento_id,), MAPA_NECESSIDADE, preparar='obtem_necessidades')[0]
+
+    em_falta = sum(1 for item in itens if item['falta'] > 0)
+    return {
+        'itens': itens,
+        'resumo': {
+            'produtos': len(itens),
+            'produtos_em_falta': em_falta,
+            'estoque_suficiente': em_falta == 0
+        }
+    }
 
 # region Funções de Estoque
-def obtem_movimentacoes_estoque(produto_id=None):
-    """Obtém todas as movimentações de estoque ou de um produto específico"""
+MAPA_MOVIMENTACAO = Mapeamento(quantidade=numero, data_movimentacao=data_hora)
+MAPA_SALDO = Mapeamento(
+    quantidade_inicial=numero, valor_unitario=numero,
+    saldo_movimentacoes=numero, saldo_total=numero
+)
+
+def sql_movimentacoes_estoque(produto_id=None, tipo=None, desde=None, ate=None, limit=None, cursor=None):
+    """(sql, params) das movimentações de estoque, da mais recente para a mais antiga."""
+    filtros = ['me.deleted_at IS NULL']
+    params = []
     if produto_id:
-        sql = '''
-        SELECT me.id, me.produto_id, p.descricao, me.tipo_movimentacao, 
-               me.quantidade, me.tipo_entrada, me.observacao, me.data_movimentacao
-        FROM public.movimentacoes_estoque me
-        INNER JOIN public.produtos p ON p.id = me.produto_id AND p.deleted_at IS NULL
-        WHERE me.deleted_at IS NULL AND me.produto_id = %s
-        ORDER BY me.data_movimentacao DESC
-        '''
-        params = (produto_id,)
-    else:
-        sql = '''
-        SELECT me.id, me.produto_id, p.descricao, me.tipo_movimentacao, 
-               me.quantidade, me.tipo_entrada, me.observacao, me.data_movimentacao
-        FROM public.movimentacoes_estoque me
-        INNER JOIN public.produtos p ON p.id = me.produto_id AND p.deleted_at IS NULL
-        WHERE me.deleted_at IS NULL
-        ORDER BY me.data_movimentacao DESC
-        '''
-        params = None
-    
-    resultados = open_query(sql, params)
-    movimentacoes = []
-    
-    for resultado in resultados:
-        movimentacoes.append({
-            'id': resultado[0],
-            'produto_id': resultado[1],
-            'produto_descricao': resultado[2],
-            'tipo_movimentacao': resultado[3],
-            'quantidade': float(resultado[4]) if resultado[4] else 0,
-            'tipo_entrada': resultado[5],
-            'observacao': resultado[6],
-            'data_movimentacao': resultado[7].strftime('%Y-%m-%d %H:%M:%S') if resultado[7] else ''
-        })
-    
-    return movimentacoes
+        filtros.append('me.produto_id = %s')
+        params.append(produto_id)
+    if tipo:
+        filtros.append('me.tipo_movimentacao = %s')
+        params.append(tipo)
+    if desde:
+        filtros.append('me.data_movimentacao >= %s::date')
+        params.append(desde)
+    if ate:
+        filtros.append('me.data_movimentacao < %s::date + 1')
+        params.append(ate)
+    if cursor:
+        filtros.append('(me.data_movimentacao, me.id) < (%s::timestamp, %s)')
+        params.extend(decodificar_cursor(cursor))
+    sql = f'''
+    SELECT me.id, me.produto_id, p.descricao AS produto_descricao, me.tipo_movimentacao, 
+           me.quantidade, me.tipo_entrada, me.observacao, me.data_movimentacao
+    FROM public.movimentacoes_estoque me
+    INNER JOIN public.produtos p ON p.id = me.produto_id AND p.deleted_at IS NULL
+    WHERE {' AND '.join(filtros)}
+    ORDER BY me.data_movimentacao DESC, me.id DESC
+    {clausula_limit(limit, params)}
+    '''
+    return sql, params
 
-def obtem_saldo_estoque(produto_id=None):
-    """Obtém o saldo atual de todos os produtos ou de um produto específico"""
-    if produto_id:
-        sql = '''
-        SELECT p.id, p.descricao, p.quantidade, p.quantificacao, p.valor_unitario,
-               COALESCE(SUM(CASE WHEN me.tipo_movimentacao = 'ENTRADA' THEN me.quantidade 
-                               ELSE -me.quantidade END), 0) as saldo_movimentacoes,
-               (p.quantidade + COALESCE(SUM(CASE WHEN me.tipo_movimentacao = 'ENTRADA' THEN me.quantidade 
-                                              ELSE -me.quantidade END), 0)) as saldo_total
-        FROM public.produtos p
-        LEFT JOIN public.movimentacoes_estoque me ON me.produto_id = p.id AND me.deleted_at IS NULL
-        WHERE p.deleted_at IS NULL AND p.id = %s
-        GROUP BY p.id, p.descricao, p.quantidade, p.quantificacao, p.valor_unitario
-        ORDER BY p.descricao
-        '''
-        params = (produto_id,)
+def obtem_movimentacoes_estoque(produto_id=None, tipo=None, desde=None, ate=None, limit=None, cursor=None):
+    """
+    Obtém as movimentações de estoque, da mais recente para a mais antiga.
+    A paginação usa a chave (data_movimentacao, id). Retorna (movimentacoes, proximo_cursor).
+    """
+    sql, params = sql_movimentacoes_estoque(produto_id, tipo, desde, ate, limit, cursor)
+    return consultar(sql, params, MAPA_MOVIMENTACAO, limit, chave=['data_movimentacao', 'id'],
+                     preparar='obtem_movimentacoes')
+
+@memoizar('produtos', 'movimentacoes_estoque', 'saldo_estoque', produto_id='produto_id')
+def obtem_saldo_estoque(produto_id=None, q=None, saldo_min=None, saldo_max=None, limit=None, cursor=None, em=None):
+    """
+    Obtém o saldo atual de todos os produtos ou de um produto específico, ordenado por descrição.
+    O saldo das movimentações vem da tabela resumo saldo_estoque ou, quando `em` é informado,
+    do snapshot mais próximo somado às movimentações até o fim daquele dia. Nos dois casos
+    saldo_total é a quantidade inicial do produto mais esse saldo das movimentações.
+    A paginação usa a chave (descricao, id). Retorna (saldos, proximo_cursor).
+    """
+    filtros = ['p.deleted_at IS NULL']
+    params = []
+    if em:
+        fonte_saldo = f'({SQL_SALDO_EM_DATA})'
+        params.extend([em, em])
     else:
-        sql = '''
-        SELECT p.id, p.descricao, p.quantidade, p.quantificacao, p.valor_unitario,
-               COALESCE(SUM(CASE WHEN me.tipo_movimentacao = 'ENTRADA' THEN me.quantidade 
-                               ELSE -me.quantidade END), 0) as saldo_movimentacoes,
-               (p.quantidade + COALESCE(SUM(CASE WHEN me.tipo_movimentacao = 'ENTRADA' THEN me.quantidade 
-                                              ELSE -me.quantidade END), 0)) as saldo_total
-        FROM public.produtos p
-        LEFT JOIN public.movimentacoes_estoque me ON me.produto_id = p.id AND me.deleted_at IS NULL
-        WHERE p.deleted_at IS NULL
-        GROUP BY p.id, p.descricao, p.quantidade, p.quantificacao, p.valor_unitario
-        ORDER BY p.descricao
-        '''
-        params = None
-    
-    resultados = open_query(sql, params)
-    saldos = []
-    
-    for resultado in resultados:
-        saldos.append({
-            'id': resultado[0],
-            'descricao': resultado[1],
-            'quantidade_inicial': float(resultado[2]) if resultado[2] else 0,
-            'quantificacao': resultado[3],
-            'valor_unitario': float(resultado[4]) if resultado[4] else 0,
-            'saldo_movimentacoes': float(resultado[5]) if resultado[5] else 0,
-            'saldo_total': float(resultado[6]) if resultado[6] else 0
-        })
+        fonte_saldo = 'public.saldo_estoque'
+    if produto_id:
+        filtros.append('p.id = %s')
+        params.append(produto_id)
+    if q:
+        filtros.append('p.descricao ILIKE %s')
+        params.append(f'%{q}%')
+    if cursor:
+        filtros.append('(p.descricao, p.id) > (%s, %s)')
+        params.extend(decodificar_cursor(cursor))
+
+    filtros_saldo = ['TRUE']
+    if saldo_min is not None:
+        filtros_saldo.append('saldo_total >= %s')
+        params.append(saldo_min)
+    if saldo_max is not None:
+        filtros_saldo.append('saldo_total <= %s')
+        params.append(saldo_max)
+
+    sql = f'''
+    SELECT *
+      FROM (SELECT p.id, p.descricao, p.quantidade AS quantidade_inicial, p.quantificacao, p.valor_unitario,
+                   COALESCE(se.saldo, 0) as saldo_movimentacoes,
+                   p.quantidade + COALESCE(se.saldo, 0) as saldo_total
+            FROM public.produtos p
+            LEFT JOIN {fonte_saldo} se ON se.produto_id = p.id
+            WHERE {' AND '.join(filtros)}) s
+     WHERE {' AND '.join(filtros_saldo)}
+     ORDER BY descricao, id
+     {clausula_limit(limit, params)}
+    '''
     
-    return saldos
+    return consultar(sql, params, MAPA_SALDO, limit, chave=['descricao', 'id'], preparar='obtem_saldo')
+
+@memoizar('produtos', 'receita', 'orcamento', 'movimentacoes_estoque', 'saldo_estoque')
+def obtem_dashboard():
+    """Calcula os indicadores do painel inicial em uma única consulta"""
+    sql = '''
+    WITH saldos AS (
+        SELECT p.id
+             , p.valor_unitario
+             , p.quantidade + COALESCE(m.saldo, 0) AS saldo_total
+          FROM public.produtos p
+          LEFT JOIN public.saldo_estoque m
+            ON m.produto_id = p.id
+         WHERE p.deleted_at IS NULL
+    )
+    SELECT (SELECT COUNT(*) FROM saldos) AS total_produtos
+         , (SELECT COUNT(*) FROM public.receita WHERE deleted_at IS NULL) AS total_receitas
+         , (SELECT COUNT(*) FROM public.orcamento WHERE deleted_at IS NULL) AS total_orcamentos
+         , (SELECT COUNT(*) FROM saldos WHERE saldo_total <= 0) AS estoque_critico
+         , (SELECT COUNT(*) FROM saldos WHERE saldo_total >= 0 AND saldo_total <= 1) AS estoque_baixo
+         , (SELECT COUNT(*) FROM saldos WHERE saldo_total < 0) AS estoque_negativo
+         , (SELECT COALESCE(SUM(saldo_total * valor_unitario), 0) FROM saldos) AS valor_total_estoque
+         , (SELECT COUNT(*)
+              FROM public.movimentacoes_estoque me
+             INNER JOIN public.produtos p ON p.id = me.produto_id AND p.deleted_at IS NULL
+             WHERE me.deleted_at IS NULL
+               AND me.tipo_movimentacao = 'ENTRADA'
+               AND me.data_movimentacao >= CURRENT_DATE
+               AND me.data_movimentacao < CURRENT_DATE + 1) AS entradas_hoje
+         , (SELECT COALESCE(json_agg(x), '[]')
+              FROM (SELECT id, descricao, valor_unitario
+                      FROM public.produtos
+                     WHERE deleted_at IS NULL
+                     ORDER BY id DESC
+                     LIMIT 5) x) AS produtos_recentes
+         , (SELECT COALESCE(json_agg(x), '[]')
+              FROM (SELECT me.id
+                         , p.descricao AS produto_descricao
+                         , me.tipo_movimentacao
+                         , me.quantidade
+                         , to_char(me.data_movimentacao, 'YYYY-MM-DD HH24:MI:SS') AS data_movimentacao
+                      FROM public.movimentacoes_estoque me
+                     INNER JOIN public.produtos p ON p.id = me.produto_id AND p.deleted_at IS NULL
+                     WHERE me.deleted_at IS NULL
+                     ORDER BY me.data_movimentacao DESC
+                     LIMIT 5) x) AS movimentacoes_recentes
+    '''
+    resultado = open_query(sql)[0]
+
+    return {
+        'total_produtos': resultado[0],
+        'total_receitas': resultado[1],
+        'total_orcamentos': resultado[2],
+        'estoque_critico': resultado[3],
+        'estoque_baixo': resultado[4],
+        'estoque_negativo': resultado[5],
+        'valor_total_estoque': round(float(resultado[6]), 2),
+        'entradas_hoje': resultado[7],
+        'produtos_recentes': resultado[8],
+        'movimentacoes_recentes': resultado[9]
+    }
 
 def inserir_movimentacao_estoque(dados):
-    """Insere uma nova movimentação de estoque e atualiza o saldo do produto"""
+    """Insere uma nova movimentação de estoque e atualiza o saldo do produto na mesma transação"""
     sql = '''
     INSERT INTO public.movimentacoes_estoque
         (produto_id, tipo_movimentacao, quantidade, tipo_entrada, observacao)
@@ -883,12 +1420,6 @@ def inserir_movimentacao_estoque(dados):
         dados.get('observacao')
     )
     
-    result = execute_query(sql, params)['data']
-    if not result:
-        raise Exception("Erro ao inserir movimentação de estoque")
-    
-    movimentacao_id = result[0][0]
-    
     # Atualiza a quantidade do produto baseado na movimentação
     if dados.get('tipo_movimentacao') == 'ENTRADA':
         sql_update = '''
@@ -904,61 +1435,349 @@ def inserir_movimentacao_estoque(dados):
             updated_at = CURRENT_TIMESTAMP
         WHERE id = %s AND deleted_at IS NULL
         '''
-    
     params_update = (dados.get('quantidade'), dados.get('produto_id'))
-    execute_query(sql_update, params_update)
-    
-    return movimentacao_id
+
+    with transacao() as cursor:
+        cursor.execute(sql, params)
+        result = cursor.fetchone()
+        if not result:
+            raise Exception("Erro ao inserir movimentação de estoque")
+        cursor.execute(sql_update, params_update)
+        sinal = 1 if dados.get('tipo_movimentacao') == 'ENTRADA' else -1
+        cursor.execute(SQL_APLICA_SALDO, (dados.get('produto_id'), sinal * Decimal(str(dados.get('quantidade')))))
+
+    notificar_alteracao('movimentacoes_estoque', produto_id=dados.get('produto_id'))
+    notificar_alteracao('produtos', produto_id=dados.get('produto_id'))
+    return result[0]
+
+def inserir_movimentacoes_estoque_lote(movimentacoes):
+    """
+    Insere um lote de movimentações com COPY e aplica o saldo de cada produto
+    com um único UPDATE agregado (e um upsert em saldo_estoque), tudo na mesma transação.
+
+    :param movimentacoes: lista de dicionários já validados pela rota.
+    :return: quantidade de movimentações inseridas.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    deltas = {}
+    for mov in movimentacoes:
+        quantidade = Decimal(str(mov['quantidade']))
+        writer.writerow([
+            mov['produto_id'],
+            mov['tipo_movimentacao'],
+            quantidade,
+            mov.get('tipo_entrada') or None,
+            mov.get('observacao') or None
+        ])
+        sinal = 1 if mov['tipo_movimentacao'] == 'ENTRADA' else -1
+        deltas[mov['produto_id']] = deltas.get(mov['produto_id'], 0) + sinal * quantidade
+    buffer.seek(0)
+
+    with transacao() as cursor:
+        cursor.execute(
+            'SELECT id FROM public.produtos WHERE deleted_at IS NULL AND id = ANY(%s)',
+            (list(deltas),)
+        )
+        faltando = set(deltas) - {linha[0] for linha in cursor.fetchall()}
+        if faltando:
+            raise Exception(f"Produtos não encontrados: {', '.join(map(str, sorted(faltando)))}")
+
+        cursor.copy_expert('''
+        COPY public.movimentacoes_estoque
+            (produto_id, tipo_movimentacao, quantidade, tipo_entrada, observacao)
+        FROM STDIN WITH (FORMAT csv)
+        ''', buffer)
+
+        # Ordenado por produto para que lotes concorrentes bloqueiem as linhas na mesma ordem
+        execute_values(cursor, '''
+        UPDATE public.produtos p
+           SET quantidade = p.quantidade + d.delta,
+               updated_at = CURRENT_TIMESTAMP
+          FROM (VALUES %s) AS d(produto_id, delta)
+         WHERE p.id = d.produto_id
+           AND p.deleted_at IS NULL
+        ''', sorted(deltas.items()), template='(%s::integer, %s::numeric)', page_size=len(deltas))
+
+        execute_values(cursor, SQL_APLICA_SALDO_LOTE, sorted(deltas.items()), page_size=len(deltas))
+
+    for produto_id in deltas:
+        notificar_alteracao('movimentacoes_estoque', produto_id=produto_id)
+        notificar_alteracao('produtos', produto_id=produto_id)
+    return len(movimentacoes)
 
 def excluir_movimentacao_estoque(id):
-    """Exclui uma movimentação de estoque (soft delete)"""
+    """Exclui uma movimentação de estoque (soft delete) e desfaz seu efeito no saldo e nos snapshots"""
     sql = '''
     UPDATE public.movimentacoes_estoque 
     SET deleted_at = CURRENT_TIMESTAMP
-    WHERE id = %s
+    WHERE id = %s AND deleted_at IS NULL
+    RETURNING produto_id,
+              CASE WHEN tipo_movimentacao = 'ENTRADA' THEN quantidade ELSE -quantidade END,
+              data_movimentacao
     '''
-    params = (id,)
-    execute_query(sql, params)
+    with transacao() as cursor:
+        cursor.execute(sql, (id,))
+        movimentacao = cursor.fetchone()
+        if movimentacao:
+            produto_id, delta, data_movimentacao = movimentacao
+            cursor.execute(SQL_APLICA_SALDO, (produto_id, -delta))
+            # Snapshots tirados depois da movimentação a incluíam
+            cursor.execute('''
+            UPDATE public.snapshot_estoque_saldo
+               SET saldo = saldo - %s
+             WHERE produto_id = %s
+               AND data_referencia >= %s::date
+            ''', (delta, produto_id, data_movimentacao))
+    if movimentacao:
+        notificar_alteracao('movimentacoes_estoque', produto_id=movimentacao[0])
+
+# Soma o delta ao saldo resumido do produto (saldo_estoque), criando a linha se necessário
+SQL_APLICA_SALDO = '''
+INSERT INTO public.saldo_estoque (produto_id, saldo)
+VALUES (%s, %s)
+ON CONFLICT (produto_id)
+DO UPDATE SET saldo = saldo_estoque.saldo + EXCLUDED.saldo,
+              updated_at = CURRENT_TIMESTAMP
+'''
+
+SQL_APLICA_SALDO_LOTE = '''
+INSERT INTO public.saldo_estoque (produto_id, saldo)
+VALUES %s
+ON CONFLICT (produto_id)
+DO UPDATE SET saldo = saldo_estoque.saldo + EXCLUDED.saldo,
+              updated_at = CURRENT_TIMESTAMP
+'''
+
+# Saldo de cada produto calculado a partir do razão de movimentações
+SQL_SALDO_RAZAO = '''
+SELECT produto_id
+     , SUM(CASE WHEN tipo_movimentacao = 'ENTRADA' THEN quantidade ELSE -quantidade END) AS saldo
+  FROM public.movimentacoes_estoque
+ WHERE deleted_at IS NULL
+ GROUP BY produto_id
+'''
+
+# Saldo de cada produto no fim do dia informado: parte do snapshot mais recente
+# até a data base e soma apenas as movimentações posteriores a ele.
+# Parâmetros: (data base do snapshot, data do saldo) - normalmente a mesma data
+SQL_SALDO_EM_DATA = '''
+WITH base AS (
+    SELECT MAX(data_referencia) AS data_referencia
+      FROM public.snapshot_estoque
+     WHERE data_referencia <= %s::date
+)
+SELECT produto_id, SUM(saldo) AS saldo
+  FROM (SELECT ss.produto_id, ss.saldo
+          FROM public.snapshot_estoque_saldo ss
+         INNER JOIN base ON base.data_referencia = ss.data_referencia
+         UNION ALL
+        SELECT me.produto_id
+             , CASE WHEN me.tipo_movimentacao = 'ENTRADA' THEN me.quantidade ELSE -me.quantidade END
+          FROM public.movimentacoes_estoque me
+         CROSS JOIN base
+         WHERE me.deleted_at IS NULL
+           AND me.data_movimentacao < %s::date + 1
+           AND (base.data_referencia IS NULL OR me.data_movimentacao >= base.data_referencia + 1)) x
+ GROUP BY produto_id
+'''
+
+def gerar_snapshot_estoque(data_referencia):
+    """
+    Grava o saldo de cada produto no fim do dia `data_referencia`.
+    Só aceita dias já encerrados; se o snapshot já existir nada é feito.
+
+    :return: True se o snapshot foi criado.
+    """
+    if data_referencia >= date.today():
+        raise ValueError("Snapshots só podem ser gerados para dias já encerrados")
+
+    with transacao() as cursor:
+        cursor.execute('''
+        INSERT INTO public.snapshot_estoque (data_referencia)
+        VALUES (%s)
+        ON CONFLICT (data_referencia) DO NOTHING
+        RETURNING data_referencia
+        ''', (data_referencia,))
+        if not cursor.fetchone():
+            return False
+
+        # O snapshot recém-inserido ainda está vazio, então a base é o anterior a ele
+        cursor.execute(f'''
+        INSERT INTO public.snapshot_estoque_saldo (data_referencia, produto_id, saldo)
+        SELECT %s, produto_id, saldo
+          FROM ({SQL_SALDO_EM_DATA}) s
+        ''', (data_referencia, data_referencia - datetime.timedelta(days=1), data_referencia))
+    logging.info(f'Snapshot de estoque gerado para {data_referencia}')
+    return True
+
+def reconciliar_saldo_estoque(corrigir=False):
+    """
+    Compara saldo_estoque com o razão de movimentações.
+
+    :param corrigir: se True, reescreve os saldos divergentes. As inserções de
+                     movimentações ficam bloqueadas durante a correção.
+    :return: lista de divergências encontradas (antes da correção).
+    """
+    sql = f'''
+    SELECT COALESCE(r.produto_id, se.produto_id) AS produto_id
+         , COALESCE(se.saldo, 0) AS saldo_resumo
+         , COALESCE(r.saldo, 0) AS saldo_razao
+      FROM ({SQL_SALDO_RAZAO}) r
+      FULL JOIN public.saldo_estoque se ON se.produto_id = r.produto_id
+     WHERE COALESCE(se.saldo, 0) <> COALESCE(r.saldo, 0)
+     ORDER BY 1
+    '''
+    with transacao() as cursor:
+        if corrigir:
+            cursor.execute('LOCK TABLE public.movimentacoes_estoque IN SHARE MODE')
+        cursor.execute(sql)
+        divergencias = cursor.fetchall()
+        if corrigir and divergencias:
+            execute_values(cursor, '''
+            INSERT INTO public.saldo_estoque (produto_id, saldo)
+            VALUES %s
+            ON CONFLICT (produto_id)
+            DO UPDATE SET saldo = EXCLUDED.saldo,
+                          updated_at = CURRENT_TIMESTAMP
+            ''', [(produto_id, saldo_razao) for produto_id, _, saldo_razao in divergencias])
+    if corrigir and divergencias:
+        notificar_alteracao('movimentacoes_estoque')
+
+    return [
+        {
+            'produto_id': produto_id,
+            'saldo_resumo': float(saldo_resumo),
+            'saldo_razao': float(saldo_razao)
+        }
+        for produto_id, saldo_resumo, saldo_razao in divergencias
+    ]
 
 #endregion
 
+# region Exportação
+EXPORTAR_BLOCO = int(os.getenv('EXPORTAR_BLOCO', '2000'))   # linhas por ida ao servidor
+# Cada exportação usa uma conexão própria, fora do pool, para um download lento não prender
+# uma conexão das rotas; EXPORTAR_SIMULTANEAS limita quantas ficam abertas ao mesmo tempo.
+EXPORTAR_SIMULTANEAS = int(os.getenv('EXPORTAR_SIMULTANEAS', '2'))
+_exportacoes = threading.BoundedSemaphore(EXPORTAR_SIMULTANEAS)
+
+def reservar_exportacao():
+    """Reserva uma das vagas de EXPORTAR_SIMULTANEAS; levanta pool.PoolError se não houver."""
+    if not _exportacoes.acquire(blocking=False):
+        raise pool.PoolError(
+            f"Limite de {EXPORTAR_SIMULTANEAS} exportações simultâneas atingido; tente novamente em instantes"
+        )
 
-def criar_tabela_estoque():
-    """Cria tabela de movimentações de estoque se não existir"""
-    check_sql = '''
-    SELECT EXISTS (
-        SELECT FROM information_schema.tables 
-        WHERE table_schema = 'public' 
-        AND table_name = 'movimentacoes_estoque'
-    );
-    '''
-    result = open_query(check_sql)
-    tabela_existe = result[0][0]
-
-    if not tabela_existe:
-        sql = '''
-        CREATE TABLE public.movimentacoes_estoque (
-            id SERIAL PRIMARY KEY,
-            produto_id INTEGER NOT NULL REFERENCES public.produtos(id),
-            tipo_movimentacao VARCHAR(20) NOT NULL CHECK (tipo_movimentacao IN ('ENTRADA', 'SAIDA')),
-            quantidade DECIMAL(10,3) NOT NULL,
-            tipo_entrada VARCHAR(20) CHECK (tipo_entrada IN ('MANUAL', 'COMPRA')),
-            observacao TEXT,
-            data_movimentacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            deleted_at TIMESTAMP
-        );
-        
-        CREATE INDEX idx_movimentacoes_produto ON public.movimentacoes_estoque(produto_id);
-        CREATE INDEX idx_movimentacoes_data ON public.movimentacoes_estoque(data_movimentacao);
+def liberar_exportacao():
+    _exportacoes.release()
+
+ENTIDADES_EXPORTACAO = ('movimentacoes', 'saldo', 'produtos')
+
+def sql_exportacao(entidade, produto_id=None, tipo=None, desde=None, ate=None, q=None):
+    """(sql, params) da exportação de uma entidade."""
+    filtros = []
+    params = []
+    if entidade == 'movimentacoes':
+        filtros.append('me.deleted_at IS NULL')
+        if produto_id:
+            filtros.append('me.produto_id = %s')
+            params.append(produto_id)
+        if tipo:
+            filtros.append('me.tipo_movimentacao = %s')
+            params.append(tipo)
+        if desde:
+            filtros.append('me.data_movimentacao >= %s::date')
+            params.append(desde)
+        if ate:
+            filtros.append('me.data_movimentacao < %s::date + 1')
+            params.append(ate)
+        sql = f'''
+        SELECT me.id, me.data_movimentacao, me.produto_id, p.descricao AS produto_descricao,
+               me.tipo_movimentacao, me.quantidade, me.tipo_entrada, me.observacao
+          FROM public.movimentacoes_estoque me
+         INNER JOIN public.produtos p ON p.id = me.produto_id AND p.deleted_at IS NULL
+         WHERE {' AND '.join(filtros)}
+         ORDER BY me.data_movimentacao, me.id
+        '''
+    elif entidade == 'saldo':
+        filtros.append('p.deleted_at IS NULL')
+        if produto_id:
+            filtros.append('p.id = %s')
+            params.append(produto_id)
+        if q:
+            filtros.append('p.descricao ILIKE %s')
+            params.append(f'%{q}%')
+        sql = f'''
+        SELECT p.id AS produto_id, p.descricao, p.quantificacao, p.valor_unitario,
+               p.quantidade AS quantidade_inicial,
+               COALESCE(se.saldo, 0) AS saldo_movimentacoes,
+               p.quantidade + COALESCE(se.saldo, 0) AS saldo_total
+          FROM public.produtos p
+          LEFT JOIN public.saldo_estoque se ON se.produto_id = p.id
+         WHERE {' AND '.join(filtros)}
+         ORDER BY p.descricao, p.id
+        '''
+    elif entidade == 'produtos':
+        filtros.append('deleted_at IS NULL')
+        if q:
+            filtros.append('descricao ILIKE %s')
+            params.append(f'%{q}%')
+        sql = f'''
+        SELECT id, descricao, quantidade, quantificacao, valor_unitario, ean
+          FROM public.produtos
+         WHERE {' AND '.join(filtros)}
+         ORDER BY id
         '''
-        execute_query(sql)
-        logging.info('Tabela de movimentações de estoque criada com sucesso')
     else:
-        logging.info('Tabela de movimentações de estoque já existe')
+        raise ValueError(f"Entidade de exportação inválida: {entidade}")
+    return sql, params
+
+def exportar(entidade, **filtros):
+    """
+    Exporta uma entidade inteira sem carregá-la em memória. Retorna um gerador que produz
+    primeiro a lista de colunas e depois blocos de até EXPORTAR_BLOCO linhas, lidos de um
+    cursor nomeado (no servidor). A conexão (própria, fora do pool) e a vaga de
+    EXPORTAR_SIMULTANEAS ficam reservadas até o gerador terminar ou ser fechado; sem vaga,
+    o primeiro next() levanta pool.PoolError.
+    """
+    sql, params = sql_exportacao(entidade, **filtros)
+
+    def ler():
+        reservar_exportacao()
+        conn = None
+        try:
+            conn = get_connection()
+            if conn is None:
+                raise Exception("Não foi possível conectar ao banco de dados")
+            with conn.cursor(name=f'exportar_{entidade}') as cursor:
+                cursor.itersize = EXPORTAR_BLOCO
+                cursor.execute(sql, params)
+                bloco = cursor.fetchmany(EXPORTAR_BLOCO)
+                yield [coluna.name for coluna in cursor.description]
+                while bloco:
+                    yield bloco
+                    bloco = cursor.fetchmany(EXPORTAR_BLOCO)
+        finally:
+            if conn is not None:
+                conn.close()
+            liberar_exportacao()
+    return ler()
+
+#endregion
 
 if __name__ == '__main__':
-    criar_tabela_produtos()
-    criar_tabela_estoque()
+    # Executar a partir de src/:
+    # python -m routes.esquema                     -> aplica as migrações do banco
+    # python -m routes.pg reconciliar [--corrigir] -> confere saldo_estoque contra o razão
+    # python -m routes.pg snapshot AAAA-MM-DD      -> gera o snapshot de saldos do dia
+    if len(sys.argv) > 2 and sys.argv[1] == 'snapshot':
+        criado = gerar_snapshot_estoque(date.fromisoformat(sys.argv[2]))
+        print('Snapshot gerado' if criado else 'Snapshot já existia')
+    elif len(sys.argv) > 1 and sys.argv[1] == 'reconciliar':
+        corrigir = '--corrigir' in sys.argv
+        divergencias = reconciliar_saldo_estoque(corrigir=corrigir)
+        for d in divergencias:
+            print(f"Produto {d['produto_id']}: resumo {d['saldo_resumo']} / razão {d['saldo_razao']}")
+        print(f"{len(divergencias)} divergência(s) encontrada(s){' e corrigida(s)' if corrigir and divergencias else ''}")
 
@@ -0,0 +1,146 @@
+"""
+Acesso assíncrono ao PostgreSQL (asyncpg), usado pelo ponto de entrada ASGI (asgi.py).
+
+Reaproveita o SQL de pg: os %s são trocados por $1, $2... (pg.converter_parametros) e os
+resultados passam pelos mesmos Mapeamentos, então as respostas são idênticas às do app
+Flask. O asyncpg já prepara e guarda em cache cada comando por conexão, por isso o
+`preparar` de pg é aceito e ignorado.
+
+DATE e TIMESTAMP usam o formato texto: o psycopg2 aceita datas em texto nos parâmetros
+(filtros desde/ate e os cursores de paginação), enquanto o codec binário do asyncpg
+exigiria objetos date/datetime.
+"""
+from . import pg
+from .cache import memoizar_assincrono
+from .serializacao import Mapeamento
+import asyncio
+import datetime
+import os
+import asyncpg
+
+POOL_ASSINCRONO = {
+    'min_size': int(os.getenv('DB_ASYNC_POOL_MIN', '1')),
+    'max_size': int(os.getenv('DB_ASYNC_POOL_MAX', '10')),
+    'max_inactive_connection_lifetime': float(os.getenv('DB_POOL_TEMPO_VIDA', '1800')),
+}
+
+_pool = None
+_lock = asyncio.Lock()
+_sql = {}   # sql do psycopg2 -> sql do asyncpg
+
+def _para_texto(valor):
+    return valor if isinstance(valor, str) else valor.isoformat()
+
+def _ler_timestamp(texto):
+    return datetime.datetime.strptime(texto, '%Y-%m-%d %H:%M:%S.%f' if '.' in texto else '%Y-%m-%d %H:%M:%S')
+
+async def _configurar_conexao(conn):
+    await conn.set_type_codec('date', schema='pg_catalog', format='text',
+                              encoder=_para_texto, decoder=datetime.date.fromisoformat)
+    await conn.set_type_codec('timestamp', schema='pg_catalog', format='text',
+                              encoder=_para_texto, decoder=_ler_timestamp)
+
+def _parametros_conexao():
+    return {
+        'database': pg.DB_CONFIG['dbname'],
+        'user': pg.DB_CONFIG['user'],
+        'password': pg.DB_CONFIG['password'],
+        'host': pg.DB_CONFIG['host'],
+        'port': int(pg.DB_CONFIG['port']) if pg.DB_CONFIG['port'] else None,
+    }
+
+async def obter_pool():
+    """Cria o pool na primeira chamada (dentro do loop do servidor ASGI)."""
+    global _pool
+    if _pool is None:
+        async with _lock:
+            if _pool is None:
+                _pool = await asyncpg.create_pool(
+                    init=_configurar_conexao, **_parametros_conexao(), **POOL_ASSINCRONO
+                )
+    return _pool
+
+async def fechar_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+def _converter(query):
+    convertido = _sql.get(query)
+    if convertido is None:
+        resultado = pg.converter_parametros(query)
+        if resultado is None:
+            raise ValueError("Consulta com parâmetros nomeados não é suportada pelo asyncpg")
+        convertido = _sql[query] = resultado[0]
+    return convertido
+
+async def open_query(query, params=None, preparar=None):
+    """Executa um SELECT e devolve as linhas (asyncpg.Record, acessíveis como tuplas)."""
+    if pg.logar_query:
+        print(f"Executando query: {query}")
+        print(f"Parâmetros: {params}")
+    pool = await obter_pool()
+    return await pool.fetch(_converter(query), *(params or ()))
+
+async def consultar(query, params=None, mapeamento=None, limit=None, chave=None, preparar=None):
+    """Equivalente assíncrono de pg.consultar: devolve (registros, proximo_cursor)."""
+    linhas = await open_query(query, params)
+    colunas = list(linhas[0].keys()) if linhas else []
+    proximo = None
+    if limit and len(linhas) > limit:
+        linhas = linhas[:limit]
+        proximo = pg.codificar_cursor([linhas[-1][coluna] for coluna in chave])
+    return (mapeamento or Mapeamento()).aplicar(colunas, linhas), proximo
+
+@memoizar_assincrono('produtos', produto_id='id')
+async def obtem_produtos(q=None, limit=None, cursor=None, id=None):
+    """Equivalente assíncrono de pg.obtem_produtos."""
+    sql, params = pg.sql_produtos(q, limit, cursor, id)
+    return await consultar(sql, params, pg.MAPA_PRODUTO, limit, chave=['id'])
+
+async def obtem_movimentacoes_estoque(produto_id=None, tipo=None, desde=None, ate=None, limit=None, cursor=None):
+    """Equivalente assíncrono de pg.obtem_movimentacoes_estoque."""
+    sql, params = pg.sql_movimentacoes_estoque(produto_id, tipo, desde, ate, limit, cursor)
+    return await consultar(sql, params, pg.MAPA_MOVIMENTACAO, limit, chave=['data_movimentacao', 'id'])
+
+async def versoes_tabelas(tabelas):
+    """Equivalente assíncrono de pg.versoes_tabelas."""
+    versoes = dict(await open_query(pg.SQL_VERSOES_TABELAS, (list(tabelas),)))
+    return tuple(versoes.get(tabela, 0) for tabela in tabelas)
+
+async def exportar(entidade, **filtros):
+    """
+    Equivalente assíncrono de pg.exportar: gerador que produz a lista de colunas e depois
+    blocos de até pg.EXPORTAR_BLOCO linhas, lidos de um cursor no servidor. Como lá, usa
+    uma conexão própria (fora do pool) e uma vaga de pg.EXPORTAR_SIMULTANEAS.
+    """
+    sql, params = pg.sql_exportacao(entidade, **filtros)
+    pg.reservar_exportacao()
+    conn = None
+    try:
+        conn = await asyncpg.connect(**_parametros_conexao())
+        await _configurar_conexao(conn)
+        async with conn.transaction(readonly=True):
+            preparado = await conn.prepare(_converter(sql))
+            yield [atributo.name for atributo in preparado.get_attributes()]
+            cursor = await preparado.cursor(*params)
+            bloco = await cursor.fetch(pg.EXPORTAR_BLOCO)
+            while bloco:
+                yield bloco
+                bloco = await cursor.fetch(pg.EXPORTAR_BLOCO)
+    finally:
+        if conn is not None:
+            await conn.close()
+        pg.liberar_exportacao()
+
+def estatisticas():
+    if _pool is None:
+        return {'ativo': False}
+    return {
+        'ativo': True,
+        'tamanho': _pool.get_size(),
+        'ociosas': _pool.get_idle_size(),
+        'minimo': _pool.get_min_size(),
+        'maximo': _pool.get_max_size()
+    }
@@ -1,20 +1,225 @@
-from flask import jsonify, request, render_template
+from flask import jsonify, request, render_template, make_response, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from . import pg  
-import pandas as pd
+from . import custos
+from . import cache
+from . import eventos
+from . import serializacao
+from . import compressao
+from . import inicializacao
+from . import esquema
+from datetime import date
+from decimal import Decimal
+from functools import wraps
+import csv
+import datetime
+import hashlib
+import io
+
+LIMITE_MAXIMO_PAGINA = 1000
+
+class ProvedorJSON(DefaultJSONProvider):
+    """Provedor JSON do Flask usando serializacao (orjson quando instalado)."""
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        return serializacao.dumps(obj)
+
+    def loads(self, s, **kwargs):
+        return serializacao.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(serializacao.dumps_bytes(obj), mimetype=self.mimetype)
+
+def etag_consulta(caminho, versoes):
+    """ETag de uma consulta: URL completa (com a query string), data atual e versão das tabelas."""
+    base = f"{caminho}|{date.today()}|{versoes}"
+    return hashlib.sha1(base.encode('utf-8')).hexdigest()
+
+def condicional(*tabelas):
+    """
+    GET condicional: o ETag é derivado da URL, da data atual e da versão das tabelas
+    informadas (pg.versoes_tabelas). Se o cliente já tem essa versão responde 304 sem
+    executar a consulta; caso contrário executa a rota e anexa o ETag. Respostas
+    comprimidas levam o ETag com o sufixo da codificação (compressao.comprimir_resposta).
+    A rota executa com essas versões em cache.versoes_lidas, para não responder com uma
+    entrada do cache mais velha que o ETag.
+    """
+    def decorador(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                versoes = pg.versoes_tabelas(tabelas)
+            except Exception as e:
+                print(f"ETag indisponível: {e}")
+                return view(*args, **kwargs)
+
+            etag = etag_consulta(request.full_path, versoes)
+            codificacao = compressao.codificacao_aceita()
+            variantes = [etag, f'{etag}-{codificacao}'] if codificacao else [etag]
+            correspondente = next((e for e in variantes if request.if_none_match.contains(e)), None)
+            if correspondente:
+                resposta = make_response('', 304)
+                etag = correspondente
+            else:
+                with cache.versoes_lidas(tabelas, versoes):
+                    resposta = make_response(view(*args, **kwargs))
+                if resposta.status_code != 200:
+                    return resposta
+            resposta.set_etag(etag)
+            # Obriga o navegador a revalidar, o que normalmente termina em 304
+            resposta.headers['Cache-Control'] = 'no-cache'
+            return resposta
+        return wrapper
+    return decorador
+
+def parametros_paginacao(args=None):
+    """
+    Lê limit/cursor da query string (`args`, por padrão request.args).
+    Sem limit a listagem retorna todos os registros.
+    """
+    args = request.args if args is None else args
+    limit = args.get('limit', type=int)
+    if limit is not None and not 0 < limit <= LIMITE_MAXIMO_PAGINA:
+        raise ValueError(f"limit deve estar entre 1 e {LIMITE_MAXIMO_PAGINA}")
+    return {
+        'limit': limit,
+        'cursor': args.get('cursor') or None
+    }
+
+def validar_lote(itens, campos_obrigatorios, campo_chave):
+    """
+    Valida as linhas de um lote antes de qualquer escrita.
+
+    Campos obrigatórios são convertidos para número (o campo chave para int).
+    Linhas com a mesma chave repetida no lote são rejeitadas.
+    :return: (validos, erros) - validos é uma lista de (indice, dados) e erros um dict indice -> mensagem.
+    """
+    if not isinstance(itens, list) or not itens:
+        raise ValueError("Envie uma lista de itens não vazia")
+
+    validos = []
+    erros = {}
+    chaves = set()
+    for indice, dados in enumerate(itens):
+        if not isinstance(dados, dict):
+            erros[indice] = "Item inválido"
+            continue
+        try:
+            for campo in campos_obrigatorios:
+                if dados.get(campo) is None:
+                    raise ValueError(f"Campo obrigatório ausente: {campo}")
+                dados[campo] = int(dados[campo]) if campo == campo_chave else float(dados[campo])
+            if dados[campo_chave] in chaves:
+                raise ValueError(f"{campo_chave} {dados[campo_chave]} repetido no lote")
+        except (TypeError, ValueError) as e:
+            erros[indice] = str(e)
+            continue
+        chaves.add(dados[campo_chave])
+        validos.append((indice, dados))
+    return validos, erros
+
+def resultado_lote(total, ids, erros):
+    """Monta a lista de resultados por linha (id ou erro) na ordem do lote."""
+    return [
+        {"indice": indice, "id": ids[indice]} if indice in ids else {"indice": indice, "erro": erros.get(indice)}
+        for indice in range(total)
+    ]
+
+def validar_movimentacao(dados):
+    """Valida uma movimentação de estoque, levantando ValueError com a mensagem do primeiro problema."""
+    campos_obrigatorios = ['produto_id', 'tipo_movimentacao', 'quantidade']
+    for campo in campos_obrigatorios:
+        if campo not in dados or dados[campo] in (None, ''):
+            raise ValueError(f"Campo obrigatório ausente: {campo}")
+
+    if dados['tipo_movimentacao'] not in ['ENTRADA', 'SAIDA']:
+        raise ValueError("tipo_movimentacao deve ser 'ENTRADA' ou 'SAIDA'")
+
+    if dados['tipo_movimentacao'] == 'ENTRADA' and dados.get('tipo_entrada'):
+        if dados['tipo_entrada'] not in ['MANUAL', 'COMPRA']:
+            raise ValueError("tipo_entrada deve ser 'MANUAL' ou 'COMPRA'")
+
+def ler_lote_movimentacoes():
+    """
+    Lê o lote de movimentações da requisição: lista JSON, arquivo CSV (campo 'arquivo')
+    ou corpo text/csv. O CSV deve ter cabeçalho com os nomes dos campos.
+    """
+    if request.is_json:
+        dados = request.get_json()
+        return dados.get('movimentacoes') if isinstance(dados, dict) else dados
+
+    if 'arquivo' in request.files:
+        texto = request.files['arquivo'].read().decode('utf-8-sig')
+    else:
+        texto = request.get_data(as_text=True)
+    return list(csv.DictReader(io.StringIO(texto), delimiter=';' if ';' in texto.split('\n', 1)[0] else ','))
+
+FORMATOS_EXPORTACAO = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8'
+}
+
+def valor_exportacao(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, datetime.datetime):
+        return valor.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(valor, datetime.date):
+        return valor.isoformat()
+    return valor
+
+def formatador_exportacao(formato, colunas):
+    """Retorna (cabeçalho, função que converte um bloco de linhas em texto) para CSV ou NDJSON."""
+    if formato == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(colunas)
+        cabecalho = buffer.getvalue()
+
+        def formatar(bloco):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows([valor_exportacao(v) for v in linha] for linha in bloco)
+            return buffer.getvalue()
+        return cabecalho, formatar
+    # Os valores passam por valor_exportacao como no CSV: datas 'AAAA-MM-DD HH:MM:SS' e
+    # Decimal como número, o mesmo com ou sem orjson
+    return '', lambda bloco: ''.join(
+        serializacao.dumps(dict(zip(colunas, map(valor_exportacao, linha)))) + '\n' for linha in bloco
+    )
+
+def gerar_exportacao(formato, colunas, blocos):
+    """Converte os blocos de linhas de pg.exportar em texto CSV ou NDJSON, um bloco por vez."""
+    cabecalho, formatar = formatador_exportacao(formato, colunas)
+    if cabecalho:
+        yield cabecalho
+    for bloco in blocos:
+        yield formatar(bloco)
 
 def setup_routes(app):
     @app.route('/')
     def index():
-        return render_template("index.html")  # arquivo templates/index.html
+        # arquivo templates/index.html, renderizado e comprimido uma vez por processo
+        return compressao.resposta_estatica(
+            'index.html',
+            lambda: render_template("index.html", ws_porta=eventos.EVENTOS_PORTA)
+        )
 
     @app.route('/produtos', methods=['GET'])
+    @condicional('produtos')
     def listar_produto():
         try:
-            produtos = pg.obtem_produtos()
+            produtos, proximo_cursor = pg.obtem_produtos(
+                q=request.args.get('q') or None,
+                **parametros_paginacao()
+            )
 
             return jsonify({
                 "status": "sucesso",
-                "produtos": produtos                    
+                "produtos": produtos,
+                "proximo_cursor": proximo_cursor
             })
         except Exception as e:
             return jsonify({
@@ -22,7 +227,29 @@ def setup_routes(app):
                 "mensagem": str(e)
             }), 500
         
+    @app.route('/produtos/<int:id>', methods=['GET'])
+    @condicional('produtos')
+    def obter_produto(id):
+        try:
+            produtos, _ = pg.obtem_produtos(id=id)
+            if not produtos:
+                return jsonify({
+                    "status": "erro",
+                    "mensagem": "Produto não encontrado"
+                }), 404
+
+            return jsonify({
+                "status": "sucesso",
+                "produto": produtos[0]
+            })
+        except Exception as e:
+            return jsonify({
+                "status": "erro",
+                "mensagem": str(e)
+            }), 500
+
     @app.route('/produtos_selecao', methods=['GET'])
+    @condicional('produtos')
     def listar_produto_selecao():
         try:
             produtos = pg.obtem_produtos_selecao()
@@ -100,13 +327,18 @@ def setup_routes(app):
             }), 500
 
     @app.route('/receitas', methods=['GET'])
+    @condicional('receita')
     def listar_receita():
         try:
-            receitas = pg.obtem_receitas()
+            receitas, proximo_cursor = pg.obtem_receitas(
+                q=request.args.get('q') or None,
+                **parametros_paginacao()
+            )
 
             return jsonify({
                 "status": "sucesso",
-                "receitas": receitas
+                "receitas": receitas,
+                "proximo_cursor": proximo_cursor
             })
         except Exception as e:
             return jsonify({
@@ -173,6 +405,7 @@ def setup_routes(app):
             }), 500
 
     @app.route('/receitas/<int:receita_id>/itens', methods=['GET'])
+    @condicional('item_receita', 'produtos')
     def listar_item_receita(receita_id):
         try:
             itens = pg.obtem_itens_receita(receita_id)
@@ -211,6 +444,29 @@ def setup_routes(app):
                 "mensagem": str(e)
             }), 500
 
+    @app.route('/receitas/<int:receita_id>/itens/lote', methods=['POST'])
+    def inserir_itens_receita_lote(receita_id):
+        try:
+            itens = request.get_json()
+            validos, erros = validar_lote(itens, ['produto_id', 'quantidade_utilizada'], 'produto_id')
+
+            ids = {}
+            if validos:
+                ids, erros_banco = pg.inserir_itens_receita_lote(receita_id, validos)
+                erros.update(erros_banco)
+
+            return jsonify({
+                "status": "sucesso",
+                "inseridos": len(ids),
+                "erros": len(erros),
+                "itens": resultado_lote(len(itens), ids, erros)
+            })
+        except Exception as e:
+            return jsonify({
+                "status": "erro",
+                "mensagem": str(e)
+            }), 500
+
     @app.route('/receitas/itens/<int:item_id>', methods=['DELETE'])
     def excluir_item_receita(item_id):
         try:
@@ -228,13 +484,18 @@ def setup_routes(app):
 
 
     @app.route('/orcamento', methods=['GET'])
+    @condicional('orcamento')
     def listar_orcamento():
         try:
-            orcamento = pg.obtem_orcamento()
+            orcamento, proximo_cursor = pg.obtem_orcamento(
+                q=request.args.get('q') or None,
+                **parametros_paginacao()
+            )
 
             return jsonify({
                 "status": "sucesso",
-                "orcamento": orcamento
+                "orcamento": orcamento,
+                "proximo_cursor": proximo_cursor
             })
         except Exception as e:
             return jsonify({
@@ -303,9 +564,10 @@ def setup_routes(app):
             }), 500
         
     @app.route('/orcamento/<int:orcamento_id>/total', methods=['GET'])
+    @condicional('orcamento', 'item_orcamento', 'receita', 'item_receita', 'produtos', 'movimentacoes_estoque')
     def obtem_totais_orcamento(orcamento_id):
         try:
-            totais = pg.obtem_totais_orcamento(orcamento_id)
+            totais = custos.obtem_totais_orcamento(orcamento_id)
 
             return jsonify({
                 "status": "sucesso",
@@ -317,7 +579,51 @@ def setup_routes(app):
                 "mensagem": str(e)
             }), 500
         
+    @app.route('/orcamento/<int:orcamento_id>/simulacao', methods=['POST'])
+    def simular_orcamento(orcamento_id):
+        try:
+            dados = request.get_json(silent=True) or {}
+            simulacao = custos.simular_orcamento(
+                orcamento_id,
+                percentuais=dados.get('percentuais'),
+                quantidades=dados.get('quantidades'),
+                multiplicadores=dados.get('multiplicadores')
+            )
+
+            return jsonify({
+                "status": "sucesso",
+                "data": simulacao
+            })
+        except ValueError as e:
+            # Parâmetros inválidos ou simulação grande demais
+            return jsonify({
+                "status": "erro",
+                "mensagem": str(e)
+            }), 400
+        except Exception as e:
+            return jsonify({
+                "status": "erro",
+                "mensagem": str(e)
+            }), 500
+
+    @app.route('/orcamento/<int:orcamento_id>/necessidades', methods=['GET'])
+    @condicional('orcamento', 'item_orcamento', 'receita', 'item_receita', 'produtos', 'saldo_estoque')
+    def obtem_necessidades_orcamento(orcamento_id):
+        try:
+            necessidades = pg.obtem_necessidades_orcamento(orcamento_id)
+
+            return jsonify({
+                "status": "sucesso",
+                "data": necessidades
+            })
+        except Exception as e:
+            return jsonify({
+                "status": "erro",
+                "mensagem": str(e)
+            }), 500
+
     @app.route('/orcamento/<int:orcamento_id>/itens', methods=['GET'])
+    @condicional('item_orcamento', 'orcamento', 'receita')
     def listar_item_orcamento(orcamento_id):
         try:
             itens = pg.obtem_itens_orcamento(orcamento_id)
@@ -354,6 +660,29 @@ def setup_routes(app):
                 "mensagem": str(e)
             }), 500
 
+    @app.route('/orcamento/<int:orcamento_id>/itens/lote', methods=['POST'])
+    def inserir_itens_orcamento_lote(orcamento_id):
+        try:
+            itens = request.get_json()
+            validos, erros = validar_lote(itens, ['receita_id', 'quantidade'], 'receita_id')
+
+            ids = {}
+            if validos:
+                ids, erros_banco = pg.inserir_itens_orcamento_lote(orcamento_id, validos)
+                erros.update(erros_banco)
+
+            return jsonify({
+                "status": "sucesso",
+                "inseridos": len(ids),
+                "erros": len(erros),
+                "itens": resultado_lote(len(itens), ids, erros)
+            })
+        except Exception as e:
+            return jsonify({
+                "status": "erro",
+                "mensagem": str(e)
+            }), 500
+
     @app.route('/orcamento/itens/<int:item_id>', methods=['DELETE'])
     def excluir_item_orcamento(item_id):
         try:
@@ -369,6 +698,7 @@ def setup_routes(app):
             }), 500
         
     @app.route('/orcamento/<int:orcamento_id>/receitas', methods=['GET'])
+    @condicional('item_orcamento', 'orcamento', 'receita')
     def obtem_itens_orcamentos_receita(orcamento_id):
         try:
             itens = pg.obtem_itens_orcamentos_receita(orcamento_id)
@@ -385,14 +715,26 @@ def setup_routes(app):
 
     # region Endpoints de Estoque
     @app.route('/estoque/movimentacoes', methods=['GET'])
+    @condicional('movimentacoes_estoque', 'produtos')
     def listar_movimentacoes_estoque():
         try:
             produto_id = request.args.get('produto_id', type=int)
-            movimentacoes = pg.obtem_movimentacoes_estoque(produto_id if produto_id else None)
+            tipo = request.args.get('tipo') or None
+            if tipo and tipo not in ['ENTRADA', 'SAIDA']:
+                raise ValueError("tipo deve ser 'ENTRADA' ou 'SAIDA'")
+
+            movimentacoes, proximo_cursor = pg.obtem_movimentacoes_estoque(
+                produto_id if produto_id else None,
+                tipo=tipo,
+                desde=request.args.get('desde') or None,
+                ate=request.args.get('ate') or None,
+                **parametros_paginacao()
+            )
 
             return jsonify({
                 "status": "sucesso",
-                "movimentacoes": movimentacoes
+                "movimentacoes": movimentacoes,
+                "proximo_cursor": proximo_cursor
             })
         except Exception as e:
             return jsonify({
@@ -401,14 +743,27 @@ def setup_routes(app):
             }), 500
 
     @app.route('/estoque/saldo', methods=['GET'])
+    @condicional('produtos', 'saldo_estoque', 'movimentacoes_estoque')
     def listar_saldo_estoque():
         try:
             produto_id = request.args.get('produto_id', type=int)
-            saldos = pg.obtem_saldo_estoque(produto_id if produto_id else None)
+            em = request.args.get('em') or None
+            if em:
+                # Saldo no fim do dia informado, a partir do snapshot mais próximo
+                em = date.fromisoformat(em)
+            saldos, proximo_cursor = pg.obtem_saldo_estoque(
+                produto_id if produto_id else None,
+                q=request.args.get('q') or None,
+                saldo_min=request.args.get('saldo_min', type=float),
+                saldo_max=request.args.get('saldo_max', type=float),
+                em=em,
+                **parametros_paginacao()
+            )
 
             return jsonify({
                 "status": "sucesso",
-                "saldos": saldos
+                "saldos": saldos,
+                "proximo_cursor": proximo_cursor
             })
         except Exception as e:
             return jsonify({
@@ -420,19 +775,7 @@ def setup_routes(app):
     def inserir_movimentacao_estoque():
         try:
             dados = request.get_json()
-            campos_obrigatorios = ['produto_id', 'tipo_movimentacao', 'quantidade']
-            
-            for campo in campos_obrigatorios:
-                if campo not in dados:
-                    raise ValueError(f"Campo obrigatório ausente: {campo}")
-
-            # Validações adicionais
-            if dados['tipo_movimentacao'] not in ['ENTRADA', 'SAIDA']:
-                raise ValueError("tipo_movimentacao deve ser 'ENTRADA' ou 'SAIDA'")
-            
-            if dados['tipo_movimentacao'] == 'ENTRADA' and 'tipo_entrada' in dados:
-                if dados['tipo_entrada'] not in ['MANUAL', 'COMPRA']:
-                    raise ValueError("tipo_entrada deve ser 'MANUAL' ou 'COMPRA'")
+            validar_movimentacao(dados)
 
             id = pg.inserir_movimentacao_estoque(dados)
 
@@ -447,6 +790,45 @@ def setup_routes(app):
                 "mensagem": str(e)
             }), 500
 
+    @app.route('/estoque/movimentacoes/lote', methods=['POST'])
+    def inserir_movimentacoes_estoque_lote():
+        try:
+            movimentacoes = ler_lote_movimentacoes()
+            if not isinstance(movimentacoes, list) or not movimentacoes:
+                raise ValueError("Envie uma lista de movimentações não vazia")
+
+            # O lote é gravado inteiro ou não é gravado: qualquer linha inválida rejeita o lote
+            erros = []
+            for indice, dados in enumerate(movimentacoes):
+                try:
+                    if not isinstance(dados, dict):
+                        raise ValueError("Movimentação inválida")
+                    validar_movimentacao(dados)
+                    dados['produto_id'] = int(dados['produto_id'])
+                    dados['quantidade'] = float(dados['quantidade'])
+                except (TypeError, ValueError) as e:
+                    erros.append({"indice": indice, "erro": str(e)})
+
+            if erros:
+                return jsonify({
+                    "status": "erro",
+                    "mensagem": f"{len(erros)} movimentação(ões) inválida(s); nenhuma foi gravada",
+                    "erros": erros
+                }), 500
+
+            total = pg.inserir_movimentacoes_estoque_lote(movimentacoes)
+
+            return jsonify({
+                "status": "sucesso",
+                "inseridos": total,
+                "mensagem": "Movimentações de estoque registradas com sucesso!"
+            })
+        except Exception as e:
+            return jsonify({
+                "status": "erro",
+                "mensagem": str(e)
+            }), 500
+
     @app.route('/estoque/movimentacoes/<int:id>', methods=['DELETE'])
     def excluir_movimentacao_estoque(id):
         try:
@@ -461,4 +843,173 @@ def setup_routes(app):
                 "mensagem": str(e)
             }), 500
 
+    #endregion
+
+    @app.route('/dashboard', methods=['GET'])
+    @condicional('produtos', 'receita', 'orcamento', 'movimentacoes_estoque', 'saldo_estoque')
+    def dashboard():
+        try:
+            return jsonify({
+                "status": "sucesso",
+                "dashboard": pg.obtem_dashboard()
+            })
+        except Exception as e:
+            return jsonify({
+                "status": "erro",
+                "mensagem": str(e)
+            }), 500
+
+    # region Exportação
+    @app.route('/export/<entidade>.<formato>', methods=['GET'])
+    def exportar(entidade, formato):
+        """Exporta movimentacoes, saldo ou produtos em CSV ou NDJSON, em streaming."""
+        try:
+            if formato not in FORMATOS_EXPORTACAO:
+                raise ValueError(f"Formato de exportação inválido: {formato}")
+            blocos = pg.exportar(
+                entidade,
+                produto_id=request.args.get('produto_id', type=int),
+                tipo=request.args.get('tipo') or None,
+                desde=request.args.get('desde') or None,
+                ate=request.args.get('ate') or None,
+                q=request.args.get('q') or None
+            )
+            # Lê as colunas antes de responder: erros de consulta ainda viram JSON
+            colunas = next(blocos)
+        except pg.pool.PoolError as e:
+            # Limite de exportações simultâneas (pg.EXPORTAR_SIMULTANEAS)
+            resposta = jsonify({
+                "status": "erro",
+                "mensagem": str(e)
+            })
+            resposta.headers['Retry-After'] = '5'
+            return resposta, 503
+        except Exception as e:
+            return jsonify({
+                "status": "erro",
+                "mensagem": str(e)
+            }), 500
+
+        resposta = Response(
+            stream_with_context(gerar_exportacao(formato, colunas, blocos)),
+            mimetype=FORMATOS_EXPORTACAO[formato]
+        )
+        resposta.headers['Content-Disposition'] = f'attachment; filename="{entidade}.{formato}"'
+        resposta.headers['Cache-Control'] = 'no-store'
+        return resposta
+    #endregion
+
+    # region Endpoints de Status
+    @app.route('/status/custos', methods=['GET'])
+    def status_custos():
+        try:
+            return jsonify({
+                "status": "sucesso",
+                "custos": custos.estatisticas()
+            })
+        except Exception as e:
+            return jsonify({
+                "status": "erro",
+                "mensagem": str(e)
+            }), 500
+
+    @app.route('/status/cache', methods=['GET'])
+    def status_cache():
+        try:
+            return jsonify({
+                "status": "sucesso",
+                "cache": cache.estatisticas()
+            })
+        except Exception as e:
+            return jsonify({
+                "status": "erro",
+                "mensagem": str(e)
+            }), 500
+
+    @app.route('/status/pool', methods=['GET'])
+    def status_pool():
+        try:
+            return jsonify({
+                "status": "sucesso",
+                "pool": pg.estatisticas_pool(),
+                "preparadas": pg.estatisticas_preparadas()
+            })
+        except Exception as e:
+            return jsonify({
+                "status": "erro",
+                "mensagem": str(e)
+            }), 500
+
+    @app.route('/status/eventos', methods=['GET'])
+    def status_eventos():
+        try:
+            return jsonify({
+                "status": "sucesso",
+                "eventos": eventos.estatisticas()
+            })
+        except Exception as e:
+            return jsonify({
+                "status": "erro",
+                "mensagem": str(e)
+            }), 500
+
+    @app.route('/status/compressao', methods=['GET'])
+    def status_compressao():
+        try:
+            return jsonify({
+                "status": "sucesso",
+                "compressao": compressao.estatisticas()
+            })
+        except Exception as e:
+            return jsonify({
+                "status": "erro",
+                "mensagem": str(e)
+            }), 500
+
+    @app.route('/status/inicializacao', methods=['GET'])
+    def status_inicializacao():
+        try:
+            return jsonify({
+                "status": "sucesso",
+                "inicializacao": inicializacao.relatorio()
+            })
+        except Exception as e:
+            return jsonify({
+                "status": "erro",
+                "mensagem": str(e)
+            }), 500
+
+    @app.route('/status/indices', methods=['GET'])
+    def status_indices():
+        """Planos das consultas principais; ?explain=1 refaz o EXPLAIN agora."""
+        try:
+            return jsonify({
+                "status": "sucesso",
+                "indices": list(esquema.INDICES),
+                "planos": esquema.planos() if request.args.get('explain') else None,
+                "ultima_criacao": esquema.relatorio()
+            })
+        except Exception as e:
+            return jsonify({
+                "status": "erro",
+                "mensagem": str(e)
+            }), 500
+
+    @app.route('/status/esquema', methods=['GET'])
+    def status_esquema():
+        """Migrações do banco: aplicadas, pendentes e alteradas depois de aplicadas."""
+        try:
+            migracoes = esquema.estado_migracoes()
+            return jsonify({
+                "status": "sucesso",
+                "versao": max((m['versao'] for m in migracoes if m['aplicada_em']), default=0),
+                "pendentes": [m['nome'] for m in migracoes if not m['aplicada_em']],
+                "migracoes": migracoes
+            })
+        except Exception as e:
+            return jsonify({
+                "status": "erro",
+                "mensagem": str(e)
+            }), 500
+
     #endregion
\ No newline at end of file
@@ -0,0 +1,119 @@
+"""
+Conversão de linhas do banco em dicionários e serialização JSON.
+
+Cada consulta declara uma vez, com um Mapeamento, como converter as colunas que
+precisam de tratamento (pelo nome da coluna no SELECT); as demais passam direto.
+O JSON usa orjson quando instalado (JSON_RAPIDO=desligado força o json padrão);
+nos dois casos Decimal vira número e datas viram texto ISO.
+"""
+from decimal import Decimal
+import datetime
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if os.getenv('JSON_RAPIDO', 'ligado') == 'desligado':
+    orjson = None
+
+# region Conversores
+# Cada conversor tem a expressão equivalente em `expressao`, que o Mapeamento usa para
+# montar o código da conversão sem uma chamada de função por valor.
+def _conversor(expressao):
+    def decorador(funcao):
+        funcao.expressao = expressao
+        return funcao
+    return decorador
+
+@_conversor('float({v}) if {v} else 0.0')
+def numero(valor):
+    """NUMERIC/NULL -> float (NULL e zero viram 0.0)."""
+    return float(valor) if valor else 0.0
+
+@_conversor('int({v}) if {v} else 0')
+def inteiro(valor):
+    return int(valor) if valor else 0
+
+@_conversor("{v} if {v} else ''")
+def texto(valor):
+    """NULL -> ''."""
+    return valor if valor else ''
+
+@_conversor("{v}.isoformat(' ', 'seconds') if {v} else ''")
+def data_hora(valor):
+    """TIMESTAMP -> 'AAAA-MM-DD HH:MM:SS' (NULL -> '')."""
+    return valor.isoformat(' ', 'seconds') if valor else ''
+#endregion
+
+class Mapeamento:
+    """
+    Converte linhas (tuplas) em dicionários usando os nomes das colunas da consulta.
+
+    Para cada lista de colunas é gerada (uma vez) uma função que monta os dicionários
+    em uma única compreensão de lista, com as conversões embutidas.
+
+    :param conversores: coluna -> função aplicada ao valor.
+    :param extras: campos fixos acrescentados a cada linha.
+    """
+
+    def __init__(self, extras=None, **conversores):
+        self.conversores = conversores
+        self.extras = extras or {}
+        self._compilados = {}   # tuple(colunas) -> função
+
+    def _compilar(self, colunas):
+        ambiente = {}
+        campos = []
+        for i, coluna in enumerate(colunas):
+            valor = f'l[{i}]'
+            conversor = self.conversores.get(coluna)
+            if conversor is None:
+                campos.append(f'{coluna!r}: {valor}')
+            elif hasattr(conversor, 'expressao'):
+                campos.append(f'{coluna!r}: ({conversor.expressao.format(v=valor)})')
+            else:
+                ambiente[f'c{i}'] = conversor
+                campos.append(f'{coluna!r}: c{i}({valor})')
+        for i, (campo, valor) in enumerate(self.extras.items()):
+            ambiente[f'e{i}'] = valor
+            campos.append(f'{campo!r}: e{i}')
+        return eval(f"lambda linhas: [{{{', '.join(campos)}}} for l in linhas]", ambiente)
+
+    def aplicar(self, colunas, linhas):
+        chave = tuple(colunas)
+        funcao = self._compilados.get(chave)
+        if funcao is None:
+            funcao = self._compilados[chave] = self._compilar(chave)
+        return funcao(linhas)
+
+# region JSON
+def _padrao(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (datetime.date, datetime.time)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo não serializável em JSON: {type(valor).__name__}")
+
+def dumps_bytes(objeto):
+    """Serializa para bytes UTF-8."""
+    if orjson is not None:
+        return orjson.dumps(objeto, default=_padrao, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(objeto, default=_padrao, ensure_ascii=False).encode('utf-8')
+
+def dumps(objeto):
+    """Serializa para str."""
+    if orjson is not None:
+        return orjson.dumps(objeto, default=_padrao, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(objeto, default=_padrao, ensure_ascii=False)
+
+def loads(texto):
+    if orjson is not None:
+        return orjson.loads(texto)
+    return json.loads(texto)
+#endregion
+
+def motor_json():
+    return 'orjson' if orjson is not None else 'json'
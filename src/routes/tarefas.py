@@ -0,0 +1,112 @@
+from . import pg
+from datetime import date, timedelta
+import json
+import logging
+import os
+import select
+import threading
+
+# Intervalo dos snapshots de estoque: 'diario', 'mensal' ou 'desligado'
+SNAPSHOT_INTERVALO = os.getenv('ESTOQUE_SNAPSHOT', 'diario')
+SNAPSHOT_VERIFICAR_A_CADA = float(os.getenv('ESTOQUE_SNAPSHOT_VERIFICAR', '3600'))  # segundos
+
+# Intervalo da compactação do log de versões das tabelas (pg.compactar_versoes_tabelas)
+VERSOES_COMPACTAR_A_CADA = float(os.getenv('VERSOES_COMPACTAR_A_CADA', '60'))  # segundos; 0 desliga
+
+# Escuta do NOTIFY de alterações; 'desligado' deixa só a invalidação local + TTL
+OUVIR_ALTERACOES = os.getenv('OUVIR_ALTERACOES', 'ligado') != 'desligado'
+OUVIR_RECONECTAR_APOS = float(os.getenv('OUVIR_RECONECTAR_APOS', '5'))  # segundos
+
+_parar = threading.Event()
+
+def data_snapshot_pendente(hoje=None):
+    """Retorna o último dia encerrado que deveria ter snapshot, conforme o intervalo configurado."""
+    hoje = hoje or date.today()
+    if SNAPSHOT_INTERVALO == 'mensal':
+        return hoje.replace(day=1) - timedelta(days=1)
+    return hoje - timedelta(days=1)
+
+def _loop_snapshots():
+    while not _parar.is_set():
+        try:
+            pg.gerar_snapshot_estoque(data_snapshot_pendente())
+        except Exception as e:
+            print(f"Erro ao gerar snapshot de estoque: {e}")
+        _parar.wait(SNAPSHOT_VERIFICAR_A_CADA)
+
+def iniciar_snapshots_estoque():
+    """Inicia a thread que gera os snapshots periódicos de saldo de estoque."""
+    if SNAPSHOT_INTERVALO == 'desligado':
+        return None
+    thread = threading.Thread(target=_loop_snapshots, name='snapshots-estoque', daemon=True)
+    thread.start()
+    logging.info(f'Snapshots de estoque agendados ({SNAPSHOT_INTERVALO})')
+    return thread
+
+def _loop_versoes():
+    while not _parar.wait(VERSOES_COMPACTAR_A_CADA):
+        try:
+            pg.compactar_versoes_tabelas()
+        except Exception as e:
+            print(f"Erro ao compactar as versões das tabelas: {e}")
+
+def iniciar_compactacao_versoes():
+    """Inicia a thread que compacta o log de versões das tabelas usado nos ETags."""
+    if VERSOES_COMPACTAR_A_CADA <= 0:
+        return None
+    thread = threading.Thread(target=_loop_versoes, name='compactacao-versoes', daemon=True)
+    thread.start()
+    return thread
+
+def _despachar_notificacao(notificacao):
+    try:
+        dados = json.loads(notificacao.payload)
+        tabela = dados.pop('tabela')
+    except (ValueError, KeyError) as e:
+        logging.warning(f'Notificação de alteração inválida: {notificacao.payload!r} ({e})')
+        return
+    pg.notificar_alteracao(tabela, origem='banco', **dados)
+
+def _ouvir(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(f'LISTEN {pg.CANAL_ALTERACOES}')
+    # Alterações feitas enquanto estávamos desconectados não chegaram: invalida tudo
+    for tabela in pg.TABELAS_NOTIFICADAS:
+        pg.notificar_alteracao(tabela, origem='banco')
+    while not _parar.is_set():
+        if select.select([conn], [], [], 1.0) == ([], [], []):
+            continue
+        conn.poll()
+        while conn.notifies:
+            _despachar_notificacao(conn.notifies.pop(0))
+
+def _loop_alteracoes():
+    while not _parar.is_set():
+        conn = None
+        try:
+            conn = pg.psycopg2.connect(**pg.DB_CONFIG)
+            conn.autocommit = True
+            _ouvir(conn)
+        except Exception as e:
+            print(f"Erro na escuta de alterações: {e}")
+            _parar.wait(OUVIR_RECONECTAR_APOS)
+        finally:
+            if conn is not None:
+                conn.close()
+
+def iniciar_ouvinte_alteracoes():
+    """
+    Inicia a thread que escuta o canal de alterações do banco (LISTEN) e repassa cada
+    notificação aos ouvintes de pg.notificar_alteracao, mantendo os caches deste processo
+    coerentes com escritas feitas por outros workers ou direto no banco.
+    """
+    if not OUVIR_ALTERACOES:
+        return None
+    thread = threading.Thread(target=_loop_alteracoes, name='ouvinte-alteracoes', daemon=True)
+    thread.start()
+    logging.info(f'Escutando alterações no canal {pg.CANAL_ALTERACOES}')
+    return thread
+
+def parar():
+    """Sinaliza às tarefas em segundo plano que devem terminar."""
+    _parar.set()
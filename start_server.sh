@@ -0,0 +1,35 @@
+#!/bin/sh
+# Servidor de produção no Linux: gunicorn com um processo por CPU (ver src/gunicorn.conf.py).
+# Uso: ./start_server.sh [iniciar|recarregar|parar]
+cd "$(dirname "$0")" || exit 1
+
+# Ativa o virtualenv, se existir
+[ -f venv/bin/activate ] && . venv/bin/activate
+
+PID=server.pid
+
+case "${1:-iniciar}" in
+    iniciar)
+        cd src && exec gunicorn -c gunicorn.conf.py >> ../server_log.txt 2>&1
+        ;;
+    recarregar)
+        # USR2 sobe um mestre novo com o código atual, que grava server.pid.2; server.pid
+        # continua com o antigo até ele sair (aí o novo renomeia o seu para server.pid)
+        ANTIGO="$(cat $PID)"
+        kill -USR2 "$ANTIGO" || exit 1
+        for _ in $(seq 30); do
+            [ -f $PID.2 ] && break
+            sleep 1
+        done
+        [ -f $PID.2 ] || { echo "O novo mestre não subiu; veja server_log.txt"; exit 1; }
+        # TERM encerra o mestre antigo depois que os workers terminam as requisições em andamento
+        kill -TERM "$ANTIGO"
+        ;;
+    parar)
+        kill -TERM "$(cat $PID)"
+        ;;
+    *)
+        echo "Uso: $0 [iniciar|recarregar|parar]"
+        exit 1
+        ;;
+esac
@@ -0,0 +1,129 @@
+"""
+Testes de routes.cache (não precisam de banco). A partir da raiz do repositório:
+    python -m unittest discover tests
+"""
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+os.environ['CACHE_TTL'] = '60'
+
+from routes import cache
+
+
+class CacheTTLTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = cache.CacheTTL(60, 2)
+
+    def gravar(self, chave, tabelas, escopo=None):
+        self.cache.gravar(chave, tabelas, chave, self.cache.geracao(tabelas), escopo)
+
+    def test_invalidacao_da_tabela_descarta_so_as_entradas_que_dependem_dela(self):
+        self.gravar('produtos', ('produtos',))
+        self.gravar('receitas', ('receita', 'item_receita'))
+        self.cache.invalidar('item_receita')
+        self.assertEqual(self.cache.obter('produtos'), (True, 'produtos'))
+        self.assertEqual(self.cache.obter('receitas'), (False, None))
+
+    def test_invalidacao_de_outro_registro_mantem_a_entrada_com_escopo(self):
+        self.gravar('produto 5', ('produtos',), {'produto_id': '5'})
+        self.cache.invalidar('produtos', {'produto_id': 7})
+        self.assertEqual(self.cache.obter('produto 5'), (True, 'produto 5'))
+        # Chave ausente na notificação não restringe: a alteração pode ser de qualquer produto
+        self.cache.invalidar('produtos', {'receita_id': 3})
+        self.assertEqual(self.cache.obter('produto 5'), (False, None))
+
+        self.gravar('produto 5', ('produtos',), {'produto_id': '5'})
+        self.cache.invalidar('produtos', {'produto_id': 5})
+        self.assertEqual(self.cache.obter('produto 5'), (False, None))
+
+    def test_invalidacao_sem_tabela_descarta_tudo(self):
+        self.gravar('produtos', ('produtos',), {'produto_id': '5'})
+        self.cache.invalidar()
+        self.assertEqual(self.cache.obter('produtos'), (False, None))
+
+    def test_valor_calculado_antes_da_invalidacao_nao_e_gravado(self):
+        geracao = self.cache.geracao(('produtos',))
+        self.cache.invalidar('produtos', {'produto_id': 7})
+        self.cache.gravar('produtos', ('produtos',), 'velho', geracao)
+        self.assertEqual(self.cache.obter('produtos'), (False, None))
+
+    def test_remove_a_entrada_menos_usada_ao_passar_do_limite(self):
+        self.gravar('a', ('produtos',))
+        self.gravar('b', ('produtos',))
+        self.cache.obter('a')
+        self.gravar('c', ('produtos',))
+        self.assertEqual(self.cache.obter('b'), (False, None))
+        self.assertEqual(self.cache.obter('a'), (True, 'a'))
+        self.assertEqual(self.cache.estatisticas()['removidas_lru'], 1)
+
+    def test_entrada_expirada_e_descartada(self):
+        expirado = cache.CacheTTL(-1, 2)
+        expirado.gravar('a', ('produtos',), 1, expirado.geracao(('produtos',)))
+        self.assertEqual(expirado.obter('a'), (False, None))
+        self.assertEqual(expirado.estatisticas()['expiradas'], 1)
+
+
+class MemoizarAssincronoTest(unittest.TestCase):
+
+    def setUp(self):
+        cache.cache.invalidar()
+        self.chamadas = 0
+
+        @cache.memoizar_assincrono('produtos', produto_id='id')
+        async def obtem_produtos(q=None, id=None):
+            self.chamadas += 1
+            await asyncio.sleep(0)
+            return [{'id': id, 'q': q}], None
+
+        self.obtem_produtos = obtem_produtos
+
+    def test_segunda_chamada_usa_o_resultado_guardado(self):
+        async def duas_requisicoes():
+            # Como o handler GET /produtos/<id> do asgi.py chamado duas vezes
+            return await self.obtem_produtos(id=5), await self.obtem_produtos(id=5)
+
+        primeira, segunda = asyncio.run(duas_requisicoes())
+        self.assertEqual(primeira, ([{'id': 5, 'q': None}], None))
+        self.assertEqual(segunda, primeira)
+        self.assertEqual(self.chamadas, 1)
+
+    def test_alteracao_de_outro_produto_mantem_a_entrada(self):
+        asyncio.run(self.obtem_produtos(id=5))
+        cache.ao_alterar('produtos', {'produto_id': 7, 'origem': 'banco'})
+        asyncio.run(self.obtem_produtos(id=5))
+        self.assertEqual(self.chamadas, 1)
+
+        cache.ao_alterar('produtos', {'produto_id': '5', 'origem': 'local'})
+        asyncio.run(self.obtem_produtos(id=5))
+        self.assertEqual(self.chamadas, 2)
+
+
+class VersoesLidasTest(unittest.TestCase):
+
+    def setUp(self):
+        cache.cache.invalidar()
+        self.versao_no_banco = 1
+
+        @cache.memoizar('produtos')
+        def obtem_produtos():
+            return self.versao_no_banco
+
+        self.obtem_produtos = obtem_produtos
+
+    def test_entrada_anterior_ao_etag_e_recalculada(self):
+        with cache.versoes_lidas(['produtos'], [1]):
+            self.assertEqual(self.obtem_produtos(), 1)
+        # Outro processo gravou e o aviso ainda não chegou: só a versão lida mudou
+        self.versao_no_banco = 2
+        with cache.versoes_lidas(['produtos'], [1]):
+            self.assertEqual(self.obtem_produtos(), 1)
+        with cache.versoes_lidas(['produtos'], [2]):
+            self.assertEqual(self.obtem_produtos(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
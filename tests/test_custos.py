@@ -0,0 +1,85 @@
+"""
+Testes de routes.custos (não precisam de banco). A partir da raiz do repositório:
+    python -m unittest discover tests
+"""
+from decimal import Decimal
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from routes import cache, custos
+
+
+class TotaisTest(unittest.TestCase):
+
+    def test_arredonda_metade_para_cima_como_o_round_do_postgres(self):
+        # (receita_id, nome, quantidade, percentual) como SQL_TOTAIS_ORCAMENTO
+        resultados = [
+            (1, 'Bolo', Decimal('10'), Decimal('10')),
+            (2, 'Torta', Decimal('3'), None),
+            (3, 'Sem itens', Decimal('4'), Decimal('50')),
+        ]
+        unitarios = {1: Decimal('0.0125'), 2: Decimal('2.5'), 3: None}
+
+        totais = custos._totais(resultados, unitarios)
+
+        # 0.125 -> 0.13 (ROUND_HALF_EVEN daria 0.12); 0.1375 -> 0.14
+        self.assertEqual(totais['itens'], [
+            {'tipo': 'Bolo', 'custo': 0.13, 'adicional': 0.14, 'quantidade': 10.0},
+            {'tipo': 'Torta', 'custo': 7.5, 'adicional': 7.5, 'quantidade': 3.0},
+        ])
+        self.assertEqual(totais['totais'], {
+            'total_custo': 7.63,
+            'total_valor_final': 7.64,
+            'diferenca_acrescimo': 0.01,
+        })
+
+    def test_soma_os_valores_ja_arredondados(self):
+        # Três itens de 0.005: somar antes de arredondar daria 0.02, o banco soma 3 x 0.01
+        resultados = [(r, f'Receita {r}', Decimal('1'), Decimal('0')) for r in (1, 2, 3)]
+        totais = custos._totais(resultados, dict.fromkeys((1, 2, 3), Decimal('0.005')))
+        self.assertEqual(totais['totais']['total_custo'], 0.03)
+
+
+class CacheCustosTest(unittest.TestCase):
+
+    def setUp(self):
+        custos.invalidar_receita(None)
+
+    def carregar(self, receita_ids, linhas):
+        faltando, geracao = custos._faltando(receita_ids)
+        return faltando, custos._completar(receita_ids, geracao, custos._acumular(faltando, linhas))
+
+    def test_soma_os_itens_e_guarda_o_custo(self):
+        # (receita_id, produto_id, custo) como SQL_CUSTOS_RECEITAS
+        faltando, valores = self.carregar([1, 2], [(1, 10, Decimal('1.5')), (1, 11, Decimal('0.25'))])
+        self.assertEqual(sorted(faltando), [1, 2])
+        self.assertEqual(valores, {1: Decimal('1.75'), 2: None})
+        self.assertEqual(custos._faltando([1, 2])[0], [])
+
+    def test_alteracao_do_produto_descarta_so_as_receitas_que_o_usam(self):
+        self.carregar([1, 2], [(1, 10, Decimal('1')), (2, 20, Decimal('2'))])
+        custos._ao_alterar('produtos', {'produto_id': 10})
+        self.assertEqual(custos._faltando([1, 2])[0], [1])
+        custos._ao_alterar('item_receita', {'receita_id': 2})
+        self.assertEqual(sorted(custos._faltando([1, 2])[0]), [1, 2])
+
+    def test_custo_lido_antes_de_uma_invalidacao_nao_e_guardado(self):
+        faltando, geracao = custos._faltando([1])
+        custos.invalidar_produto(99)
+        valores = custos._completar([1], geracao, custos._acumular(faltando, [(1, 10, Decimal('1'))]))
+        self.assertEqual(valores, {1: Decimal('1')})
+        self.assertEqual(custos._faltando([1])[0], [1])
+
+    def test_custo_anterior_as_versoes_da_requisicao_e_lido_de_novo(self):
+        with cache.versoes_lidas(custos.TABELAS_CUSTOS, [1, 1, 1, 1]):
+            self.carregar([1], [(1, 10, Decimal('1'))])
+            self.assertEqual(custos._faltando([1])[0], [])
+        with cache.versoes_lidas(['item_receita'], [2]):
+            self.assertEqual(custos._faltando([1])[0], [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
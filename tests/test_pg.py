@@ -0,0 +1,107 @@
+"""
+Testes do routes.pg.PoolConexoes (não precisam de banco: psycopg2.connect é trocado por
+uma conexão em memória). A partir da raiz do repositório:
+    python -m unittest discover tests
+"""
+from unittest import mock
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from routes import pg
+
+
+class ConexaoFalsa:
+    """O que o pool usa de uma conexão psycopg2."""
+
+    def __init__(self, **kwargs):
+        self.closed = 0
+        self.rollbacks = 0
+        self.info = mock.Mock(transaction_status=pg.psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.info.transaction_status = pg.psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class PoolConexoesTest(unittest.TestCase):
+
+    def setUp(self):
+        conectar = mock.patch.object(pg.psycopg2, 'connect', side_effect=ConexaoFalsa)
+        conectar.start()
+        self.addCleanup(conectar.stop)
+
+    def criar(self, maxconn=1, timeout=0.05, tempo_vida=0):
+        pool = pg.PoolConexoes(0, maxconn, tempo_vida, timeout, 60, dbname='teste')
+        self.addCleanup(pool.closeall)
+        return pool
+
+    def test_conexao_devolvida_e_reutilizada(self):
+        pool = self.criar()
+        conn = pool.getconn()
+        self.assertEqual(pool.estatisticas()['em_uso'], 1)
+        pool.putconn(conn)
+        self.assertIs(pool.getconn(), conn)
+        estatisticas = pool.estatisticas()
+        self.assertEqual((estatisticas['criadas'], estatisticas['checkouts'], estatisticas['ociosas']), (1, 2, 0))
+
+    def test_pool_cheio_esgota_o_tempo(self):
+        pool = self.criar(timeout=0.05)
+        pool.getconn()
+        inicio = time.monotonic()
+        with self.assertRaises(pg.pool.PoolError):
+            pool.getconn()
+        self.assertGreaterEqual(time.monotonic() - inicio, 0.05)
+        self.assertEqual(pool.estatisticas()['timeouts'], 1)
+
+    def test_espera_recebe_a_conexao_devolvida(self):
+        pool = self.criar(timeout=5)
+        conn = pool.getconn()
+        recebidas = []
+        espera = threading.Thread(target=lambda: recebidas.append(pool.getconn()))
+        espera.start()
+        while pool.estatisticas()['esperas'] == 0:
+            time.sleep(0.01)
+        pool.putconn(conn)
+        espera.join(5)
+        self.assertEqual(recebidas, [conn])
+        self.assertEqual(pool.estatisticas()['timeouts'], 0)
+
+    def test_transacao_pendente_e_desfeita_na_devolucao(self):
+        pool = self.criar()
+        conn = pool.getconn()
+        conn.info.transaction_status = pg.psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+        pool.putconn(conn)
+        self.assertEqual(conn.rollbacks, 1)
+        self.assertIs(pool.getconn(), conn)
+
+    def test_conexao_descartada_ou_expirada_nao_volta(self):
+        pool = self.criar()
+        conn = pool.getconn()
+        pool.putconn(conn, descartar=True)
+        self.assertTrue(conn.closed)
+        self.assertIsNot(pool.getconn(), conn)
+
+        expira = self.criar(tempo_vida=0.01)
+        conn = expira.getconn()
+        time.sleep(0.02)
+        expira.putconn(conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(expira.estatisticas()['descartadas'], 1)
+
+    def test_pool_fechado_recusa_retiradas(self):
+        pool = self.criar()
+        pool.closeall()
+        with self.assertRaises(pg.pool.PoolError):
+            pool.getconn()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+"""
+Testes das validações de routes.routes (não precisam de banco). A partir da raiz do repositório:
+    python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from routes import routes
+
+
+class ValidarLoteTest(unittest.TestCase):
+
+    CAMPOS = ['produto_id', 'quantidade']
+
+    def test_converte_os_campos_e_separa_os_erros_por_linha(self):
+        itens = [
+            {'produto_id': '5', 'quantidade': '2.5', 'observacao': 'x'},
+            {'produto_id': 6},
+            'não é um item',
+            {'produto_id': 'abc', 'quantidade': 1},
+            {'produto_id': 7, 'quantidade': 3},
+        ]
+        validos, erros = routes.validar_lote(itens, self.CAMPOS, 'produto_id')
+
+        self.assertEqual(validos, [
+            (0, {'produto_id': 5, 'quantidade': 2.5, 'observacao': 'x'}),
+            (4, {'produto_id': 7, 'quantidade': 3.0}),
+        ])
+        self.assertEqual(sorted(erros), [1, 2, 3])
+        self.assertEqual(erros[1], 'Campo obrigatório ausente: quantidade')
+        self.assertEqual(erros[2], 'Item inválido')
+
+    def test_chave_repetida_rejeita_a_segunda_linha(self):
+        itens = [{'produto_id': 5, 'quantidade': 1}, {'produto_id': '5', 'quantidade': 2}]
+        validos, erros = routes.validar_lote(itens, self.CAMPOS, 'produto_id')
+        self.assertEqual([indice for indice, _ in validos], [0])
+        self.assertEqual(erros, {1: 'produto_id 5 repetido no lote'})
+
+    def test_lote_vazio_ou_que_nao_e_lista(self):
+        for itens in ([], {}, None, {'produto_id': 5}):
+            with self.assertRaises(ValueError):
+                routes.validar_lote(itens, self.CAMPOS, 'produto_id')
+
+    def test_resultado_na_ordem_do_lote(self):
+        self.assertEqual(routes.resultado_lote(3, {0: 10, 2: 11}, {1: 'erro'}), [
+            {'indice': 0, 'id': 10},
+            {'indice': 1, 'erro': 'erro'},
+            {'indice': 2, 'id': 11},
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+"""
+Testes de routes.serializacao (não precisam de banco). A partir da raiz do repositório:
+    python -m unittest discover tests
+"""
+from decimal import Decimal
+import datetime
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from routes import serializacao
+from routes.serializacao import Mapeamento, numero, inteiro, texto, data_hora
+
+
+class MapeamentoTest(unittest.TestCase):
+
+    def test_converte_as_colunas_declaradas_e_passa_as_demais(self):
+        mapa = Mapeamento(quantidade=numero, ean=texto, criado_em=data_hora)
+        colunas = ['id', 'quantidade', 'ean', 'criado_em']
+        linhas = [
+            (1, Decimal('2.50'), '789', datetime.datetime(2024, 5, 1, 8, 30, 15, 123)),
+            (2, None, None, None),
+        ]
+        self.assertEqual(mapa.aplicar(colunas, linhas), [
+            {'id': 1, 'quantidade': 2.5, 'ean': '789', 'criado_em': '2024-05-01 08:30:15'},
+            {'id': 2, 'quantidade': 0.0, 'ean': '', 'criado_em': ''},
+        ])
+
+    def test_conversores_embutidos_equivalem_as_funcoes(self):
+        valores = [None, 0, Decimal('0'), Decimal('1.25'), 7]
+        for conversor in (numero, inteiro, texto):
+            mapa = Mapeamento(v=conversor)
+            self.assertEqual(
+                [linha['v'] for linha in mapa.aplicar(['v'], [(v,) for v in valores])],
+                [conversor(v) for v in valores],
+            )
+
+    def test_conversor_sem_expressao_e_chamado(self):
+        mapa = Mapeamento(nome=str.upper)
+        self.assertEqual(mapa.aplicar(['nome'], [('bolo',)]), [{'nome': 'BOLO'}])
+
+    def test_extras_sao_acrescentados_a_cada_linha(self):
+        mapa = Mapeamento(extras={'tipo': 'produto'})
+        self.assertEqual(
+            mapa.aplicar(['id'], [(1,), (2,)]),
+            [{'id': 1, 'tipo': 'produto'}, {'id': 2, 'tipo': 'produto'}],
+        )
+
+    def test_colunas_diferentes_usam_funcoes_diferentes(self):
+        mapa = Mapeamento(quantidade=numero)
+        self.assertEqual(mapa.aplicar(['id'], [(1,)]), [{'id': 1}])
+        self.assertEqual(mapa.aplicar(['quantidade', 'id'], [(None, 1)]), [{'quantidade': 0.0, 'id': 1}])
+        self.assertEqual(len(mapa._compilados), 2)
+
+
+class JSONTest(unittest.TestCase):
+
+    def test_decimal_e_datas(self):
+        objeto = {'valor': Decimal('1.5'), 'dia': datetime.date(2024, 5, 1)}
+        self.assertEqual(serializacao.loads(serializacao.dumps(objeto)), {'valor': 1.5, 'dia': '2024-05-01'})
+
+
+if __name__ == '__main__':
+    unittest.main()